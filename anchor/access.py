@@ -0,0 +1,124 @@
+# Copyright 2014 Dave Kludt
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+"""
+    How often each account, region and lookup type is read, kept in the
+    account_access collection to pick the lookups worth refreshing before
+    they expire. Every read adds one to a score that the refresh task
+    decays on each run, so the score tracks recent use rather than all
+    time totals. A refresh claims its entry until it finishes or the claim
+    lapses, which bounds how many run at once.
+"""
+
+from dateutil.relativedelta import relativedelta
+from datetime import datetime
+from dateutil import tz
+
+
+import pymongo
+
+
+UTC = tz.tzutc()
+DEFAULT_MIN_SCORE = 3
+DEFAULT_DECAY = 0.5
+DEFAULT_CLAIM_LIFETIME = 900
+
+
+def access_key(account_number, region, lookup_type):
+    return {
+        'account_number': account_number,
+        'region': region.lower(),
+        'lookup_type': lookup_type
+    }
+
+
+def record_access(db, account_number, region, lookup_type):
+    """
+        Count a read of the lookup, reads without a region or lookup type
+        are not counted as there is nothing to refresh for them
+    """
+    if not region or not lookup_type:
+        return
+
+    db.account_access.update(
+        access_key(account_number, region, lookup_type),
+        {
+            '$inc': {'score': 1, 'hits': 1},
+            '$set': {'last_access': datetime.now(UTC)}
+        },
+        upsert=True
+    )
+
+
+def decay(db, factor=None):
+    db.account_access.update(
+        {},
+        {'$mul': {'score': factor or DEFAULT_DECAY}},
+        multi=True
+    )
+
+
+def hot_entries(db, account_numbers, min_score=None, limit=None):
+    """
+        Entries of the given accounts scoring at least min_score, the most
+        used first
+    """
+    return list(
+        db.account_access.find(
+            {
+                'account_number': {'$in': list(account_numbers)},
+                'score': {'$gte': min_score or DEFAULT_MIN_SCORE}
+            }
+        ).sort('score', pymongo.DESCENDING).limit(limit or 0)
+    )
+
+
+def refreshes_running(db):
+    return db.account_access.find(
+        {'refreshing_until': {'$gte': datetime.now(UTC)}}
+    ).count()
+
+
+def claim_refresh(db, entry_id, lifetime=None):
+    """
+        Mark the entry as refreshing, returning False when a refresh of
+        it is already running
+    """
+    now = datetime.now(UTC)
+    claimed = db.account_access.find_and_modify(
+        {
+            '_id': entry_id,
+            '$or': [
+                {'refreshing_until': None},
+                {'refreshing_until': {'$lt': now}}
+            ]
+        }, {
+            '$set': {
+                'refreshing_until': now + relativedelta(
+                    seconds=lifetime or DEFAULT_CLAIM_LIFETIME
+                )
+            }
+        },
+        fields={'_id': 1}
+    )
+    return bool(claimed)
+
+
+def release_refresh(db, account_number, region, lookup_type):
+    query = access_key(account_number, region, lookup_type)
+    query['refreshing_until'] = {'$exists': True}
+    db.account_access.update(
+        query,
+        {'$unset': {'refreshing_until': ''}}
+    )
@@ -0,0 +1,76 @@
+# Copyright 2014 Dave Kludt
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+
+from collections import OrderedDict
+from itertools import count
+
+
+class HostAggregator(object):
+    """
+        Single pass grouping of item IDs by host (or zone). Hosts and their
+        item IDs are kept in dicts stamped with the order they were added,
+        so adding or removing an item is constant time regardless of how
+        many hosts or items exist, and first seen order is restored by a
+        single sort when the hosts are read. The host map is the grouping
+        stored as the host index, so it is not built again on save.
+    """
+    def __init__(self):
+        self.members = {}
+        self.first_seen = {}
+        self.sequence = count()
+
+    @property
+    def hosts(self):
+        return sorted(self.first_seen, key=self.first_seen.get)
+
+    @property
+    def host_map(self):
+        host_map = OrderedDict()
+        for host in self.hosts:
+            items = self.members[host]
+            host_map[host] = [
+                {
+                    'id': item_id,
+                    'name': items[item_id][1]
+                } for item_id in sorted(items, key=items.get)
+            ]
+
+        return host_map
+
+    def add(self, host, item_id, name=None):
+        items = self.members.get(host)
+        if items is None:
+            items = self.members[host] = {}
+            self.first_seen[host] = next(self.sequence)
+
+        items[item_id] = (next(self.sequence), name)
+
+    def remove(self, host, item_id):
+        items = self.members.get(host)
+        if items is None or item_id not in items:
+            return
+
+        del items[item_id]
+        if not items:
+            del self.members[host]
+            del self.first_seen[host]
+
+    def counts(self):
+        return [
+            {
+                'host': host,
+                'count': len(self.members[host])
+            } for host in self.hosts
+        ]
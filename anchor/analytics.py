@@ -0,0 +1,182 @@
+# Copyright 2014 Dave Kludt
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+"""
+    Host distribution analytics for a cached lookup. The servers or volumes
+    are read once into columnar integer codes for host, flavor, state and
+    zone, and every statistic is then computed with NumPy over those
+    arrays rather than by walking the items again for each one.
+"""
+
+import storage
+import numpy
+
+
+COLUMN_FIELDS = {
+    'servers': {
+        'host': 'host_id',
+        'flavor': 'flavor',
+        'state': 'state',
+        'zone': 'public_zone'
+    },
+    'volumes': {
+        'host': 'host',
+        'flavor': 'volume_type',
+        'state': 'status',
+        'zone': 'availability_zone'
+    }
+}
+
+
+def encode(items, field):
+    """
+        Factorize a field into its distinct labels, in first seen order,
+        and an integer code per item
+    """
+    index = {}
+    codes = numpy.fromiter(
+        (
+            index.setdefault(item.get(field) or '', len(index))
+            for item in items
+        ),
+        dtype=numpy.int64,
+        count=len(items)
+    )
+    labels = [None] * len(index)
+    for label, code in index.iteritems():
+        labels[code] = label
+
+    return labels, codes
+
+
+def build_columns(items, collection='servers'):
+    items = list(items)
+    return dict(
+        (column, encode(items, field))
+        for column, field in COLUMN_FIELDS.get(collection).iteritems()
+    )
+
+
+def concentration(counts):
+    """
+        Gini coefficient of the items per host, 0 when every host holds
+        the same number of items and approaching 1 as they pile onto one
+    """
+    if not len(counts) or not counts.sum():
+        return 0.0
+
+    ordered = numpy.sort(counts).astype(numpy.float64)
+    ranks = numpy.arange(1, len(ordered) + 1)
+    return float(
+        (2.0 * (ranks * ordered).sum()) / (len(ordered) * ordered.sum()) -
+        (len(ordered) + 1.0) / len(ordered)
+    )
+
+
+def flavor_spread(host_codes, host_count, flavor_labels, flavor_codes):
+    """
+        For each flavor, the items, the hosts they are spread over and
+        the most found on a single host
+    """
+    pairs, pair_counts = numpy.unique(
+        flavor_codes.astype(numpy.int64) * host_count + host_codes,
+        return_counts=True
+    )
+    pair_flavors = pairs // host_count
+    items = numpy.bincount(flavor_codes, minlength=len(flavor_labels))
+    hosts = numpy.bincount(pair_flavors, minlength=len(flavor_labels))
+    largest = numpy.zeros(len(flavor_labels), dtype=numpy.int64)
+    numpy.maximum.at(largest, pair_flavors, pair_counts)
+    return [
+        {
+            'flavor': flavor_labels[code] or None,
+            'items': int(items[code]),
+            'hosts': int(hosts[code]),
+            'largest_host': int(largest[code]),
+            'spread': float(hosts[code]) / float(items[code])
+        } for code in numpy.argsort(-items, kind='mergesort')
+    ]
+
+
+def label_counts(labels, codes):
+    counts = numpy.bincount(codes, minlength=len(labels))
+    return dict(
+        (labels[code] or 'unknown', int(counts[code]))
+        for code in range(len(labels))
+    )
+
+
+def summarize(columns):
+    host_labels, host_codes = columns.get('host')
+    items = len(host_codes)
+    if not items:
+        return None
+
+    counts = numpy.bincount(host_codes, minlength=len(host_labels))
+    shared = counts > 1
+    largest = int(counts.argmax())
+    flavor_labels, flavor_codes = columns.get('flavor')
+    zone_labels = columns.get('zone')[0]
+    return {
+        'items': items,
+        'hosts': len(host_labels),
+        'density': {
+            'mean': float(counts.mean()),
+            'median': float(numpy.median(counts)),
+            'max': int(counts[largest]),
+            'shared_hosts': int(shared.sum()),
+            'items_on_shared_hosts': int(counts[shared].sum()),
+            'histogram': dict(
+                (str(size), int(hosts))
+                for size, hosts in enumerate(numpy.bincount(counts)) if hosts
+            )
+        },
+        'blast_radius': {
+            'host': host_labels[largest] or None,
+            'items': int(counts[largest]),
+            'percent': 100.0 * float(counts[largest]) / items
+        },
+        'concentration': concentration(counts),
+        'flavors': flavor_spread(
+            host_codes,
+            len(host_labels),
+            flavor_labels,
+            flavor_codes
+        ),
+        'states': label_counts(*columns.get('state')),
+        'zones': len([label for label in zone_labels if label])
+    }
+
+
+def analyze_items(items, lookup_type):
+    collection = storage.ITEM_COLLECTIONS.get(lookup_type, 'servers')
+    return summarize(build_columns(items, collection))
+
+
+def analyze_account(db, account):
+    """
+        Analytics for a cached account, reading only the analyzed fields
+        of its servers or volumes
+    """
+    collection = storage.item_collection(account)
+    return summarize(
+        build_columns(
+            storage.iter_items(
+                db,
+                account,
+                COLUMN_FIELDS.get(collection).values()
+            ),
+            collection
+        )
+    )
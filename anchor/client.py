@@ -0,0 +1,190 @@
+# Copyright 2014 Dave Kludt
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+"""
+    Pooled HTTP sessions for the Rackspace API calls. Each worker process
+    keeps one keep-alive session per API host, so paging through a region
+    re-uses the same TCP/TLS connections instead of handshaking per page.
+    Callbacks to caller supplied URLs get their own sessions that verify
+    certificates, and are only sent to public addresses or allowed hosts.
+"""
+
+from requests.packages.urllib3.util.retry import Retry
+from requests.adapters import HTTPAdapter
+from urlparse import urlparse
+
+
+import threading
+import requests
+import binascii
+import socket
+import os
+
+
+DEFAULT_POOL_SIZE = 10
+DEFAULT_TIMEOUT = (5, 60)
+DEFAULT_RETRIES = 3
+DEFAULT_BACKOFF = 0.5
+RETRY_STATUS_CODES = [500, 502, 503, 504]
+
+# Loopback, link-local, private, shared and reserved ranges that callbacks
+# are never sent to unless the host is allowed by name
+PRIVATE_NETWORKS = [
+    '0.0.0.0/8',
+    '10.0.0.0/8',
+    '100.64.0.0/10',
+    '127.0.0.0/8',
+    '169.254.0.0/16',
+    '172.16.0.0/12',
+    '192.0.0.0/24',
+    '192.168.0.0/16',
+    '198.18.0.0/15',
+    '224.0.0.0/3',
+    '::/128',
+    '::1/128',
+    'fc00::/7',
+    'fe80::/10',
+    'ff00::/8'
+]
+
+
+_sessions = {}
+_sessions_pid = None
+_sessions_lock = threading.Lock()
+_verified_sessions = {}
+
+
+def get_setting(config, name, default):
+    return getattr(config, name, default)
+
+
+def build_session(config):
+    retries = Retry(
+        total=get_setting(config, 'API_RETRIES', DEFAULT_RETRIES),
+        backoff_factor=get_setting(config, 'API_BACKOFF', DEFAULT_BACKOFF),
+        status_forcelist=RETRY_STATUS_CODES,
+        method_whitelist=['GET', 'HEAD', 'OPTIONS'],
+        raise_on_status=False
+    )
+    pool_size = get_setting(config, 'API_POOL_SIZE', DEFAULT_POOL_SIZE)
+    adapter = HTTPAdapter(
+        pool_connections=1,
+        pool_maxsize=pool_size,
+        max_retries=retries
+    )
+    session = requests.Session()
+    session.verify = False
+    session.mount('https://', adapter)
+    session.mount('http://', adapter)
+    return session
+
+
+def get_session(url, config, verify=False):
+    """
+        Return the session for the host in the URL, creating it on first
+        use. Sessions are dropped after a fork so prefork workers never
+        share sockets with their parent. Sessions that verify certificates
+        are kept apart from the ones used for the Rackspace API.
+    """
+    global _sessions_pid
+    host = urlparse(url).netloc
+    sessions = _verified_sessions if verify else _sessions
+    with _sessions_lock:
+        if _sessions_pid != os.getpid():
+            _sessions.clear()
+            _verified_sessions.clear()
+            _sessions_pid = os.getpid()
+
+        session = sessions.get(host)
+        if session is None:
+            session = build_session(config)
+            session.verify = verify
+            sessions[host] = session
+
+    return session
+
+
+def get_timeout(config):
+    return get_setting(config, 'API_TIMEOUT', DEFAULT_TIMEOUT)
+
+
+def close_sessions():
+    with _sessions_lock:
+        for session in _sessions.values() + _verified_sessions.values():
+            session.close()
+
+        _sessions.clear()
+        _verified_sessions.clear()
+
+
+def address_number(address):
+    """
+        The address as an integer and its width in bits, IPv4 addresses
+        mapped into IPv6 are returned as IPv4
+    """
+    family = socket.AF_INET6 if ':' in address else socket.AF_INET
+    packed = socket.inet_pton(family, address.split('%')[0])
+    if packed[:12] == '\x00' * 10 + '\xff' * 2:
+        packed = packed[12:]
+
+    return int(binascii.hexlify(packed), 16), len(packed) * 8
+
+
+def is_private_address(address):
+    number, bits = address_number(address)
+    for network in PRIVATE_NETWORKS:
+        base, prefix = network.split('/')
+        base_number, base_bits = address_number(base)
+        if base_bits != bits:
+            continue
+
+        shift = bits - int(prefix)
+        if number >> shift == base_number >> shift:
+            return True
+
+    return False
+
+
+def allowed_callback_url(url, allowed_hosts=None):
+    """
+        Whether a callback may be sent to the URL. With allowed_hosts set
+        only those hosts are allowed, otherwise every address the host
+        resolves to must be public.
+    """
+    try:
+        parsed = urlparse(url)
+        host = parsed.hostname
+        port = parsed.port
+    except ValueError:
+        return False
+
+    if parsed.scheme not in ['http', 'https'] or not host:
+        return False
+
+    if allowed_hosts:
+        return host.lower() in [item.lower() for item in allowed_hosts]
+
+    try:
+        addresses = socket.getaddrinfo(
+            host,
+            port or (443 if parsed.scheme == 'https' else 80),
+            0,
+            socket.SOCK_STREAM
+        )
+    except (socket.error, UnicodeError):
+        return False
+
+    return bool(addresses) and not any(
+        is_private_address(item[4][0]) for item in addresses
+    )
@@ -46,3 +46,64 @@ MONGO_USER = None
 MONGO_PASS = None
 MONGO_DATABASE = 'anchor'
 MONGO_KWARGS = {'tz_aware': True}
+
+# Pooled HTTP client settings for the Rackspace API calls
+API_POOL_SIZE = 10
+API_TIMEOUT = (5, 60)
+API_RETRIES = 3
+API_BACKOFF = 0.5
+
+# JSON library for decoding the API responses, one of ujson, simplejson or
+# json. Unset uses the fastest one installed.
+JSON_DECODER = None
+
+# Concurrent page requests when listing block storage volumes
+CBS_PAGE_WORKERS = 4
+
+# Concurrent server detail requests when checking a batch of new servers
+SERVER_DETAIL_WORKERS = 10
+
+# Retries of a failed server check callback, and the seconds before the
+# first retry, doubled on each one after it
+CALLBACK_RETRIES = 3
+CALLBACK_RETRY_DELAY = 10
+
+# Hosts server check callbacks may be sent to. Unset allows any host that
+# only resolves to public addresses.
+CALLBACK_ALLOWED_HOSTS = None
+
+# Seconds a cached lookup is kept before it expires, by lookup type
+CACHE_LIFETIMES = {
+    'host_server': 86400,
+    'public_ip_zone': 86400,
+    'cbs_host': 86400
+}
+
+# Cache layout for new lookups. embedded keeps the servers or volumes in an
+# array on the account document, normalized stores one document per item.
+ACCOUNT_STORAGE = 'embedded'
+
+# Items per unordered bulk write when storing a normalized lookup
+STORAGE_BATCH_SIZE = 500
+
+# Refresh-ahead of the most read lookups, run by celery beat every
+# REFRESH_INTERVAL seconds (start the worker with -B). Only accounts with
+# identity credentials here are refreshed, keyed by account number:
+# {'123456': {'username': 'user', 'api_key': 'key'}}
+REFRESH_CREDENTIALS = {}
+REFRESH_INTERVAL = 300
+# Lookups expiring within this many seconds are refreshed
+REFRESH_AHEAD = 3600
+# Reads needed to count as hot, each run halves the score before checking
+REFRESH_MIN_SCORE = 3
+REFRESH_DECAY = 0.5
+# Refreshes running at once, and the most seconds each start is delayed
+REFRESH_CONCURRENCY = 4
+REFRESH_JITTER = 60
+
+CELERYBEAT_SCHEDULE = {
+    'refresh-hot-accounts': {
+        'task': 'anchor.tasks.refresh_hot_accounts',
+        'schedule': REFRESH_INTERVAL
+    }
+}
@@ -37,3 +37,25 @@ ADMIN_EMAIL = 'Admin email'
 
 
 SECRET_KEY = 'secret_key_for_cookie'
+
+
+# Seconds a token accepted by identity is trusted by the REST API, and the
+# most validated tokens kept before the oldest are dropped
+TOKEN_CACHE_LIFETIME = 300
+TOKEN_CACHE_MAX_ENTRIES = 10000
+
+
+# Most server IDs accepted by a single batch server check
+SERVER_BATCH_LIMIT = 100
+
+
+# Hosts server check callbacks may be sent to. Unset allows any host that
+# only resolves to public addresses.
+CALLBACK_ALLOWED_HOSTS = None
+
+
+# Account runs listed on each page of the reports
+REPORT_PAGE_SIZE = 50
+
+# Most shared hosts listed on the fleet report
+FLEET_REPORT_LIMIT = 500
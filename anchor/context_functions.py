@@ -59,17 +59,12 @@ def utility_processor():
         return helper.format_volume_list_for_web(data)
 
     def process_reboot_data(data):
-        if data:
-            temp = data.split(';')
-            dates = [
-                parse(x).strftime(
-                    '%m-%d-%Y @ %r %Z'
-                ) for x in temp if x is not None
-            ]
-            return ' - '.join(dates)
-        return '-'
+        return helper.format_reboot_window(data)
+
+    def get_created_date(cache_date, cache_created=None):
+        if cache_created:
+            return cache_created.strftime('%m-%d-%Y')
 
-    def get_created_date(cache_date):
         return (cache_date - timedelta(days=1)).strftime('%m-%d-%Y')
 
     return dict(
@@ -0,0 +1,66 @@
+# Copyright 2014 Dave Kludt
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+"""
+    JSON decoding of the Rackspace API responses. The fastest library
+    installed is used, ujson and then simplejson, falling back to the json
+    module, or the one named by JSON_DECODER. A body the chosen library
+    rejects is decoded again with json before the error is raised.
+"""
+
+from importlib import import_module
+
+
+import json
+
+
+DECODERS = ['ujson', 'simplejson', 'json']
+
+
+_decoders = {}
+
+
+def load_decoder(name):
+    if name not in _decoders:
+        try:
+            _decoders[name] = import_module(name).loads
+        except ImportError:
+            _decoders[name] = None
+
+    return _decoders[name]
+
+
+def get_decoder(config=None):
+    """
+        Return the name and loads function of the decoder to use, the
+        configured one when it is installed or else the first installed
+    """
+    name = getattr(config, 'JSON_DECODER', None)
+    for name in ([name] if name else []) + DECODERS:
+        loads = load_decoder(name)
+        if loads:
+            return name, loads
+
+    return 'json', json.loads
+
+
+def decode(content, config=None):
+    name, loads = get_decoder(config)
+    try:
+        return loads(content)
+    except ValueError:
+        if loads is json.loads:
+            raise
+
+        return json.loads(content)
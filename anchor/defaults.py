@@ -85,6 +85,16 @@ def application_initialize(db, app):
                             'parent_order': 2,
                             'url': '/manage/regions',
                             'permissions': 'administrators'
+                        }, {
+                            'active': True,
+                            'name': 'Fleet Hosts',
+                            'divider': False,
+                            'db_name': 'fleet_hosts',
+                            'order': 4,
+                            'parent': 'system',
+                            'parent_order': 2,
+                            'url': '/reports/fleet',
+                            'permissions': 'administrators'
                         }, {
                             'active': True,
                             'name': 'General Settings',
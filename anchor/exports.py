@@ -0,0 +1,136 @@
+# Copyright 2014 Dave Kludt
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+"""
+    CSV exports of a cached lookup, written with the csv module as a
+    generator so the response can be streamed. Rows are read from a cursor
+    over only the exported fields and sent CHUNK_ROWS at a time, so memory
+    use and the time to the first byte do not grow with the account.
+"""
+
+import storage
+import helper
+import csv
+
+
+CHUNK_ROWS = 500
+SERVER_HEADERS = [
+    'Zone ID', 'Host ID', 'Server ID', 'Name', 'State', 'Flavor',
+    'Public IPs', 'Private IPs', 'Custom IPs', 'Reboot Window'
+]
+SERVER_FIELDS = [
+    'public_zone', 'host_id', 'id', 'name', 'state', 'flavor', 'addresses',
+    'reboot_window'
+]
+VOLUME_HEADERS = [
+    'Host ID', 'Volume ID', 'Name', 'Status', 'Type', 'Size', 'Bootable',
+    'Attached To', 'Attached As', 'Availability Zone'
+]
+VOLUME_FIELDS = [
+    'host', 'id', 'display_name', 'status', 'volume_type', 'size',
+    'bootable', 'attached_to', 'attached_as_device', 'availability_zone'
+]
+
+
+class Echo(object):
+    """
+        File-like object handing each line back to the csv writer's caller
+        instead of buffering it
+    """
+    def write(self, value):
+        return value
+
+
+def encode(value):
+    if value is None:
+        return ''
+
+    if isinstance(value, unicode):
+        return value.encode('utf-8')
+
+    return value
+
+
+def format_addresses(addresses, key):
+    found = (addresses or {}).get(key)
+    if not found:
+        return '-'
+
+    return ';'.join(found)
+
+
+def server_rows(items):
+    reboot_windows = {}
+    for item in items:
+        window = item.get('reboot_window')
+        if window not in reboot_windows:
+            reboot_windows[window] = helper.format_reboot_window(window)
+
+        addresses = item.get('addresses')
+        yield [
+            item.get('public_zone'),
+            item.get('host_id'),
+            item.get('id'),
+            item.get('name'),
+            item.get('state'),
+            item.get('flavor'),
+            format_addresses(addresses, 'public'),
+            format_addresses(addresses, 'private'),
+            format_addresses(addresses, 'custom'),
+            reboot_windows[window]
+        ]
+
+
+def volume_rows(items):
+    for item in items:
+        attached_to, attached_as = None, None
+        if item.get('attached_to'):
+            attached_to = item.get('attached_to')
+            attached_as = item.get('attached_as_device')
+
+        yield [
+            item.get('host') or 'unknown',
+            item.get('id'),
+            item.get('display_name'),
+            item.get('status'),
+            item.get('volume_type'),
+            item.get('size'),
+            item.get('bootable'),
+            attached_to,
+            attached_as,
+            item.get('availability_zone')
+        ]
+
+
+def generate_csv(db, account, lookup_type):
+    """
+        Yield the CSV for the cached account, the header line first and
+        then the rows in chunks
+    """
+    headers, fields, rows = SERVER_HEADERS, SERVER_FIELDS, server_rows
+    if lookup_type == 'cbs_host':
+        headers, fields, rows = VOLUME_HEADERS, VOLUME_FIELDS, volume_rows
+
+    yield csv.writer(Echo(), lineterminator='\n').writerow(headers)
+
+    writer = csv.writer(Echo(), quoting=csv.QUOTE_ALL, lineterminator='\n')
+    chunk = []
+    for row in rows(storage.iter_items(db, account, fields)):
+        chunk.append(writer.writerow([encode(value) for value in row]))
+        if len(chunk) >= CHUNK_ROWS:
+            yield ''.join(chunk)
+            chunk = []
+
+    if chunk:
+        yield ''.join(chunk)
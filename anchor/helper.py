@@ -12,11 +12,16 @@
 # See the License for the specific language governing permissions and
 # limitations under the License.
 
-from flask import jsonify, g
+from flask import jsonify, g, current_app
+from dateutil.parser import parse
+from urlparse import urlparse
 from dateutil import tz
 
 
+import token_cache
 import datetime
+import storage
+import client
 
 
 UTC = tz.tzutc()
@@ -33,6 +38,74 @@ def check_for_token(request):
         return None
 
 
+def valid_callback_url(url):
+    if not isinstance(url, basestring):
+        return False
+
+    parsed = urlparse(url)
+    return parsed.scheme in ['http', 'https'] and bool(parsed.netloc)
+
+
+def allowed_callback_url(url):
+    return client.allowed_callback_url(
+        url,
+        current_app.config.get('CALLBACK_ALLOWED_HOSTS')
+    )
+
+
+def check_auth_token(account_number, token, validate):
+    return token_cache.check_token(
+        g.db,
+        account_number,
+        token,
+        validate,
+        current_app.config.get('TOKEN_CACHE_LIFETIME'),
+        current_app.config.get('TOKEN_CACHE_MAX_ENTRIES')
+    )
+
+
+def get_task_result(task_id, check_state):
+    """
+        Return the state and result of a lookup task from the task_results
+        collection, without waiting on the celery result backend. Tasks
+        with no record fall back to check_state for the state only, and
+        report a success as pending until the worker has recorded it.
+    """
+    result = storage.get_task_result(g.db, task_id)
+    if result:
+        return result.get('state'), result.get('result')
+
+    state = check_state(task_id)
+    if state == 'SUCCESS':
+        state = 'PENDING'
+
+    return state, None
+
+
+def get_progress(task_id, version=None):
+    """
+        Return the latest state and progress of a lookup from its task
+        record, with the version that is bumped on every update. None is
+        returned while the lookup is running at the version given.
+    """
+    result = storage.get_task_result(g.db, task_id) or {}
+    state = result.get('state', 'PENDING')
+    if (
+        version is not None and
+        state == 'PENDING' and
+        result.get('version', 0) == version
+    ):
+        return None
+
+    return {
+        'state': state,
+        'phase': result.get('phase'),
+        'pages': result.get('pages', 0),
+        'items': result.get('items', 0),
+        'version': result.get('version', 0)
+    }
+
+
 def generate_error(message, code):
     response = jsonify({'message': message})
     response.status_code = code
@@ -51,6 +124,26 @@ def gather_dc_choices():
     return choices
 
 
+def check_host_mismatch(data):
+    """
+        A mismatch means at least one host holds more than one item. Use
+        the counts stored by the lookup, and fall back to comparing list
+        lengths for cache entries written before counts were kept.
+    """
+    lookup_type = data.get('lookup_type')
+    if lookup_type not in ['host_server', 'cbs_host']:
+        return False
+
+    if data.get('host_counts') is not None:
+        return any(host.get('count') > 1 for host in data.get('host_counts'))
+
+    items, hosts = 'servers', 'host_servers'
+    if lookup_type == 'cbs_host':
+        items, hosts = 'volumes', 'cbs_hosts'
+
+    return len(data.get(items) or []) != len(data.get(hosts) or [])
+
+
 def format_server_list_for_web(data):
     send_data = {
         'fg': {},
@@ -85,32 +178,17 @@ def format_volume_list_for_web(data):
     return send_data
 
 
-def generate_servers_on_same_host(account_id, region, host_id):
-    data = g.db.accounts.aggregate(
-        [
-            {
-                '$match': {
-                    'account_number': account_id,
-                    'region': region
-                }
-            }, {
-                '$unwind': '$servers'
-            }, {
-                '$match': {
-                    'servers.host_id': host_id
-                }
-            }, {
-                '$project': {
-                    '_id': 0,
-                    'server': {
-                        'name': '$servers.name',
-                        'id': '$servers.id'
-                    }
-                }
-            }
+def format_reboot_window(data):
+    if data:
+        temp = data.split(';')
+        dates = [
+            parse(x).strftime(
+                '%m-%d-%Y @ %r %Z'
+            ) for x in temp if x is not None
         ]
-    )
-    if isinstance(data, dict):
-        return data.get('result')
-    else:
-        return list(data)
+        return ' - '.join(dates)
+    return '-'
+
+
+def generate_servers_on_same_host(account_id, region, host_id):
+    return storage.servers_on_host(g.db, account_id, region, host_id)
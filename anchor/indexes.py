@@ -0,0 +1,215 @@
+# Copyright 2014 Dave Kludt
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+"""
+    Index definitions for the collections queried by the application and
+    the celery workers. Creating an index that already exists is a no-op,
+    so ensure_indexes can run on every app and worker start.
+"""
+
+from pymongo import ASCENDING, DESCENDING
+
+
+INDEXES = {
+    'accounts': [
+        # Lookup upsert and cache retrieval by lookup type
+        {
+            'keys': [
+                ('account_number', ASCENDING),
+                ('region', ASCENDING),
+                ('lookup_type', ASCENDING)
+            ]
+        },
+        # AccountAPI.get and ServerAPI.put cache checks
+        {
+            'keys': [
+                ('account_number', ASCENDING),
+                ('region', ASCENDING),
+                ('cache_expiration', ASCENDING)
+            ]
+        },
+        # ServerAPI.get server lookup and catalogued server checks
+        {
+            'keys': [
+                ('account_number', ASCENDING),
+                ('region', ASCENDING),
+                ('servers.id', ASCENDING)
+            ]
+        },
+        # Duplicate host checks when adding a server to the cache
+        {
+            'keys': [
+                ('account_number', ASCENDING),
+                ('region', ASCENDING),
+                ('servers.host_id', ASCENDING)
+            ]
+        },
+        # TTL expiry at each document's cache_expiration, also used by
+        # the reports sorted by cache date
+        {
+            'keys': [('cache_expiration', ASCENDING)],
+            'expireAfterSeconds': 0
+        },
+        # Report pages by cache date, with _id breaking ties between runs
+        # cached at the same time
+        {
+            'keys': [('cache_expiration', ASCENDING), ('_id', ASCENDING)]
+        },
+        # Report pages filtered by lookup type
+        {
+            'keys': [
+                ('lookup_type', ASCENDING),
+                ('cache_expiration', ASCENDING),
+                ('_id', ASCENDING)
+            ]
+        }
+    ],
+    'servers': [
+        # Loading the servers for a normalized account header
+        {
+            'keys': [
+                ('account_number', ASCENDING),
+                ('region', ASCENDING),
+                ('lookup_type', ASCENDING)
+            ]
+        },
+        # ServerAPI.get server lookup, catalogued server checks and bulk
+        # upserts by id
+        {
+            'keys': [
+                ('account_number', ASCENDING),
+                ('region', ASCENDING),
+                ('id', ASCENDING)
+            ]
+        },
+        # Servers sharing a host and duplicate host checks
+        {
+            'keys': [
+                ('account_number', ASCENDING),
+                ('region', ASCENDING),
+                ('host_id', ASCENDING)
+            ]
+        },
+        # Items expire along with their account header
+        {
+            'keys': [('cache_expiration', ASCENDING)],
+            'expireAfterSeconds': 0
+        }
+    ],
+    'volumes': [
+        {
+            'keys': [
+                ('account_number', ASCENDING),
+                ('region', ASCENDING),
+                ('lookup_type', ASCENDING)
+            ]
+        },
+        # Bulk upserts of volumes by id
+        {
+            'keys': [
+                ('account_number', ASCENDING),
+                ('region', ASCENDING),
+                ('id', ASCENDING)
+            ]
+        },
+        {
+            'keys': [('cache_expiration', ASCENDING)],
+            'expireAfterSeconds': 0
+        }
+    ],
+    'host_index': [
+        # Servers sharing a host, one document per host
+        {
+            'keys': [
+                ('account_number', ASCENDING),
+                ('region', ASCENDING),
+                ('host_id', ASCENDING)
+            ],
+            'unique': True
+        },
+        # Accounts sharing a host across the fleet
+        {
+            'keys': [
+                ('region', ASCENDING),
+                ('host_id', ASCENDING)
+            ]
+        },
+        {
+            'keys': [('cache_expiration', ASCENDING)],
+            'expireAfterSeconds': 0
+        }
+    ],
+    'account_access': [
+        # One entry per account, region and lookup type read
+        {
+            'keys': [
+                ('account_number', ASCENDING),
+                ('region', ASCENDING),
+                ('lookup_type', ASCENDING)
+            ],
+            'unique': True
+        },
+        # Hot entries picked for a refresh, most used first
+        {
+            'keys': [('score', DESCENDING)]
+        },
+        # Running refreshes counted against the concurrency budget
+        {
+            'keys': [('refreshing_until', ASCENDING)],
+            'sparse': True
+        },
+        # Entries not read for a week are dropped
+        {
+            'keys': [('last_access', ASCENDING)],
+            'expireAfterSeconds': 604800
+        }
+    ],
+    'task_results': [
+        # Task states are only polled while a lookup is fresh
+        {
+            'keys': [('created', ASCENDING)],
+            'expireAfterSeconds': 86400
+        }
+    ],
+    'lookups': [
+        # Combined lookup summaries are only fetched while their lookups
+        # are fresh
+        {
+            'keys': [('completed', ASCENDING)],
+            'expireAfterSeconds': 86400
+        }
+    ],
+    'auth_cache': [
+        # Validated tokens are dropped once their cache lifetime passes,
+        # also used to trim the oldest entries
+        {
+            'keys': [('expiration', ASCENDING)],
+            'expireAfterSeconds': 0
+        }
+    ]
+}
+
+
+def ensure_indexes(db):
+    for collection, indexes in INDEXES.iteritems():
+        for index in indexes:
+            options = dict(
+                (key, value) for key, value in index.iteritems()
+                if key != 'keys'
+            )
+            db[collection].create_index(
+                index.get('keys'),
+                background=True,
+                **options
+            )
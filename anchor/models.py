@@ -18,6 +18,7 @@ from dateutil import tz
 
 
 UTC = tz.tzutc()
+DEFAULT_CACHE_LIFETIME = 86400
 
 
 class Region:
@@ -30,14 +31,75 @@ class Region:
 class Account:
     def __init__(self, data):
         self.account_number = data.get('account_number')
-        self.cache_expiration = self.set_expiration()
+        self.cache_created = datetime.now(UTC)
+        self.cache_expiration = self.set_expiration(data.get('cache_lifetime'))
         self.host_servers = data.get('host_servers')
+        self.host_counts = data.get('host_counts')
         self.public_zones = data.get('public_zones')
+        self.zone_counts = data.get('zone_counts')
         self.region = data.get('region').lower()
         self.servers = data.get('servers')
         self.volumes = data.get('volumes')
         self.cbs_hosts = data.get('cbs_hosts')
         self.lookup_type = data.get('lookup_type')
+        self.timings = data.get('timings')
+        self.refresh_mode = data.get('refresh_mode')
+        self.last_full = data.get('last_full')
+        self.item_count = data.get('item_count')
+        self.group_count = data.get('group_count')
 
-    def set_expiration(self):
-        return datetime.now(UTC) + relativedelta(days=1)
+    def set_expiration(self, lifetime=None):
+        return self.cache_created + relativedelta(
+            seconds=lifetime or DEFAULT_CACHE_LIFETIME
+        )
+
+
+SERVER_FIELDS = (
+    'type', 'state', 'id', 'host_id', 'public_zone', 'name', 'created',
+    'flavor', 'addresses', 'reboot_window'
+)
+
+
+def intern_value(interned, value):
+    """
+        Return the copy of value already in the interned table, adding it
+        the first time, so repeated IDs share a single string
+    """
+    if interned is None or value is None:
+        return value
+
+    return interned.setdefault(value, value)
+
+
+class ServerRecord(object):
+    """
+        A processed server held in slots instead of a dict per server. It
+        answers get like the dict it replaces, and only fields that were
+        given are set so to_document produces the same document as before
+    """
+    __slots__ = SERVER_FIELDS
+
+    def __init__(self, interned=None, **fields):
+        for field, value in fields.iteritems():
+            if field in ['host_id', 'public_zone', 'flavor']:
+                value = intern_value(interned, value)
+
+            setattr(self, field, value)
+
+    def get(self, field, default=None):
+        if field not in SERVER_FIELDS:
+            return default
+
+        return getattr(self, field, default)
+
+    def __getitem__(self, field):
+        if field not in SERVER_FIELDS or not hasattr(self, field):
+            raise KeyError(field)
+
+        return getattr(self, field)
+
+    def to_document(self):
+        return dict(
+            (field, getattr(self, field))
+            for field in SERVER_FIELDS if hasattr(self, field)
+        )
@@ -0,0 +1,284 @@
+# Copyright 2014 Dave Kludt
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+"""
+    Queries behind the reports pages. Account runs are listed a page at a
+    time with a projection that leaves out the cached items, paged with a
+    cursor on cache_expiration and _id rather than skip, so every page is
+    a bounded index range. Item and host counts come from the counters
+    stored with each lookup, falling back to an aggregation for accounts
+    cached before the counters were kept.
+
+    The fleet report groups the host index of every cached account by
+    region and host ID to find hosts holding servers of several accounts.
+    Nova hashes host IDs with the tenant, so only accounts whose IDs are
+    hashed alike can be matched.
+"""
+
+from bson.objectid import ObjectId
+from datetime import timedelta
+from datetime import datetime
+from calendar import timegm
+from dateutil import tz
+
+
+import storage
+import pymongo
+
+
+UTC = tz.tzutc()
+EPOCH = datetime(1970, 1, 1, tzinfo=UTC)
+DEFAULT_PAGE_SIZE = 50
+DEFAULT_FLEET_LIMIT = 500
+RUN_FIELDS = {
+    'account_number': 1,
+    'region': 1,
+    'lookup_type': 1,
+    'storage': 1,
+    'cache_created': 1,
+    'cache_expiration': 1,
+    'item_count': 1,
+    'group_count': 1
+}
+
+
+def encode_cursor(account):
+    expiration = account.get('cache_expiration')
+    milliseconds = (
+        timegm(expiration.utctimetuple()) * 1000 +
+        expiration.microsecond / 1000
+    )
+    return '%d_%s' % (milliseconds, account.get('_id'))
+
+
+def decode_cursor(cursor):
+    try:
+        milliseconds, account_id = cursor.split('_')
+        return (
+            EPOCH + timedelta(milliseconds=int(milliseconds)),
+            ObjectId(account_id)
+        )
+    except Exception:
+        return None
+
+
+def fill_counts(db, accounts):
+    """
+        Count the items and hosts of accounts stored without counters
+    """
+    missing = [
+        account for account in accounts if account.get('item_count') is None
+    ]
+    if not missing:
+        return
+
+    data = db.accounts.aggregate(
+        [
+            {
+                '$match': {
+                    '_id': {
+                        '$in': [account.get('_id') for account in missing]
+                    }
+                }
+            }, {
+                '$project': {
+                    'item_count': {
+                        '$add': [
+                            {'$size': {'$ifNull': ['$servers', []]}},
+                            {'$size': {'$ifNull': ['$volumes', []]}}
+                        ]
+                    },
+                    'group_count': {
+                        '$add': [
+                            {'$size': {'$ifNull': ['$host_servers', []]}},
+                            {'$size': {'$ifNull': ['$public_zones', []]}},
+                            {'$size': {'$ifNull': ['$cbs_hosts', []]}}
+                        ]
+                    }
+                }
+            }
+        ]
+    )
+    if isinstance(data, dict):
+        data = data.get('result')
+
+    counts = dict((result.get('_id'), result) for result in data)
+    for account in missing:
+        found = counts.get(account.get('_id'), {})
+        account['group_count'] = found.get('group_count', 0)
+        account['item_count'] = found.get('item_count', 0)
+        if storage.is_normalized(account):
+            account['item_count'] = db[
+                storage.item_collection(account)
+            ].find(storage.item_key(account)).count()
+
+
+def account_runs(
+    db,
+    lookup_type=None,
+    cursor=None,
+    sort=pymongo.DESCENDING,
+    page_size=None
+):
+    """
+        Return a page of live account runs ordered by cache_expiration,
+        and the cursor for the page after it or None on the last page
+    """
+    page_size = page_size or DEFAULT_PAGE_SIZE
+    query = storage.live_filter()
+    if lookup_type:
+        query['lookup_type'] = lookup_type
+
+    position = decode_cursor(cursor) if cursor else None
+    if position:
+        expiration, account_id = position
+        compare = '$lt' if sort == pymongo.DESCENDING else '$gt'
+        query['$or'] = [
+            {'cache_expiration': {compare: expiration}},
+            {'cache_expiration': expiration, '_id': {compare: account_id}}
+        ]
+
+    accounts = list(
+        db.accounts.find(query, RUN_FIELDS).sort(
+            [('cache_expiration', sort), ('_id', sort)]
+        ).limit(page_size + 1)
+    )
+    next_cursor = None
+    if len(accounts) > page_size:
+        accounts = accounts[:page_size]
+        next_cursor = encode_cursor(accounts[-1])
+
+    fill_counts(db, accounts)
+    return accounts, next_cursor
+
+
+def lookup_type_counts(db):
+    data = db.accounts.aggregate(
+        [
+            {
+                '$match': storage.live_filter()
+            }, {
+                '$group': {
+                    '_id': '$lookup_type',
+                    'count': {'$sum': 1}
+                }
+            }
+        ]
+    )
+    if isinstance(data, dict):
+        data = data.get('result')
+
+    return dict((result.get('_id'), result.get('count')) for result in data)
+
+
+def fleet_hosts(db, region=None, min_accounts=2, limit=None):
+    """
+        Hosts with servers from at least min_accounts accounts, the most
+        shared first, each with the accounts and their server counts
+    """
+    query = storage.live_filter()
+    if region:
+        query['region'] = region
+
+    data = db.host_index.aggregate(
+        [
+            {
+                '$match': query
+            }, {
+                '$project': {
+                    'region': 1,
+                    'host_id': 1,
+                    'account_number': 1,
+                    'servers': {'$size': {'$ifNull': ['$servers', []]}}
+                }
+            }, {
+                '$group': {
+                    '_id': {'region': '$region', 'host_id': '$host_id'},
+                    'accounts': {
+                        '$push': {
+                            'account_number': '$account_number',
+                            'servers': '$servers'
+                        }
+                    },
+                    'account_count': {'$sum': 1},
+                    'server_count': {'$sum': '$servers'}
+                }
+            }, {
+                '$match': {'account_count': {'$gte': min_accounts}}
+            }, {
+                '$sort': {'account_count': -1, 'server_count': -1}
+            }, {
+                '$limit': limit or DEFAULT_FLEET_LIMIT
+            }
+        ]
+    )
+    if isinstance(data, dict):
+        data = data.get('result')
+
+    return [
+        {
+            'region': result.get('_id').get('region'),
+            'host_id': result.get('_id').get('host_id'),
+            'accounts': result.get('accounts'),
+            'account_count': result.get('account_count'),
+            'server_count': result.get('server_count')
+        } for result in data
+    ]
+
+
+def fleet_host(db, region, host_id):
+    """
+        The accounts with servers on one host and the servers of each
+    """
+    return list(
+        db.host_index.find(
+            dict(storage.live_filter(), region=region, host_id=host_id),
+            {'_id': 0, 'account_number': 1, 'servers': 1}
+        ).sort('account_number', pymongo.ASCENDING)
+    )
+
+
+def fleet_accounts(hosts):
+    """
+        Per account and region, the shared hosts it has servers on, its
+        servers on them and the other accounts found on those hosts
+    """
+    accounts = {}
+    for host in hosts:
+        numbers = set(
+            account.get('account_number') for account in host.get('accounts')
+        )
+        for account in host.get('accounts'):
+            key = (account.get('account_number'), host.get('region'))
+            found = accounts.setdefault(
+                key,
+                {
+                    'account_number': key[0],
+                    'region': key[1],
+                    'hosts': 0,
+                    'servers': 0,
+                    'peers': set()
+                }
+            )
+            found['hosts'] += 1
+            found['servers'] += account.get('servers')
+            found['peers'].update(numbers - set([key[0]]))
+
+    for found in accounts.values():
+        found['peers'] = sorted(found.get('peers'))
+
+    return sorted(
+        accounts.values(),
+        key=lambda found: (-found.get('servers'), -found.get('hosts'))
+    )
@@ -25,6 +25,7 @@ import context_functions
 import template_filters
 import flask_restful
 import defaults
+import indexes
 import logging
 import views
 
@@ -59,6 +60,7 @@ def create_app(db_name=None):
         g.db, g.auth = db, auth
 
     defaults.application_initialize(db, app)
+    indexes.ensure_indexes(db)
     views.BaseView.register(app)
     views.LookupView.register(app)
     views.ManagementView.register(app)
@@ -69,12 +71,32 @@ def create_app(db_name=None):
         '/account/<account_id>/<region>',
         endpoint='account'
     )
+    api.add_resource(
+        views.AccountLookupAPI,
+        '/account/<account_id>',
+        endpoint='account_lookups'
+    )
+    api.add_resource(
+        views.LookupResultAPI,
+        '/account/<account_id>/lookups/<task_id>',
+        endpoint='lookup_results'
+    )
     api.add_resource(views.TaskAPI, '/task/<task_id>', endpoint='task')
     api.add_resource(
         views.ServerAPI,
         '/account/<account_id>/<region>/server/<server_id>',
         endpoint='server'
     )
+    api.add_resource(
+        views.AnalyticsAPI,
+        '/account/<account_id>/<region>/analytics',
+        endpoint='analytics'
+    )
+    api.add_resource(
+        views.ServerBatchAPI,
+        '/account/<account_id>/<region>/servers',
+        endpoint='servers'
+    )
     if db_name:
         return app, db
     else:
@@ -0,0 +1,632 @@
+# Copyright 2014 Dave Kludt
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+"""
+    Storage for cached lookups. In the embedded layout the servers or
+    volumes live in an array on the account document. In the normalized
+    layout the account document is a small header marked with
+    storage: normalized, and every server or volume is its own document
+    in the servers or volumes collection keyed by account number, region
+    and lookup type. Readers check the header so both layouts can be
+    served side by side while caches turn over.
+"""
+
+from collections import OrderedDict
+from datetime import datetime
+from dateutil import tz
+
+
+import uuid
+
+
+UTC = tz.tzutc()
+DEFAULT_BATCH_SIZE = 500
+EMBEDDED = 'embedded'
+NORMALIZED = 'normalized'
+ITEM_COLLECTIONS = {
+    'host_server': 'servers',
+    'public_ip_zone': 'servers',
+    'cbs_host': 'volumes'
+}
+ITEM_KEY_FIELDS = [
+    'account_number', 'region', 'lookup_type', 'cache_expiration',
+    'lookup_run'
+]
+ACCOUNT_HEADER_FIELDS = [
+    'account_number', 'region', 'lookup_type', 'storage', 'cache_expiration'
+]
+
+
+def live_filter():
+    return {'cache_expiration': {'$gte': datetime.now(UTC)}}
+
+
+def item_collection(account):
+    return ITEM_COLLECTIONS.get(account.get('lookup_type'), 'servers')
+
+
+def item_key(account):
+    return {
+        'account_number': account.get('account_number'),
+        'region': account.get('region'),
+        'lookup_type': account.get('lookup_type')
+    }
+
+
+def is_normalized(account):
+    return bool(account) and account.get('storage') == NORMALIZED
+
+
+def to_document(item):
+    """
+        Convert a processed record to the dict stored for it, items that
+        are already documents are returned as they are
+    """
+    if hasattr(item, 'to_document'):
+        return item.to_document()
+
+    return item
+
+
+def header_projection():
+    """
+        Fields of an account needed to add servers to it, leaving out the
+        embedded servers and volumes
+    """
+    return dict((field, 1) for field in ACCOUNT_HEADER_FIELDS)
+
+
+def item_projection(fields=None):
+    if fields:
+        projection = dict((field, 1) for field in fields)
+        projection['_id'] = 0
+        return projection
+
+    projection = dict((field, 0) for field in ITEM_KEY_FIELDS)
+    projection['_id'] = 0
+    return projection
+
+
+class ItemWriter:
+    """
+        List-like sink for the servers or volumes of a lookup. For the
+        embedded layout the items are kept for the account document. For
+        the normalized layout they are upserted by id in unordered bulk
+        batches of batch_size as they arrive, each tagged with this run's
+        id so items missing from the new listing can be removed once the
+        account header has been replaced. An incremental writer only
+        receives changed items, removes the discarded ones explicitly and
+        extends the expiry of the rest.
+    """
+    def __init__(
+        self,
+        db,
+        account,
+        storage_mode=EMBEDDED,
+        batch_size=None,
+        incremental=False
+    ):
+        document = account.__dict__
+        self.db = db
+        self.collection = item_collection(document)
+        self.key = item_key(document)
+        self.cache_expiration = document.get('cache_expiration')
+        self.normalized = storage_mode == NORMALIZED
+        self.batch_size = batch_size or DEFAULT_BATCH_SIZE
+        self.incremental = incremental
+        self.run_id = uuid.uuid4().hex
+        self.items, self.batch, self.removed, self.count = [], [], [], 0
+
+    def __len__(self):
+        return self.count
+
+    def append(self, item):
+        self.count += 1
+        if not self.normalized:
+            self.items.append(item)
+            return
+
+        self.batch.append(item)
+        if len(self.batch) >= self.batch_size:
+            self.flush()
+
+    def keep(self, item):
+        """
+            Carry an unchanged cached item into an incremental refresh. The
+            normalized document is already stored, so it is only counted.
+        """
+        self.count += 1
+        if not self.normalized:
+            self.items.append(item)
+
+    def discard(self, item_id):
+        if self.normalized:
+            self.removed.append(item_id)
+
+    def flush(self):
+        if not self.batch:
+            return
+
+        bulk = self.db[self.collection].initialize_unordered_bulk_op()
+        for item in self.batch:
+            document = dict(to_document(item), **self.key)
+            document['cache_expiration'] = self.cache_expiration
+            document['lookup_run'] = self.run_id
+            bulk.find(
+                dict(self.key, id=item.get('id'))
+            ).upsert().replace_one(document)
+
+        bulk.execute()
+        self.batch = []
+
+    def remove_stale(self):
+        if not self.normalized:
+            # Item documents left by an earlier normalized lookup would
+            # otherwise be read ahead of the embedded items
+            self.db[self.collection].remove(self.key)
+            return
+
+        collection = self.db[self.collection]
+        if not self.incremental:
+            collection.remove(dict(self.key, lookup_run={'$ne': self.run_id}))
+            return
+
+        if self.removed:
+            collection.remove(dict(self.key, id={'$in': self.removed}))
+
+        collection.update(
+            self.key,
+            {'$set': {'cache_expiration': self.cache_expiration}},
+            multi=True
+        )
+
+
+def save_account(db, account, writer, host_servers=None):
+    """
+        Write any buffered items, upsert the account document and return
+        its id from the upsert instead of reading the document back. The
+        host to servers map of a host_server lookup replaces its host index.
+    """
+    document = dict(account.__dict__)
+    document['item_count'] = len(writer)
+    document['group_count'] = len(
+        document.get('host_servers') or
+        document.get('public_zones') or
+        document.get('cbs_hosts') or
+        []
+    )
+    if writer.normalized:
+        document['servers'], document['volumes'] = None, None
+        document['storage'] = NORMALIZED
+    else:
+        document[writer.collection] = [
+            to_document(item) for item in writer.items
+        ]
+
+    writer.flush()
+    saved = db.accounts.find_and_modify(
+        item_key(document),
+        document,
+        upsert=True,
+        new=True,
+        fields={'_id': 1}
+    )
+    writer.remove_stale()
+    if host_servers is not None:
+        save_host_index(db, document, host_servers, writer.batch_size)
+
+    return saved.get('_id')
+
+
+def save_host_index(db, account, host_servers, batch_size=None):
+    """
+        Replace the host index for the account and region with one
+        document per host listing the servers on it, so finding the
+        servers that share a host is a single indexed read
+    """
+    key = {
+        'account_number': account.get('account_number'),
+        'region': account.get('region')
+    }
+    run_id, hosts = uuid.uuid4().hex, host_servers.items()
+    batch_size = batch_size or DEFAULT_BATCH_SIZE
+    for start in range(0, len(hosts), batch_size):
+        bulk = db.host_index.initialize_unordered_bulk_op()
+        for host_id, servers in hosts[start:start + batch_size]:
+            bulk.find(dict(key, host_id=host_id)).upsert().replace_one(
+                dict(
+                    key,
+                    host_id=host_id,
+                    servers=servers,
+                    cache_expiration=account.get('cache_expiration'),
+                    lookup_run=run_id
+                )
+            )
+
+        bulk.execute()
+
+    db.host_index.remove(dict(key, lookup_run={'$ne': run_id}))
+
+
+def index_account_hosts(db, account, batch_size=None):
+    """
+        Build the host index of a cached host_server lookup from its
+        servers, for accounts cached before the index was kept
+    """
+    host_servers = OrderedDict()
+    for server in iter_items(db, account, ['id', 'name', 'host_id']):
+        host_servers.setdefault(server.get('host_id'), []).append(
+            {
+                'id': server.get('id'),
+                'name': server.get('name')
+            }
+        )
+
+    save_host_index(db, account, host_servers, batch_size)
+    return len(host_servers)
+
+
+def load_items(db, account, fields=None):
+    """
+        Fill in the servers or volumes on a normalized account header so
+        callers can treat it like an embedded document
+    """
+    if is_normalized(account):
+        collection = item_collection(account)
+        account[collection] = list(
+            db[collection].find(
+                item_key(account),
+                item_projection(fields)
+            )
+        )
+
+    return account
+
+
+def iter_items(db, account, fields):
+    """
+        Cursor over the given fields of the servers or volumes of a cached
+        account, without loading them all at once. Embedded items are
+        unwound by the server so only the projected fields are returned.
+    """
+    collection = item_collection(account)
+    if is_normalized(account):
+        return db[collection].find(item_key(account), item_projection(fields))
+
+    projection = dict(
+        (field, '$%s.%s' % (collection, field)) for field in fields
+    )
+    projection['_id'] = 0
+    data = db.accounts.aggregate(
+        [
+            {
+                '$match': {
+                    '_id': account.get('_id')
+                }
+            }, {
+                '$unwind': '$%s' % collection
+            }, {
+                '$project': projection
+            }
+        ],
+        cursor={}
+    )
+    if isinstance(data, dict):
+        return iter(data.get('result'))
+
+    return data
+
+
+def find_server(db, account_number, region, server_id):
+    server = db.servers.find_one(
+        dict(
+            live_filter(),
+            account_number=account_number,
+            region=region,
+            id=server_id
+        ),
+        item_projection()
+    )
+    if server:
+        return server
+
+    account = db.accounts.find_one(
+        dict(
+            live_filter(),
+            account_number=account_number,
+            region=region,
+            **{'servers.id': server_id}
+        ), {
+            'servers.$': 1
+        }
+    )
+    if account:
+        return account.get('servers')[0]
+
+    return None
+
+
+def servers_on_host(db, account_number, region, host_id):
+    indexed = db.host_index.find_one(
+        dict(
+            live_filter(),
+            account_number=account_number,
+            region=region,
+            host_id=host_id
+        ), {
+            '_id': 0,
+            'servers': 1
+        }
+    )
+    if indexed:
+        return [{'server': server} for server in indexed.get('servers')]
+
+    servers = [
+        {
+            'server': server
+        } for server in db.servers.find(
+            dict(
+                live_filter(),
+                account_number=account_number,
+                region=region,
+                host_id=host_id
+            ), {
+                '_id': 0,
+                'name': 1,
+                'id': 1
+            }
+        )
+    ]
+    data = db.accounts.aggregate(
+        [
+            {
+                '$match': dict(
+                    live_filter(),
+                    account_number=account_number,
+                    region=region
+                )
+            }, {
+                '$unwind': '$servers'
+            }, {
+                '$match': {
+                    'servers.host_id': host_id
+                }
+            }, {
+                '$project': {
+                    '_id': 0,
+                    'server': {
+                        'name': '$servers.name',
+                        'id': '$servers.id'
+                    }
+                }
+            }
+        ]
+    )
+    if isinstance(data, dict):
+        return servers + data.get('result')
+    else:
+        return servers + list(data)
+
+
+def host_has_servers(db, account_number, region, host_id):
+    query = dict(
+        live_filter(),
+        account_number=account_number,
+        region=region
+    )
+    if db.servers.find_one(dict(query, host_id=host_id), {'_id': 1}):
+        return True
+
+    return bool(
+        db.accounts.find_one(
+            dict(query, **{'servers.host_id': host_id}),
+            {'_id': 1}
+        )
+    )
+
+
+def server_exists(db, account_number, region, server_id):
+    """
+        Whether the server is already in the account's live cache for the
+        region, answered from the account scoped server id indexes
+    """
+    query = dict(
+        live_filter(),
+        account_number=account_number,
+        region=region
+    )
+    if db.servers.find_one(dict(query, id=server_id), {'_id': 1}):
+        return True
+
+    return bool(
+        db.accounts.find_one(
+            dict(query, **{'servers.id': server_id}),
+            {'_id': 1}
+        )
+    )
+
+
+def add_servers_to_host_index(db, account_number, region, servers):
+    """
+        Keep the host index current for servers added after the lookup.
+        Accounts without an index are left alone so readers keep falling
+        back to the cached servers.
+    """
+    query = {'account_number': account_number, 'region': region}
+    index = db.host_index.find_one(
+        dict(live_filter(), **query),
+        {'cache_expiration': 1}
+    )
+    if not index or not servers:
+        return
+
+    host_servers = OrderedDict()
+    for server_data in servers:
+        host_servers.setdefault(server_data.get('host_id'), []).append(
+            {
+                'id': server_data.get('id'),
+                'name': server_data.get('name')
+            }
+        )
+
+    bulk = db.host_index.initialize_unordered_bulk_op()
+    for host_id, host_entries in host_servers.iteritems():
+        bulk.find(dict(query, host_id=host_id)).upsert().update(
+            {
+                '$push': {
+                    'servers': {
+                        '$each': host_entries
+                    }
+                },
+                '$setOnInsert': {
+                    'cache_expiration': index.get('cache_expiration')
+                }
+            }
+        )
+
+    bulk.execute()
+
+
+def add_servers(db, account, servers):
+    """
+        Cache servers checked after the lookup with a single write to the
+        account's servers, in whichever layout the account was stored
+    """
+    if not servers:
+        return
+
+    servers = [to_document(server_data) for server_data in servers]
+    add_servers_to_host_index(
+        db,
+        account.get('account_number'),
+        account.get('region'),
+        servers
+    )
+    if is_normalized(account):
+        items = []
+        for server_data in servers:
+            item = dict(server_data, **item_key(account))
+            item['cache_expiration'] = account.get('cache_expiration')
+            items.append(item)
+
+        db.servers.insert(items)
+    else:
+        db.accounts.update(
+            {
+                '_id': account.get('_id')
+            }, {
+                '$push': {
+                    'servers': {
+                        '$each': servers
+                    }
+                }
+            }
+        )
+
+    db.accounts.update(
+        {
+            '_id': account.get('_id'),
+            'item_count': {'$exists': True}
+        }, {
+            '$inc': {
+                'item_count': len(servers)
+            }
+        }
+    )
+
+
+def add_server(db, account, server_data):
+    add_servers(db, account, [server_data])
+
+
+def remove_account(db, account_number, region):
+    query = {
+        'account_number': account_number,
+        'region': region
+    }
+    db.accounts.remove(query)
+    db.servers.remove(query)
+    db.volumes.remove(query)
+    db.host_index.remove(query)
+
+
+def queue_task(db, task_id, account_number=None):
+    """
+        Record a newly queued task as pending, along with the account it
+        runs for so only that account is given its result. A state already
+        written by the worker is left alone, in case the task finished
+        first.
+    """
+    update = {
+        '$setOnInsert': {
+            'state': 'PENDING',
+            'created': datetime.now(UTC)
+        }
+    }
+    if account_number:
+        update['$set'] = {'account_number': account_number}
+
+    db.task_results.update({'_id': task_id}, update, upsert=True)
+
+
+def set_task_state(db, task_id, state, result=None, account_number=None):
+    values = {
+        'state': state,
+        'result': result
+    }
+    if account_number:
+        values['account_number'] = account_number
+
+    db.task_results.update(
+        {'_id': task_id},
+        {
+            '$set': values,
+            '$setOnInsert': {
+                'created': datetime.now(UTC)
+            }
+        },
+        upsert=True
+    )
+
+
+def set_task_progress(db, task_id, phase, pages, items):
+    """
+        Record how far a running lookup has got. The version is bumped on
+        every update so polling readers can tell when it changed.
+    """
+    db.task_results.update(
+        {'_id': task_id},
+        {
+            '$set': {
+                'phase': phase,
+                'pages': pages,
+                'items': items
+            },
+            '$inc': {
+                'version': 1
+            },
+            '$setOnInsert': {
+                'state': 'PENDING',
+                'created': datetime.now(UTC)
+            }
+        },
+        upsert=True
+    )
+
+
+def get_task_result(db, task_id):
+    return db.task_results.find_one(
+        {'_id': task_id},
+        {'_id': 0, 'created': 0}
+    )
@@ -12,15 +12,30 @@
 # See the License for the specific language governing permissions and
 # limitations under the License.
 
+from models import Account, ServerRecord, DEFAULT_CACHE_LIFETIME
+from dateutil.relativedelta import relativedelta
+from celery.signals import worker_init, task_postrun
 from celery.utils.log import get_task_logger
+from multiprocessing.pool import ThreadPool
+from aggregation import HostAggregator
+from collections import OrderedDict
 from happymongo import HapPyMongo
-from models import Account
-from celery import Celery
+from celery import Celery, chord
+from datetime import datetime
+from dateutil import tz
 
 
 import config.celery as config
+import threading
 import requests
+import decoders
+import indexes
+import storage
+import access
+import client
+import random
 import json
+import time
 import re
 
 
@@ -28,12 +43,24 @@ import re
 requests.packages.urllib3.disable_warnings()
 
 
+UTC = tz.tzutc()
+
+
 celery_app = Celery('anchor')
 logger = get_task_logger(__name__)
 celery_app.config_from_object(config)
 mongo, db = HapPyMongo(config)
 
 
+LOOKUP_TYPES = ['host_server', 'public_ip_zone', 'cbs_host']
+REFRESH_MODES = ['full', 'delta']
+
+
+@worker_init.connect
+def bootstrap_indexes(**kwargs):
+    indexes.ensure_indexes(db)
+
+
 def process_api_request(url, verb, data, headers, status=None):
     try:
         """
@@ -47,10 +74,12 @@ def process_api_request(url, verb, data, headers, status=None):
             )
         else:
         """
-        response = getattr(requests, verb.lower())(
+        session = client.get_session(url, config)
+        response = getattr(session, verb.lower())(
             url,
             headers=headers,
-            verify=False
+            verify=False,
+            timeout=client.get_timeout(config)
         )
     except Exception as e:
         logger.error('An error occured executing the API call: %s' % e)
@@ -59,19 +88,35 @@ def process_api_request(url, verb, data, headers, status=None):
         if status:
             return response._status_code
 
-        return json.loads(response.content)
+        return decoders.decode(response.content, config)
     except Exception as e:
         logger.error('An error occured loading the content: %s' % e)
         return None
 
 
-def generate_server_list(account_number, token, region):
-    exit, all_servers, limit, marker = False, [], 100, None
+def generate_server_list(
+    account_number,
+    token,
+    region,
+    on_page=None,
+    changes_since=None,
+    listing=None
+):
+    """
+        Yield the next gen servers a page at a time, so each page can be
+        processed and stored before the next one is requested. on_page is
+        called with the size of each page as it arrives. With
+        changes_since only servers changed after that time are listed,
+        including deleted ones. The listing dict, when given, adds up the
+        seconds spent requesting pages under time, and is marked as not
+        complete when a page fails, which also ends the listing.
+    """
+    limit, marker = 100, None
     headers = {
         'X-Auth-Token': token,
         'Content-Type': 'application/json'
     }
-    while exit is False:
+    while True:
         if marker is None:
             url = (
                 'https://%s.servers.api.rackspacecloud.com/v2/%s/'
@@ -81,52 +126,115 @@ def generate_server_list(account_number, token, region):
                     limit
                 )
             )
+            if changes_since:
+                url += '&changes-since=%s' % changes_since
         else:
             url = marker
 
+        start = time.time()
         content = process_api_request(url, 'get', None, headers)
+        if listing is not None:
+            listing['time'] = listing.get('time', 0) + time.time() - start
+
         if not content:
-            break
+            if listing is not None:
+                listing['complete'] = False
+
+            return
 
         servers = content.get('servers')
-        if len(servers) < limit:
-            exit = True
-        else:
-            links = content.get('servers_links')[0]
-            marker = links.get('href')
+        if on_page:
+            on_page(len(servers))
+
+        for server in servers:
+            yield server
 
-        all_servers += servers
+        if len(servers) < limit:
+            return
 
-    return all_servers
+        links = content.get('servers_links')[0]
+        marker = links.get('href')
 
 
-def generate_volume_list(account_number, token, region):
-    exit, all_volumes, limit, offset = False, [], 100, 0
+def generate_volume_list(
+    account_number,
+    token,
+    region,
+    workers=None,
+    on_page=None
+):
+    """
+        Page through the block storage volumes. After the first page the
+        remaining offsets are requested in batches of `workers` concurrent
+        calls and reassembled in offset order, stopping at the first short
+        or failed page. on_page is called with the size of each page.
+    """
+    limit, offset = 100, 0
     headers = {
         'X-Auth-Token': token,
         'Content-Type': 'application/json'
     }
-    while exit is False:
+    if workers is None:
+        workers = getattr(config, 'CBS_PAGE_WORKERS', 4)
+
+    workers = max(1, workers)
+
+    def fetch_page(page_offset):
         url = (
             'https://%s.blockstorage.api.rackspacecloud.com/v1/%s/'
             'volumes/detail?limit=%d&offset=%d' % (
                 region.lower(),
                 account_number,
                 limit,
-                offset
+                page_offset
             )
         )
         content = process_api_request(url, 'get', None, headers)
         if not content:
-            break
+            return None
 
-        volumes = content.get('volumes')
-        if len(volumes) < limit:
-            exit = True
-        else:
-            offset += limit
+        return content.get('volumes')
 
-        all_volumes += volumes
+    all_volumes = fetch_page(offset)
+    if on_page and all_volumes is not None:
+        on_page(len(all_volumes))
+
+    if not all_volumes or len(all_volumes) < limit:
+        return all_volumes or []
+
+    pool = None
+    if workers > 1:
+        pool = ThreadPool(workers)
+
+    try:
+        exit = False
+        while exit is False:
+            offsets = [
+                offset + (limit * (count + 1)) for count in range(workers)
+            ]
+            if pool:
+                pages = pool.map(fetch_page, offsets)
+            else:
+                pages = [fetch_page(page_offset) for page_offset in offsets]
+
+            for volumes in pages:
+                if volumes is None:
+                    exit = True
+                    break
+
+                all_volumes += volumes
+                if on_page:
+                    on_page(len(volumes))
+
+                if len(volumes) < limit:
+                    exit = True
+                    break
+
+            offset = offsets[-1]
+    finally:
+        if pool:
+            pool.close()
+            pool.join()
 
     return all_volumes
 
@@ -181,51 +289,189 @@ def check_authorized(account_number, token):
     return False
 
 
-def generate_host_and_cbs_data(all_volumes):
-    hosts, volumes = [], []
+def report_progress(task_id, phase, pages, items):
+    if task_id:
+        storage.set_task_progress(db, task_id, phase, pages, items)
+
+
+def get_cache_lifetime(lookup_type):
+    return getattr(config, 'CACHE_LIFETIMES', {}).get(lookup_type)
+
+
+def timed_call(function, *args):
+    start = time.time()
+    result = function(*args)
+    return result, round(time.time() - start, 3)
+
+
+def generate_host_and_cbs_data(all_volumes, volumes=None):
+    hosts = HostAggregator()
+    if volumes is None:
+        volumes = []
+
     for volume in all_volumes:
         metadata = volume.get('metadata')
         if metadata:
-            storage_node = metadata.get('storage-node')
             data = process_volume_details(volume)
             volumes.append(data)
-            if storage_node not in hosts:
-                hosts.append(storage_node)
+            hosts.add(metadata.get('storage-node'), data.get('id'))
 
     return volumes, hosts
 
 
-def generate_host_and_server_data(ng_servers, fg_servers):
-    hosts, servers = [], []
+def generate_host_and_server_data(ng_servers, fg_servers, servers=None):
+    hosts, interned = HostAggregator(), {}
+    if servers is None:
+        servers = []
+
     for server in ng_servers:
-        host_id = server.get('hostId')
-        data = process_server_details(server)
+        data = process_server_details(server, interned)
         servers.append(data)
-        if host_id not in hosts:
-            hosts.append(host_id)
+        hosts.add(data.get('host_id'), data.get('id'), data.get('name'))
 
     for server in fg_servers:
-        host_id = server.get('hostId')
-        data = process_fg_server_details(server)
+        data = process_fg_server_details(server, interned)
         servers.append(data)
-        if host_id not in hosts:
-            hosts.append(host_id)
+        hosts.add(data.get('host_id'), data.get('id'), data.get('name'))
 
     return servers, hosts
 
 
-def generate_zone_and_server_data(ng_servers):
-    public_zones, servers = [], []
+def generate_zone_and_server_data(ng_servers, servers=None):
+    public_zones, interned = HostAggregator(), {}
+    if servers is None:
+        servers = []
+
     for server in ng_servers:
-        public_zone = server.get('RAX-PUBLIC-IP-ZONE-ID:publicIPZoneId')
-        data = process_server_details(server)
+        data = process_server_details(server, interned)
         servers.append(data)
-        if public_zone not in public_zones:
-            public_zones.append(public_zone)
+        public_zones.add(data.get('public_zone'), data.get('id'))
 
     return servers, public_zones
 
 
+def merge_server_changes(
+    cached_servers,
+    ng_changes,
+    fg_servers,
+    lookup_type,
+    writer
+):
+    """
+        Apply the next gen servers changed since the last lookup, and the
+        current first gen servers, to the cached servers. Host (or zone)
+        membership is only touched for changed servers, deleted servers
+        are discarded and unchanged servers are kept as they are.
+    """
+    host_field = 'host_id'
+    if lookup_type == 'public_ip_zone':
+        host_field = 'public_zone'
+
+    hosts, servers, cached_fg = HostAggregator(), OrderedDict(), []
+    interned = {}
+    for server in cached_servers:
+        if server.get('type') == 'fg':
+            cached_fg.append(server.get('id'))
+            continue
+
+        servers[server.get('id')] = server
+        hosts.add(
+            server.get(host_field),
+            server.get('id'),
+            server.get('name')
+        )
+
+    for server in ng_changes:
+        server_id = server.get('id')
+        previous = servers.pop(server_id, None)
+        if previous:
+            hosts.remove(previous.get(host_field), server_id)
+
+        if (
+            server.get('status') == 'DELETED' or
+            server.get('OS-EXT-STS:vm_state') == 'deleted'
+        ):
+            writer.discard(server_id)
+            continue
+
+        data = process_server_details(server, interned)
+        writer.append(data)
+        hosts.add(data.get(host_field), server_id, data.get('name'))
+
+    fg_ids = set()
+    for server in fg_servers:
+        data = process_fg_server_details(server, interned)
+        writer.append(data)
+        fg_ids.add(data.get('id'))
+        hosts.add(data.get(host_field), data.get('id'), data.get('name'))
+
+    for server_id in cached_fg:
+        if server_id not in fg_ids:
+            writer.discard(server_id)
+
+    for server in servers.itervalues():
+        writer.keep(server)
+
+    return writer, hosts
+
+
+def find_cached_account(account_number, region, lookup_type):
+    return db.accounts.find_one(
+        dict(
+            storage.live_filter(),
+            account_number=account_number,
+            region=region,
+            lookup_type=lookup_type
+        )
+    )
+
+
+def as_utc(value):
+    if value.tzinfo is None:
+        value = value.replace(tzinfo=UTC)
+
+    return value.astimezone(UTC)
+
+
+def get_cache_created(account):
+    """
+        Creation time of a cached account, or for older entries its
+        expiration less the cache lifetime
+    """
+    created = account.get('cache_created')
+    if created is None:
+        created = account.get('cache_expiration') - relativedelta(
+            seconds=(
+                get_cache_lifetime(account.get('lookup_type')) or
+                DEFAULT_CACHE_LIFETIME
+            )
+        )
+
+    return as_utc(created)
+
+
+def get_changes_since(account):
+    return get_cache_created(account).strftime('%Y-%m-%dT%H:%M:%SZ')
+
+
+def needs_full_refresh(account):
+    """
+        Deltas only carry changes since the run before them, so a cached
+        account is listed in full again once its last complete full
+        listing is older than the cache lifetime
+    """
+    last_full = account.get('last_full') if account else None
+    if last_full is None:
+        return True
+
+    return as_utc(last_full) < datetime.now(UTC) - relativedelta(
+        seconds=(
+            get_cache_lifetime(account.get('lookup_type')) or
+            DEFAULT_CACHE_LIFETIME
+        )
+    )
+
+
 def process_volume_details(volume):
     status = volume.get('status')
     data = {
@@ -247,8 +493,8 @@ def process_volume_details(volume):
     return data
 
 
-def process_server_details(server):
-    data, addresses, found_public = {}, {}, False
+def process_server_details(server, interned=None):
+    addresses, found_public = {}, False
     for key, value in server.get('addresses').iteritems():
         if key not in ['public', 'private']:
             key = 'custom'
@@ -271,37 +517,34 @@ def process_server_details(server):
     if not found_public and server.get('accessIPv4'):
         addresses['public'] = [server.get('accessIPv4')]
 
-    host_id = server.get('hostId')
     metadata = server.get('metadata', {})
-    data = {
-        'state': server.get('OS-EXT-STS:vm_state'),
-        'id': server.get('id'),
-        'host_id': host_id,
-        'public_zone': server.get('RAX-PUBLIC-IP-ZONE-ID:publicIPZoneId'),
-        'name': server.get('name'),
-        'created': server.get('created'),
-        'flavor': server.get('flavor').get('id'),
-        'addresses': addresses,
-        'reboot_window': metadata.get('rax:reboot_window')
-    }
-    return data
+    return ServerRecord(
+        interned,
+        state=server.get('OS-EXT-STS:vm_state'),
+        id=server.get('id'),
+        host_id=server.get('hostId'),
+        public_zone=server.get('RAX-PUBLIC-IP-ZONE-ID:publicIPZoneId'),
+        name=server.get('name'),
+        created=server.get('created'),
+        flavor=server.get('flavor').get('id'),
+        addresses=addresses,
+        reboot_window=metadata.get('rax:reboot_window')
+    )
 
 
-def process_fg_server_details(server):
-    data = {}
-    host_id = server.get('hostId')
+def process_fg_server_details(server, interned=None):
     metadata = server.get('metadata', {})
-    data = {
-        'type': 'fg',
-        'state': server.get('status'),
-        'id': server.get('id'),
-        'host_id': host_id,
-        'name': server.get('name'),
-        'flavor': server.get('flavorId'),
-        'addresses': server.get('addresses'),
-        'reboot_window': metadata.get('rax:reboot_window')
-    }
-    return data
+    return ServerRecord(
+        interned,
+        type='fg',
+        state=server.get('status'),
+        id=server.get('id'),
+        host_id=server.get('hostId'),
+        name=server.get('name'),
+        flavor=server.get('flavorId'),
+        addresses=server.get('addresses'),
+        reboot_window=metadata.get('rax:reboot_window')
+    )
 
 
 @celery_app.task
@@ -310,60 +553,224 @@ def generate_account_object_list(
     token,
     region,
     lookup_type,
-    web=None
+    web=None,
+    mode=None
 ):
-    servers, volumes = [], []
-    data = {
-        'account_number': account_number,
-        'region': region,
-        'token': token
-    }
+    cached = None
+    storage_mode = getattr(config, 'ACCOUNT_STORAGE', storage.EMBEDDED)
+    if mode == 'delta' and lookup_type in ['host_server', 'public_ip_zone']:
+        cached = find_cached_account(account_number, region, lookup_type)
+
+    # Unchanged servers are only carried over in place when the cache was
+    # stored in the configured layout, otherwise every server is relisted
+    if cached and storage.is_normalized(cached) != (
+        storage_mode == storage.NORMALIZED
+    ):
+        cached = None
+
+    store_account = Account(
+        {
+            'account_number': account_number,
+            'region': region,
+            'lookup_type': lookup_type,
+            'cache_lifetime': get_cache_lifetime(lookup_type),
+            'refresh_mode': 'delta' if cached else 'full',
+            'last_full': cached.get('last_full') if cached else None
+        }
+    )
+    if not cached:
+        store_account.last_full = store_account.cache_created
+
+    writer = storage.ItemWriter(
+        db,
+        store_account,
+        storage_mode,
+        getattr(config, 'STORAGE_BATCH_SIZE', None),
+        bool(cached)
+    )
+    task_id, progress = generate_account_object_list.request.id, {'pages': 0}
+    host_index = None
+
+    def page_received(count):
+        progress['pages'] += 1
+        report_progress(task_id, 'listing', progress['pages'], len(writer))
+
     if lookup_type in ['host_server', 'public_ip_zone']:
-        ng_servers = generate_server_list(account_number, token, region)
-        fg_servers = generate_first_gen_server_list(
+        first_gen, timings = {'servers': [], 'time': None}, {}
+        listing = {'complete': True, 'time': 0}
+
+        def list_first_gen_servers():
+            first_gen['servers'], first_gen['time'] = timed_call(
+                generate_first_gen_server_list,
+                account_number,
+                token,
+                region
+            )
+
+        def first_gen_servers():
+            fg_thread.join()
+            for server in first_gen.get('servers') or []:
+                yield server
+
+        fg_thread = threading.Thread(target=list_first_gen_servers)
+        fg_thread.start()
+        ng_servers = generate_server_list(
             account_number,
             token,
-            region
+            region,
+            page_received,
+            get_changes_since(cached) if cached else None,
+            listing=listing
         )
-        if lookup_type == 'host_server':
-            servers, hosts = generate_host_and_server_data(
+        if cached:
+            fg_servers = []
+            if lookup_type == 'host_server':
+                fg_servers = first_gen_servers()
+
+            writer, hosts = merge_server_changes(
+                storage.load_items(db, cached).get('servers') or [],
                 ng_servers,
-                fg_servers
+                fg_servers,
+                lookup_type,
+                writer
             )
-            data['host_servers'] = hosts
-        elif lookup_type == 'public_ip_zone':
-            servers, public_zones = generate_zone_and_server_data(ng_servers)
-            data['public_zones'] = public_zones
+        elif lookup_type == 'host_server':
+            writer, hosts = generate_host_and_server_data(
+                ng_servers,
+                first_gen_servers(),
+                writer
+            )
+        else:
+            writer, hosts = generate_zone_and_server_data(ng_servers, writer)
 
-        data['servers'] = servers
+        fg_thread.join()
+        if lookup_type == 'host_server':
+            host_index = hosts.host_map
+            store_account.host_servers = hosts.hosts
+            store_account.host_counts = hosts.counts()
+        else:
+            store_account.public_zones = hosts.hosts
+            store_account.zone_counts = hosts.counts()
+
+        if not listing.get('complete'):
+            logger.error(
+                'Listing of %s in %s was incomplete' % (
+                    account_number,
+                    region
+                )
+            )
+            if cached:
+                # Servers on the pages that failed were kept as unchanged,
+                # so the next delta asks for changes since the previous
+                # run again
+                store_account.cache_created = get_cache_created(cached)
+            else:
+                store_account.last_full = None
+
+        # Only the page requests are timed, not the processing and writes
+        # done while the pages are consumed
+        timings['next_gen'] = round(listing.get('time'), 3)
+        timings['first_gen'] = first_gen.get('time')
+        store_account.timings = timings
     else:
-        volume_list = generate_volume_list(account_number, token, region)
-        volumes, hosts = generate_host_and_cbs_data(volume_list)
-        data['cbs_hosts'] = hosts
-        data['volumes'] = volumes
-
-    data['lookup_type'] = lookup_type
-    store_account = Account(data)
-    db.accounts.update(
-        {
-            'account_number': store_account.account_number,
-            'region': region,
-            'lookup_type': lookup_type
-        },
-        store_account.__dict__,
-        upsert=True
-    )
+        volume_list, volume_time = timed_call(
+            generate_volume_list,
+            account_number,
+            token,
+            region,
+            None,
+            page_received
+        )
+        store_account.timings = {'volumes': volume_time}
+        writer, hosts = generate_host_and_cbs_data(volume_list, writer)
+        store_account.cbs_hosts = hosts.hosts
+        store_account.host_counts = hosts.counts()
+
+    report_progress(task_id, 'saving', progress['pages'], len(writer))
+    account_id = storage.save_account(db, store_account, writer, host_index)
     if web:
-        account_data = db.accounts.find_one(
+        return str(account_id)
+
+    return
+
+
+@task_postrun.connect
+def record_lookup_result(
+    task_id=None,
+    task=None,
+    retval=None,
+    state=None,
+    **kwargs
+):
+    """
+        Keep the state and result of finished lookups and server checks in
+        Mongo, so they can be polled without touching the result backend
+    """
+    if task is None or task.name not in [
+        generate_account_object_list.name,
+        check_server_placement.name
+    ]:
+        return
+
+    result = None
+    if state == 'SUCCESS':
+        result = retval
+
+    args = kwargs.get('args') or []
+    account_number = None
+    if task.name == generate_account_object_list.name and args:
+        account_number = args[0]
+    elif task.name == check_server_placement.name and len(args) >= 3:
+        account_number = args[2]
+
+    storage.set_task_state(db, task_id, state, result, account_number)
+    if task.name == generate_account_object_list.name and len(args) >= 4:
+        access.release_refresh(db, args[0], args[2], args[3])
+
+
+def start_region_lookups(account_number, token, regions, lookup_types):
+    """
+        Fan out one lookup per region and lookup type as a chord. The
+        returned result belongs to the callback, so its id is the single
+        task id for the combined lookup.
+    """
+    lookups = [
+        [region, lookup_type]
+        for region in regions for lookup_type in lookup_types
+    ]
+    header = [
+        generate_account_object_list.s(
+            account_number,
+            token,
+            region,
+            lookup_type,
+            True
+        ) for region, lookup_type in lookups
+    ]
+    return chord(header)(
+        store_region_lookup_results.s(account_number, lookups)
+    )
+
+
+@celery_app.task
+def store_region_lookup_results(results, account_number, lookups):
+    summary = {
+        'account_number': account_number,
+        'lookups': [
             {
-                'account_number': store_account.account_number,
                 'region': region,
-                'lookup_type': lookup_type
-            }
-        )
-        return str(account_data.get('_id'))
+                'lookup_type': lookup_type,
+                'account_id': account_id
+            } for (region, lookup_type), account_id in zip(lookups, results)
+        ]
+    }
+    task_id = store_region_lookup_results.request.id
+    if task_id:
+        summary['_id'] = task_id
 
-    return
+    summary['completed'] = datetime.now(UTC)
+    db.lookups.insert(summary)
+    return summary.get('lookups')
 
 
 @celery_app.task
@@ -382,24 +789,362 @@ def check_add_server_to_cache(
     )
     if server_details:
         server_data = process_server_details(server_details)
-        check_duplicate = db.accounts.find_one(
+        check_duplicate = storage.host_has_servers(
+            db,
+            account_number,
+            region,
+            server_data.get('host_id')
+        )
+        storage.add_server(db, account_data, server_data)
+        return check_duplicate
+    return None
+
+
+def check_add_servers_to_cache(
+    token,
+    region,
+    account_number,
+    server_ids,
+    account_data,
+    workers=None
+):
+    """
+        Batch form of check_add_server_to_cache. Server details are fetched
+        concurrently and every server found is cached with one write. The
+        result for each requested ID, in order, is either its host and
+        whether it shares that host, or an error when Nova did not return it
+    """
+    if workers is None:
+        workers = getattr(config, 'SERVER_DETAIL_WORKERS', 10)
+
+    def fetch_details(server_id):
+        return get_server_details(token, region, account_number, server_id)
+
+    pool = ThreadPool(max(min(workers, len(server_ids)), 1))
+    try:
+        details = pool.map(fetch_details, server_ids)
+    finally:
+        pool.close()
+        pool.join()
+
+    servers, found, batch_hosts, interned = [], {}, {}, {}
+    for server_id, server_details in zip(server_ids, details):
+        if server_details:
+            server_data = process_server_details(server_details, interned)
+            servers.append(server_data)
+            found[server_id] = server_data
+            host_id = server_data.get('host_id')
+            batch_hosts[host_id] = batch_hosts.get(host_id, 0) + 1
+
+    shared_hosts = set(
+        host_id for host_id in batch_hosts if storage.host_has_servers(
+            db,
+            account_number,
+            region,
+            host_id
+        )
+    )
+    storage.add_servers(db, account_data, servers)
+    results = []
+    for server_id in server_ids:
+        server_data = found.get(server_id)
+        if not server_data:
+            results.append({'id': server_id, 'error': 'Server was not found'})
+            continue
+
+        host_id = server_data.get('host_id')
+        results.append(
             {
-                'account_number': account_number,
-                'region': region,
-                'servers.host_id': server_details.get('host_id')
+                'id': server_id,
+                'host_id': host_id,
+                'duplicate': (
+                    host_id in shared_hosts or batch_hosts.get(host_id) > 1
+                )
             }
         )
-        db.accounts.update(
+
+    return results
+
+
+@celery_app.task
+def check_server_placement(
+    token,
+    region,
+    account_number,
+    server_id,
+    callback_url=None
+):
+    """
+        Queued form of check_add_server_to_cache for the asynchronous
+        server check. The account is loaded here as it cannot be passed
+        through the broker, and the result is posted to callback_url when
+        one was given
+    """
+    account_data = db.accounts.find_one(
+        dict(
+            storage.live_filter(),
+            account_number=account_number,
+            region=region
+        ),
+        storage.header_projection()
+    )
+    duplicate = None
+    if account_data:
+        duplicate = check_add_server_to_cache(
+            token,
+            region,
+            account_number,
+            server_id,
+            account_data
+        )
+
+    result = {'server_id': server_id, 'duplicate': duplicate}
+    if callback_url:
+        deliver_callback.delay(
+            callback_url,
+            dict(
+                result,
+                task_id=check_server_placement.request.id,
+                account_id=account_number,
+                region=region
+            )
+        )
+
+    return result
+
+
+@celery_app.task(bind=True)
+def deliver_callback(self, callback_url, payload):
+    """
+        POST a finished server check to the caller's callback URL. Failed
+        deliveries are retried with a growing delay up to CALLBACK_RETRIES
+        times before they are dropped. URLs that are not in
+        CALLBACK_ALLOWED_HOSTS, or that resolve to a private address when
+        it is unset, are dropped without being sent
+    """
+    if not client.allowed_callback_url(
+        callback_url,
+        getattr(config, 'CALLBACK_ALLOWED_HOSTS', None)
+    ):
+        logger.error('Callback to %s is not allowed' % callback_url)
+        return False
+
+    retries = getattr(config, 'CALLBACK_RETRIES', 3)
+    try:
+        session = client.get_session(callback_url, config, verify=True)
+        response = session.post(
+            callback_url,
+            data=json.dumps(payload),
+            headers={'Content-Type': 'application/json'},
+            timeout=client.get_timeout(config),
+            allow_redirects=False
+        )
+        if response.status_code < 400:
+            return True
+
+        error = 'status code %d' % response.status_code
+    except Exception as e:
+        error = e
+
+    if self.request.retries >= retries:
+        logger.error(
+            'Callback to %s was not delivered: %s' % (callback_url, error)
+        )
+        return False
+
+    raise self.retry(
+        countdown=(
+            getattr(config, 'CALLBACK_RETRY_DELAY', 10) *
+            2 ** self.request.retries
+        ),
+        max_retries=retries
+    )
+
+
+@celery_app.task
+def build_fleet_index():
+    """
+        Index the hosts of every live host_server lookup that has no host
+        index yet, so the fleet report covers accounts cached before the
+        index was kept. Lookups run since are indexed as they are saved.
+    """
+    data = db.host_index.aggregate(
+        [
             {
-                '_id': account_data.get('_id')
+                '$match': storage.live_filter()
             }, {
-                '$push': {
-                    'servers': server_data
+                '$group': {
+                    '_id': {
+                        'account_number': '$account_number',
+                        'region': '$region'
+                    }
                 }
             }
+        ]
+    )
+    if isinstance(data, dict):
+        data = data.get('result')
+
+    indexed = set()
+    for result in data:
+        found = result.get('_id')
+        indexed.add((found.get('account_number'), found.get('region')))
+
+    accounts = db.accounts.find(
+        dict(storage.live_filter(), lookup_type='host_server'),
+        {
+            'account_number': 1,
+            'region': 1,
+            'lookup_type': 1,
+            'storage': 1,
+            'cache_expiration': 1
+        }
+    )
+    built = 0
+    for account in accounts:
+        key = (account.get('account_number'), account.get('region'))
+        if key in indexed:
+            continue
+
+        storage.index_account_hosts(
+            db,
+            account,
+            getattr(config, 'STORAGE_BATCH_SIZE', None)
         )
-        return bool(check_duplicate)
-    return None
+        indexed.add(key)
+        built += 1
+
+    return built
+
+
+def get_refresh_token(account_number):
+    """
+        Token for a background refresh of the account, from the identity
+        credentials configured for it in REFRESH_CREDENTIALS. Client tokens
+        are never stored, so accounts without credentials are not refreshed.
+    """
+    credentials = getattr(config, 'REFRESH_CREDENTIALS', {}).get(
+        account_number
+    )
+    if not credentials:
+        return None
+
+    url = 'https://identity.api.rackspacecloud.com/v2.0/tokens'
+    try:
+        response = client.get_session(url, config, verify=True).post(
+            url,
+            data=json.dumps(
+                {
+                    'auth': {
+                        'RAX-KSKEY:apiKeyCredentials': {
+                            'username': credentials.get('username'),
+                            'apiKey': credentials.get('api_key')
+                        }
+                    }
+                }
+            ),
+            headers={'Content-Type': 'application/json'},
+            timeout=client.get_timeout(config)
+        )
+        token = decoders.decode(response.content, config).get(
+            'access'
+        ).get('token')
+    except Exception as e:
+        logger.error(
+            'Unable to authenticate the refresh of %s: %s' % (
+                account_number,
+                e
+            )
+        )
+        return None
+
+    if token.get('tenant', {}).get('id') != account_number:
+        logger.error(
+            'Refresh credentials for %s belong to another account' % (
+                account_number
+            )
+        )
+        return None
+
+    return token.get('id')
+
+
+@celery_app.task
+def refresh_hot_accounts():
+    """
+        Run by celery beat every REFRESH_INTERVAL seconds. The most read
+        lookups expiring within REFRESH_AHEAD seconds, or already expired,
+        are refreshed before a client has to initialize them again. At
+        most REFRESH_CONCURRENCY refreshes run at once, each started after
+        a random delay of up to REFRESH_JITTER seconds so they do not all
+        reach the API together. Lookups whose last full listing is older
+        than their cache lifetime are listed in full, the rest as deltas.
+    """
+    access.decay(db, getattr(config, 'REFRESH_DECAY', None))
+    credentials = getattr(config, 'REFRESH_CREDENTIALS', {})
+    if not credentials:
+        return []
+
+    budget = (
+        getattr(config, 'REFRESH_CONCURRENCY', 4) -
+        access.refreshes_running(db)
+    )
+    if budget <= 0:
+        return []
+
+    horizon = datetime.now(UTC) + relativedelta(
+        seconds=getattr(config, 'REFRESH_AHEAD', 3600)
+    )
+    refreshed = []
+    for entry in access.hot_entries(
+        db,
+        credentials.keys(),
+        getattr(config, 'REFRESH_MIN_SCORE', None),
+        getattr(config, 'REFRESH_CANDIDATES', 100)
+    ):
+        if len(refreshed) >= budget:
+            break
+
+        account_number = entry.get('account_number')
+        region = entry.get('region')
+        lookup_type = entry.get('lookup_type')
+        cached = db.accounts.find_one(
+            dict(
+                storage.live_filter(),
+                account_number=account_number,
+                region=region,
+                lookup_type=lookup_type
+            ), {
+                'lookup_type': 1,
+                'cache_expiration': 1,
+                'last_full': 1
+            }
+        )
+        if cached and as_utc(cached.get('cache_expiration')) >= horizon:
+            continue
+
+        token = get_refresh_token(account_number)
+        if not token or not access.claim_refresh(
+            db,
+            entry.get('_id'),
+            getattr(config, 'REFRESH_CLAIM_LIFETIME', None)
+        ):
+            continue
+
+        mode = 'full' if needs_full_refresh(cached) else 'delta'
+        generate_account_object_list.apply_async(
+            (account_number, token, region, lookup_type, None, mode),
+            countdown=random.uniform(0, getattr(config, 'REFRESH_JITTER', 60))
+        )
+        refreshed.append(
+            {
+                'account_number': account_number,
+                'region': region,
+                'lookup_type': lookup_type
+            }
+        )
+
+    return refreshed
 
 
 @celery_app.task
@@ -0,0 +1,117 @@
+# Copyright 2014 Dave Kludt
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+"""
+    Cache of account and token pairs that identity has already accepted,
+    shared by every web worker through the auth_cache collection. Entries
+    are keyed by a SHA-256 hash so tokens are never stored, expire through
+    a TTL index, and the collection is trimmed to a maximum size oldest
+    first. Hits and misses are counted in the metrics collection.
+"""
+
+from dateutil.relativedelta import relativedelta
+from datetime import datetime
+from dateutil import tz
+
+
+import hashlib
+import pymongo
+
+
+UTC = tz.tzutc()
+DEFAULT_LIFETIME = 300
+DEFAULT_MAX_ENTRIES = 10000
+METRICS_ID = 'token_cache'
+
+
+def token_hash(account_number, token):
+    return hashlib.sha256('%s:%s' % (account_number, token)).hexdigest()
+
+
+def record(db, hit):
+    db.metrics.update(
+        {'_id': METRICS_ID},
+        {'$inc': {'hits' if hit else 'misses': 1}},
+        upsert=True
+    )
+
+
+def get_stats(db):
+    stats = db.metrics.find_one({'_id': METRICS_ID}) or {}
+    return {
+        'hits': stats.get('hits', 0),
+        'misses': stats.get('misses', 0)
+    }
+
+
+def is_cached(db, account_number, token):
+    found = db.auth_cache.find_one(
+        {
+            '_id': token_hash(account_number, token),
+            'expiration': {'$gte': datetime.now(UTC)}
+        }, {
+            '_id': 1
+        }
+    )
+    record(db, bool(found))
+    return bool(found)
+
+
+def store(db, account_number, token, lifetime=None, max_entries=None):
+    db.auth_cache.update(
+        {'_id': token_hash(account_number, token)},
+        {
+            '$set': {
+                'expiration': datetime.now(UTC) + relativedelta(
+                    seconds=lifetime or DEFAULT_LIFETIME
+                )
+            }
+        },
+        upsert=True
+    )
+    excess = db.auth_cache.count() - (max_entries or DEFAULT_MAX_ENTRIES)
+    if excess > 0:
+        oldest = db.auth_cache.find({}, {'_id': 1}).sort(
+            'expiration',
+            pymongo.ASCENDING
+        ).limit(excess)
+        db.auth_cache.remove(
+            {'_id': {'$in': [entry.get('_id') for entry in oldest]}}
+        )
+
+
+def check_token(
+    db,
+    account_number,
+    token,
+    validate,
+    lifetime=None,
+    max_entries=None
+):
+    """
+        Return True if the token is valid for the account, calling
+        validate(account_number, token) only when there is no live cache
+        entry. Only successful validations are cached.
+    """
+    if not token:
+        return False
+
+    if is_cached(db, account_number, token):
+        return True
+
+    if validate(account_number, token):
+        store(db, account_number, token, lifetime, max_entries)
+        return True
+
+    return False
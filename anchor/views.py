@@ -14,7 +14,7 @@
 
 from flask import (
     g, render_template, request, redirect, url_for, flash, jsonify, session,
-    make_response
+    current_app, Response
 )
 from flask_cloudadmin.decorators import check_perms
 from flask_classy import FlaskView, route
@@ -23,6 +23,11 @@ from bson.objectid import ObjectId
 from models import Region
 
 
+import analytics
+import storage
+import access
+import exports
+import reports
 import forms
 import tasks
 import helper
@@ -52,6 +57,12 @@ class LookupView(FlaskView):
     @route('/servers/<task_id>')
     def gather_servers(self, task_id=None):
         if request.method == 'POST':
+            access.record_access(
+                g.db,
+                session.get('ddi'),
+                request.json.get('data_center'),
+                request.json.get('lookup_type')
+            )
             task = tasks.generate_account_object_list.delay(
                 session.get('ddi'),
                 session.get('token'),
@@ -59,62 +70,71 @@ class LookupView(FlaskView):
                 request.json.get('lookup_type'),
                 True
             )
+            storage.queue_task(g.db, task.task_id, session.get('ddi'))
             return jsonify(task_id=task.task_id)
         else:
-            status = tasks.check_task_state(task_id)
+            status, account_id = helper.get_task_result(
+                task_id,
+                tasks.check_task_state
+            )
             if status == 'PENDING':
                 return jsonify(state=status, code=204)
             elif status == 'SUCCESS':
-                account_id = tasks.get_task_results(task_id)
-                account_data = g.db.accounts.find_one(
-                    {'_id': ObjectId(account_id)}
+                account_data = storage.load_items(
+                    g.db,
+                    g.db.accounts.find_one({'_id': ObjectId(account_id)})
                 )
-                mismatch = False
-                if account_data.get('lookup_type') == 'host_server':
-                    if (
-                        len(account_data.get('servers')) !=
-                        len(account_data.get('host_servers'))
-                    ):
-                        mismatch = True
-
-                elif account_data.get('lookup_type') == 'cbs_host':
-                    if (
-                        len(account_data.get('volumes')) !=
-                        len(account_data.get('cbs_hosts'))
-                    ):
-                        mismatch = True
-
+                mismatch = helper.check_host_mismatch(account_data)
                 return render_template(
                     '_breakdown.html',
                     data=account_data,
                     mismatch=mismatch,
-                    task_id=task_id
+                    task_id=task_id,
+                    analysis=analytics.analyze_items(
+                        account_data.get(
+                            storage.item_collection(account_data)
+                        ) or [],
+                        account_data.get('lookup_type')
+                    )
                 )
 
             return jsonify(state=status, code=500)
 
+    @route('/servers/<task_id>/progress')
+    def lookup_progress(self, task_id):
+        progress = helper.get_progress(
+            task_id,
+            request.args.get('version', type=int)
+        )
+        if progress is None:
+            return '', 204
+
+        return jsonify(**progress)
+
     @route('/servers/<task_id>/<lookup_type>/csv')
     def generate_server_csv(self, task_id, lookup_type):
-        status = tasks.check_task_state(task_id)
+        status, account_id = helper.get_task_result(
+            task_id,
+            tasks.check_task_state
+        )
+        account_data = None
         if status == 'SUCCESS':
-            account_id = tasks.get_task_results(task_id)
             account_data = g.db.accounts.find_one(
-                {'_id': ObjectId(account_id)}
+                {'_id': ObjectId(account_id)},
+                {'servers': 0, 'volumes': 0}
             )
+
+        if account_data:
+            filename = 'servers.csv'
             if lookup_type == 'cbs_host':
-                use_template = 'cbs.csv'
-            else:
-                use_template = 'servers.csv'
+                filename = 'cbs.csv'
 
-            template = render_template(
-                use_template,
-                lookup_type=lookup_type,
-                data=account_data
+            response = Response(
+                exports.generate_csv(g.db, account_data, lookup_type),
+                mimetype='application/csv'
             )
-            response = make_response(template)
-            response.headers['Content-Type'] = 'application/csv'
             response.headers['Content-Disposition'] = (
-                'attachment; filename="%s"' % use_template
+                'attachment; filename="%s"' % filename
             )
             return response
         else:
@@ -130,19 +150,72 @@ class ReportView(FlaskView):
     decorators = [check_perms(request)]
 
     def get(self):
-        accounts = g.db.accounts.find().sort(
-            [('cache_expiration', pymongo.DESCENDING)]
+        lookup_type = request.args.get('lookup_type')
+        if lookup_type not in tasks.LOOKUP_TYPES:
+            lookup_type = None
+
+        sort = pymongo.DESCENDING
+        if request.args.get('sort') == 'asc':
+            sort = pymongo.ASCENDING
+
+        accounts, next_cursor = reports.account_runs(
+            g.db,
+            lookup_type,
+            request.args.get('cursor'),
+            sort,
+            current_app.config.get('REPORT_PAGE_SIZE')
         )
-        cbs_runs = g.db.accounts.find({'lookup_type': 'cbs_host'})
-        host_servers = g.db.accounts.find({'lookup_type': 'host_server'})
-        public_zone = g.db.accounts.find({'lookup_type': 'public_ip_zone'})
+        counts = reports.lookup_type_counts(g.db)
         return render_template(
             'reports/reports.html',
             accounts=accounts,
-            cbs_runs=cbs_runs,
-            host_servers=host_servers,
-            public_zone=public_zone
+            counts=counts,
+            total=sum(counts.values()),
+            lookup_type=lookup_type,
+            sort='asc' if sort == pymongo.ASCENDING else 'desc',
+            next_cursor=next_cursor
+        )
+
+    @route('/fleet')
+    def fleet(self):
+        region, host = request.args.get('region'), None
+        if region:
+            region = region.lower()
+
+        if region and request.args.get('host_id'):
+            host = {
+                'host_id': request.args.get('host_id'),
+                'accounts': reports.fleet_host(
+                    g.db,
+                    region,
+                    request.args.get('host_id')
+                )
+            }
+
+        hosts = reports.fleet_hosts(
+            g.db,
+            region,
+            limit=current_app.config.get('FLEET_REPORT_LIMIT')
+        )
+        settings = g.db.settings.find_one() or {}
+        return render_template(
+            'reports/fleet.html',
+            hosts=hosts,
+            accounts=reports.fleet_accounts(hosts),
+            host=host,
+            region=region,
+            regions=settings.get('regions') or []
+        )
+
+    @route('/fleet/index', methods=['POST'])
+    def build_fleet_index(self):
+        tasks.build_fleet_index.delay()
+        flash(
+            'The fleet host index is being built for accounts cached '
+            'without one, refresh the report once it completes',
+            'success'
         )
+        return redirect(url_for('ReportView:fleet'))
 
 
 class ManagementView(FlaskView):
@@ -247,14 +320,40 @@ class ManagementView(FlaskView):
 
 class TaskAPI(Resource):
     def get(self, task_id):
-        return jsonify(task_status=tasks.check_task_state(task_id))
+        recorded = storage.get_task_result(g.db, task_id)
+        if not recorded:
+            return jsonify(task_status=tasks.check_task_state(task_id))
+
+        auth_token = helper.check_for_token(request)
+        account_number = recorded.get('account_number')
+        if not auth_token or not account_number:
+            return jsonify(task_status=recorded.get('state'))
+
+        token = helper.check_auth_token(
+            account_number,
+            auth_token,
+            tasks.check_auth_token
+        )
+        if not token:
+            return helper.generate_error(
+                'No authentication token provided, '
+                'or authentication was unsuccessful',
+                401
+            )
+
+        return jsonify(
+            task_status=recorded.get('state'),
+            result=recorded.get('result')
+        )
 
 
 class AccountAPI(Resource):
     def get(self, account_id, region):
-        token = tasks.check_auth_token(
+        auth_token = helper.check_for_token(request)
+        token = helper.check_auth_token(
             account_id,
-            helper.check_for_token(request)
+            auth_token,
+            tasks.check_auth_token
         )
         if not token:
             return helper.generate_error(
@@ -263,6 +362,7 @@ class AccountAPI(Resource):
                 401
             )
 
+        access.record_access(g.db, account_id, region, 'host_server')
         account_data = g.db.accounts.find_one(
             {
                 'account_number': account_id,
@@ -272,15 +372,28 @@ class AccountAPI(Resource):
                 }
             }, {
                 '_id': 0,
-                'servers': 1
+                'servers': 1,
+                'storage': 1,
+                'account_number': 1,
+                'region': 1,
+                'lookup_type': 1
             }
         )
+        if account_data:
+            account_data = {
+                'servers': storage.load_items(g.db, account_data).get(
+                    'servers'
+                )
+            }
+
         return jsonify(data=account_data)
 
     def post(self, account_id, region):
-        token = tasks.check_auth_token(
+        auth_token = helper.check_for_token(request)
+        token = helper.check_auth_token(
             account_id,
-            helper.check_for_token(request)
+            auth_token,
+            tasks.check_auth_token
         )
         if not token:
             return helper.generate_error(
@@ -289,22 +402,29 @@ class AccountAPI(Resource):
                 401
             )
 
+        data = request.get_json(silent=True) or {}
+        mode = data.get('mode', 'full')
+        if mode not in tasks.REFRESH_MODES:
+            return helper.generate_error(
+                'Invalid mode given, valid modes are %s' % ', '.join(
+                    tasks.REFRESH_MODES
+                ),
+                400
+            )
+
         task_id = tasks.generate_account_object_list.delay(
             account_id,
-            token,
+            auth_token,
             region,
-            'host_server'
+            'host_server',
+            None,
+            mode
         )
         return jsonify(task_id=str(task_id))
 
     def delete(self, account_id, region):
         try:
-            g.db.accounts.remove(
-                {
-                    'account_number': account_id,
-                    'region': region
-                }
-            )
+            storage.remove_account(g.db, account_id, region)
             return 'Request was successful', 204
         except:
             return helper.generate_error(
@@ -313,6 +433,124 @@ class AccountAPI(Resource):
             )
 
 
+class AccountLookupAPI(Resource):
+    def post(self, account_id):
+        """
+            Start a lookup for every active region and the requested lookup
+            types, defaulting to all of them, under a single task ID
+        """
+        auth_token = helper.check_for_token(request)
+        token = helper.check_auth_token(
+            account_id,
+            auth_token,
+            tasks.check_auth_token
+        )
+        if not token:
+            return helper.generate_error(
+                'No authentication token provided, '
+                'or authentication was unsuccessful',
+                401
+            )
+
+        data = request.get_json(silent=True) or {}
+        lookup_types = data.get('lookup_types') or tasks.LOOKUP_TYPES
+        if not set(lookup_types).issubset(tasks.LOOKUP_TYPES):
+            return helper.generate_error(
+                'Invalid lookup type given, valid types are %s' % ', '.join(
+                    tasks.LOOKUP_TYPES
+                ),
+                400
+            )
+
+        regions = [
+            region for region, name in helper.gather_dc_choices() if region
+        ]
+        result = tasks.start_region_lookups(
+            account_id,
+            auth_token,
+            regions,
+            lookup_types
+        )
+        return jsonify(task_id=result.id)
+
+
+class LookupResultAPI(Resource):
+    def get(self, account_id, task_id):
+        auth_token = helper.check_for_token(request)
+        token = helper.check_auth_token(
+            account_id,
+            auth_token,
+            tasks.check_auth_token
+        )
+        if not token:
+            return helper.generate_error(
+                'No authentication token provided, '
+                'or authentication was unsuccessful',
+                401
+            )
+
+        lookup = g.db.lookups.find_one(
+            {
+                '_id': task_id,
+                'account_number': account_id
+            }, {
+                '_id': 0,
+                'lookups': 1
+            }
+        )
+        if not lookup:
+            return jsonify(task_status=tasks.check_task_state(task_id))
+
+        return jsonify(task_status='SUCCESS', lookups=lookup.get('lookups'))
+
+
+class AnalyticsAPI(Resource):
+    def get(self, account_id, region):
+        auth_token = helper.check_for_token(request)
+        token = helper.check_auth_token(
+            account_id,
+            auth_token,
+            tasks.check_auth_token
+        )
+        if not token:
+            return helper.generate_error(
+                'No authentication token provided, '
+                'or authentication was unsuccessful',
+                401
+            )
+
+        lookup_type = request.args.get('lookup_type', 'host_server')
+        if lookup_type not in tasks.LOOKUP_TYPES:
+            return helper.generate_error(
+                'Invalid lookup type given, valid types are %s' % ', '.join(
+                    tasks.LOOKUP_TYPES
+                ),
+                400
+            )
+
+        access.record_access(g.db, account_id, region, lookup_type)
+        account_data = g.db.accounts.find_one(
+            {
+                'account_number': account_id,
+                'region': region,
+                'lookup_type': lookup_type,
+                'cache_expiration': {'$gte': helper.get_timestamp()}
+            }, {
+                'servers': 0,
+                'volumes': 0
+            }
+        )
+        if not account_data:
+            return helper.generate_error(
+                'You must initialize before requesting analytics',
+                404
+            )
+
+        return jsonify(
+            analytics=analytics.analyze_account(g.db, account_data)
+        )
+
+
 class ServerAPI(Resource):
     def put(self, account_id, region, server_id):
         """
@@ -321,10 +559,16 @@ class ServerAPI(Resource):
             Save the data into cache as either way it will still reside on a
             host that has another server or by itself. The answer will be
             correct either way
+
+            With async or a callback_url in the body the check is queued
+            instead, and the task ID returned right away for polling or
+            callback delivery
         """
-        token = tasks.check_auth_token(
+        auth_token = helper.check_for_token(request)
+        token = helper.check_auth_token(
             account_id,
-            helper.check_for_token(request)
+            auth_token,
+            tasks.check_auth_token
         )
         if not token:
             return helper.generate_error(
@@ -333,12 +577,33 @@ class ServerAPI(Resource):
                 401
             )
 
+        data = request.get_json(silent=True) or {}
+        callback_url = data.get('callback_url')
+        if callback_url is not None and not helper.valid_callback_url(
+            callback_url
+        ):
+            return helper.generate_error(
+                'Invalid callback URL given, it must be an http or https URL',
+                400
+            )
+
+        if callback_url is not None and not helper.allowed_callback_url(
+            callback_url
+        ):
+            return helper.generate_error(
+                'Callback URL is not allowed, it must be an allowed host '
+                'or resolve to a public address',
+                400
+            )
+
+        access.record_access(g.db, account_id, region, 'host_server')
         account_data = g.db.accounts.find_one(
             {
                 'account_number': account_id,
                 'region': region,
                 'cache_expiration': {'$gte': helper.get_timestamp()}
-            }
+            },
+            storage.header_projection()
         )
         if not account_data:
             return helper.generate_error(
@@ -346,15 +611,27 @@ class ServerAPI(Resource):
                 400
             )
 
-        check_server = g.db.accounts.find_one({'servers.id': server_id})
-        if check_server:
+        if storage.server_exists(g.db, account_id, region, server_id):
             return helper.generate_error(
                 'Server has been catalogued already',
                 400
             )
 
+        if data.get('async') or callback_url:
+            task = tasks.check_server_placement.delay(
+                auth_token,
+                region,
+                account_id,
+                server_id,
+                callback_url
+            )
+            storage.queue_task(g.db, task.task_id, account_id)
+            response = jsonify(task_id=task.task_id)
+            response.status_code = 202
+            return response
+
         response = tasks.check_add_server_to_cache(
-            token,
+            auth_token,
             region,
             account_id,
             server_id,
@@ -363,9 +640,11 @@ class ServerAPI(Resource):
         return jsonify(duplicate=response)
 
     def get(self, account_id, region, server_id):
-        token = tasks.check_auth_token(
+        auth_token = helper.check_for_token(request)
+        token = helper.check_auth_token(
             account_id,
-            helper.check_for_token(request)
+            auth_token,
+            tasks.check_auth_token
         )
         if not token:
             return helper.generate_error(
@@ -374,14 +653,12 @@ class ServerAPI(Resource):
                 401
             )
 
-        server_data = g.db.accounts.find_one(
-            {
-                'account_number': account_id,
-                'region': region,
-                'servers.id': server_id
-            }, {
-                'servers.$': 1
-            }
+        access.record_access(g.db, account_id, region, 'host_server')
+        server_data = storage.find_server(
+            g.db,
+            account_id,
+            region,
+            server_id
         )
         if not server_data:
             return helper.generate_error(
@@ -389,7 +666,7 @@ class ServerAPI(Resource):
                 404
             )
 
-        check_host = server_data.get('servers')[0].get('host_id')
+        check_host = server_data.get('host_id')
         host_servers = helper.generate_servers_on_same_host(
             account_id,
             region,
@@ -400,3 +677,92 @@ class ServerAPI(Resource):
             duplicate = True
 
         return jsonify(duplicate=duplicate, host_servers=host_servers)
+
+
+class ServerBatchAPI(Resource):
+    def put(self, account_id, region):
+        """
+            Check and cache a batch of newly built servers in one request.
+            Each server gets the same answer as the single server PUT, or an
+            error when it was already catalogued or could not be found
+        """
+        auth_token = helper.check_for_token(request)
+        token = helper.check_auth_token(
+            account_id,
+            auth_token,
+            tasks.check_auth_token
+        )
+        if not token:
+            return helper.generate_error(
+                'No authentication token provided, '
+                'or authentication was unsuccessful',
+                401
+            )
+
+        data = request.get_json(silent=True) or {}
+        server_ids = data.get('servers')
+        limit = current_app.config.get('SERVER_BATCH_LIMIT', 100)
+        if (
+            not isinstance(server_ids, list) or not server_ids or
+            not all(isinstance(item, basestring) for item in server_ids)
+        ):
+            return helper.generate_error(
+                'A list of server IDs must be provided',
+                400
+            )
+
+        if len(server_ids) > limit:
+            return helper.generate_error(
+                'No more than %d servers can be checked at once' % limit,
+                400
+            )
+
+        access.record_access(g.db, account_id, region, 'host_server')
+        account_data = g.db.accounts.find_one(
+            {
+                'account_number': account_id,
+                'region': region,
+                'cache_expiration': {'$gte': helper.get_timestamp()}
+            },
+            storage.header_projection()
+        )
+        if not account_data:
+            return helper.generate_error(
+                'You must initialize before checking a server',
+                400
+            )
+
+        requested, catalogued = [], set()
+        for server_id in server_ids:
+            if server_id in requested or server_id in catalogued:
+                continue
+
+            if storage.server_exists(g.db, account_id, region, server_id):
+                catalogued.add(server_id)
+            else:
+                requested.append(server_id)
+
+        results = {}
+        if requested:
+            for result in tasks.check_add_servers_to_cache(
+                auth_token,
+                region,
+                account_id,
+                requested,
+                account_data
+            ):
+                results[result.get('id')] = result
+
+        servers = []
+        for server_id in server_ids:
+            if server_id in catalogued:
+                servers.append(
+                    {
+                        'id': server_id,
+                        'error': 'Server has been catalogued already'
+                    }
+                )
+            else:
+                servers.append(results.get(server_id))
+
+        return jsonify(servers=servers)
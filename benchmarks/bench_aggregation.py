@@ -0,0 +1,90 @@
+# Copyright 2014 Dave Kludt
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+"""
+    Compare list based host de-duplication with HostAggregator on
+    synthetic accounts, using one host for every 20 servers.
+
+    python benchmarks/bench_aggregation.py
+"""
+
+from uuid import uuid4
+
+
+import time
+import sys
+import os
+
+
+sys.path.insert(
+    0,
+    os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'anchor')
+)
+from aggregation import HostAggregator  # noqa
+
+
+def generate_servers(count):
+    hosts = [uuid4().hex for _ in range(max(count / 20, 1))]
+    return [
+        {
+            'id': str(uuid4()),
+            'host_id': hosts[number % len(hosts)]
+        } for number in range(count)
+    ]
+
+
+def list_dedupe(servers):
+    hosts = []
+    for server in servers:
+        if server.get('host_id') not in hosts:
+            hosts.append(server.get('host_id'))
+
+    return hosts
+
+
+def aggregator_dedupe(servers):
+    hosts = HostAggregator()
+    for server in servers:
+        hosts.add(server.get('host_id'), server.get('id'))
+
+    hosts.counts()
+    return hosts.hosts
+
+
+def timed(function, servers):
+    start = time.time()
+    result = function(servers)
+    return result, time.time() - start
+
+
+def main():
+    print '%8s %8s %12s %12s %8s' % (
+        'servers', 'hosts', 'list', 'aggregator', 'speedup'
+    )
+    for count in [1000, 10000, 100000]:
+        servers = generate_servers(count)
+        legacy, legacy_time = timed(list_dedupe, servers)
+        hosts, hosts_time = timed(aggregator_dedupe, servers)
+        assert legacy == hosts
+        print '%8d %8d %11.4fs %11.4fs %7.1fx' % (
+            count,
+            len(hosts),
+            legacy_time,
+            hosts_time,
+            legacy_time / hosts_time
+        )
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,75 @@
+# Copyright 2014 Dave Kludt
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+"""
+    Time to build the columnar arrays and compute the host distribution
+    analytics for synthetic accounts of growing size, with roughly five
+    servers per host and a handful of flavors.
+
+    python benchmarks/bench_analytics.py [servers ...]
+"""
+
+from uuid import uuid4
+
+
+import random
+import time
+import sys
+import os
+
+
+sys.path.insert(
+    0,
+    os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'anchor')
+)
+import analytics  # noqa
+
+
+FLAVORS = ['general1-1', 'general1-2', 'performance1-2', 'performance2-15']
+STATES = ['active', 'active', 'active', 'shutoff', 'error']
+
+
+def generate_servers(count):
+    hosts = [uuid4().hex for _ in range(max(count / 5, 1))]
+    zones = [uuid4().hex for _ in range(max(count / 1000, 1))]
+    return [
+        {
+            'host_id': random.choice(hosts),
+            'flavor': random.choice(FLAVORS),
+            'state': random.choice(STATES),
+            'public_zone': random.choice(zones)
+        } for _ in range(count)
+    ]
+
+
+def main():
+    sizes = [int(size) for size in sys.argv[1:]] or [1000, 10000, 100000]
+    print '%-9s %10s %10s %10s' % ('servers', 'columns', 'analytics', 'total')
+    for size in sizes:
+        servers = generate_servers(size)
+        start = time.time()
+        columns = analytics.build_columns(servers)
+        built = time.time()
+        analytics.summarize(columns)
+        done = time.time()
+        print '%-9d %8.1fms %8.1fms %8.1fms' % (
+            size,
+            (built - start) * 1000,
+            (done - built) * 1000,
+            (done - start) * 1000
+        )
+
+
+if __name__ == '__main__':
+    main()
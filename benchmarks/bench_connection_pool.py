@@ -0,0 +1,149 @@
+# Copyright 2014 Dave Kludt
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+"""
+    Compare a new connection per request against the pooled client when
+    paging through a local HTTPS stub that mimics servers/detail.
+
+    python benchmarks/bench_connection_pool.py [requests]
+"""
+
+from BaseHTTPServer import BaseHTTPRequestHandler, HTTPServer
+from SocketServer import ThreadingMixIn
+
+
+import subprocess
+import threading
+import requests
+import tempfile
+import shutil
+import json
+import time
+import ssl
+import sys
+import os
+
+
+sys.path.insert(
+    0,
+    os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'anchor')
+)
+import client  # noqa
+
+
+requests.packages.urllib3.disable_warnings()
+PAGE = json.dumps({'servers': [{'id': str(i)} for i in range(100)]})
+
+
+class StubHandler(BaseHTTPRequestHandler):
+    protocol_version = 'HTTP/1.1'
+    # Buffer the response so headers and body leave in one segment
+    wbufsize = -1
+
+    def do_GET(self):
+        self.send_response(200)
+        self.send_header('Content-Type', 'application/json')
+        self.send_header('Content-Length', str(len(PAGE)))
+        self.end_headers()
+        self.wfile.write(PAGE)
+
+    def log_message(self, *args):
+        pass
+
+
+class StubServer(ThreadingMixIn, HTTPServer):
+    daemon_threads = True
+    connections = 0
+
+    def get_request(self):
+        request = HTTPServer.get_request(self)
+        self.connections += 1
+        return request
+
+    def handle_error(self, request, client_address):
+        # Unpooled clients drop the socket without a TLS close_notify
+        pass
+
+
+def generate_certificate(directory):
+    cert = os.path.join(directory, 'stub.pem')
+    subprocess.check_call(
+        [
+            'openssl', 'req', '-x509', '-newkey', 'rsa:2048', '-nodes',
+            '-subj', '/CN=localhost', '-days', '1',
+            '-keyout', cert, '-out', cert
+        ],
+        stdout=open(os.devnull, 'w'),
+        stderr=subprocess.STDOUT
+    )
+    return cert
+
+
+def start_server(cert):
+    server = StubServer(('127.0.0.1', 0), StubHandler)
+    server.socket = ssl.wrap_socket(
+        server.socket,
+        certfile=cert,
+        server_side=True
+    )
+    thread = threading.Thread(target=server.serve_forever)
+    thread.daemon = True
+    thread.start()
+    return server
+
+
+def run(label, server, url, count, fetch):
+    server.connections = 0
+    start = time.time()
+    for _ in range(count):
+        fetch(url)
+
+    elapsed = time.time() - start
+    print '%-12s %6d requests %8.3fs %8.2fms/req %5d connections' % (
+        label,
+        count,
+        elapsed,
+        elapsed * 1000 / count,
+        server.connections
+    )
+
+
+def main():
+    count = int(sys.argv[1]) if len(sys.argv) > 1 else 200
+    directory = tempfile.mkdtemp()
+    try:
+        server = start_server(generate_certificate(directory))
+        url = 'https://127.0.0.1:%d/v2/123456/servers/detail' % (
+            server.server_address[1]
+        )
+
+        def unpooled(url):
+            requests.get(url, verify=False).content
+
+        def pooled(url):
+            client.get_session(url, None).get(
+                url,
+                verify=False,
+                timeout=client.DEFAULT_TIMEOUT
+            ).content
+
+        run('unpooled', server, url, count, unpooled)
+        run('pooled', server, url, count, pooled)
+        server.shutdown()
+    finally:
+        shutil.rmtree(directory)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,151 @@
+# Copyright 2014 Dave Kludt
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+"""
+    Time to decode a Nova servers/detail page of 100 servers with each
+    JSON library installed, the decoder process_api_request picks first
+    marked with a star.
+
+    python benchmarks/bench_decoders.py [pages]
+"""
+
+from uuid import uuid4
+
+
+import json
+import time
+import sys
+import os
+
+
+sys.path.insert(
+    0,
+    os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'anchor')
+)
+import decoders  # noqa
+
+
+LIMIT = 100
+HOSTS = [uuid4().hex + uuid4().hex[:24] for _ in range(20)]
+
+
+def raw_server(number):
+    server_id = str(uuid4())
+    image_id = str(uuid4())
+    return {
+        'id': server_id,
+        'name': 'server-%d' % number,
+        'tenant_id': '123456',
+        'user_id': uuid4().hex,
+        'hostId': HOSTS[number % len(HOSTS)],
+        'accessIPv4': '10.0.%d.%d' % (number / 250 % 250, number % 250),
+        'accessIPv6': '2001:4800:7811:513:be76:4eff:fe05:%04x' % number,
+        'created': '2014-10-29T16:02:48Z',
+        'updated': '2014-10-29T16:05:10Z',
+        'status': 'ACTIVE',
+        'progress': 100,
+        'key_name': None,
+        'config_drive': '',
+        'OS-EXT-STS:vm_state': 'active',
+        'OS-EXT-STS:task_state': None,
+        'OS-EXT-STS:power_state': 1,
+        'OS-DCF:diskConfig': 'AUTO',
+        'RAX-PUBLIC-IP-ZONE-ID:publicIPZoneId': HOSTS[number % 7],
+        'flavor': {
+            'id': 'performance1-2',
+            'links': [
+                {
+                    'href': 'https://iad.servers.api.rackspacecloud.com/'
+                    '123456/flavors/performance1-2',
+                    'rel': 'bookmark'
+                }
+            ]
+        },
+        'image': {
+            'id': image_id,
+            'links': [
+                {
+                    'href': 'https://iad.servers.api.rackspacecloud.com/'
+                    '123456/images/%s' % image_id,
+                    'rel': 'bookmark'
+                }
+            ]
+        },
+        'metadata': {
+            'rax:reboot_window': '2014-11-01T00:00:00Z',
+            'rax_service_level_automation': 'Complete',
+            'build_config': ''
+        },
+        'addresses': {
+            'public': [
+                {'addr': '10.0.0.1', 'version': 4},
+                {'addr': '2001:4800:7811:513::1', 'version': 6}
+            ],
+            'private': [{'addr': '192.168.0.1', 'version': 4}]
+        },
+        'links': [
+            {
+                'href': 'https://iad.servers.api.rackspacecloud.com/v2/'
+                '123456/servers/%s' % server_id,
+                'rel': 'self'
+            }, {
+                'href': 'https://iad.servers.api.rackspacecloud.com/'
+                '123456/servers/%s' % server_id,
+                'rel': 'bookmark'
+            }
+        ]
+    }
+
+
+def main():
+    pages = int(sys.argv[1]) if len(sys.argv) > 1 else 500
+    content = json.dumps(
+        {
+            'servers': [raw_server(number) for number in range(LIMIT)],
+            'servers_links': [
+                {
+                    'href': 'https://iad.servers.api.rackspacecloud.com/v2/'
+                    '123456/servers/detail?limit=100&marker=abc',
+                    'rel': 'next'
+                }
+            ]
+        }
+    )
+    chosen = decoders.get_decoder()[0]
+    print '%d pages of %d servers, %d KB each' % (
+        pages,
+        LIMIT,
+        len(content) / 1024
+    )
+    print '%-12s %10s %12s' % ('decoder', 'per page', 'servers/s')
+    for name in decoders.DECODERS:
+        loads = decoders.load_decoder(name)
+        if not loads:
+            print '%-12s %10s' % (name, 'not installed')
+            continue
+
+        start = time.time()
+        for _ in range(pages):
+            loads(content)
+
+        elapsed = time.time() - start
+        print '%-12s %8.2fms %12d' % (
+            name + (' *' if name == chosen else ''),
+            elapsed * 1000 / pages,
+            pages * LIMIT / elapsed
+        )
+
+
+if __name__ == '__main__':
+    main()
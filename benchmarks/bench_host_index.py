@@ -0,0 +1,121 @@
+# Copyright 2014 Dave Kludt
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+"""
+    Latency of finding the servers that share a host for a cached account,
+    comparing the $unwind aggregation over the embedded servers with a
+    point read of the host index. Uses a scratch database on the MongoDB
+    at localhost, or the host given as the last argument.
+
+    python benchmarks/bench_host_index.py [servers] [host]
+"""
+
+from dateutil.relativedelta import relativedelta
+from collections import OrderedDict
+from datetime import datetime
+from dateutil import tz
+from uuid import uuid4
+
+
+import pymongo
+import time
+import sys
+import os
+
+
+sys.path.insert(
+    0,
+    os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'anchor')
+)
+import indexes  # noqa
+import storage  # noqa
+
+
+REQUESTS = 200
+
+
+def setup_account(db, count):
+    hosts = [uuid4().hex for _ in range(max(count / 20, 1))]
+    servers = [
+        {
+            'id': str(uuid4()),
+            'name': 'server-%d' % number,
+            'host_id': hosts[number % len(hosts)],
+            'state': 'active',
+            'flavor': 'performance1-2',
+            'addresses': {'public': ['10.0.0.1'], 'private': ['192.168.0.1']}
+        } for number in range(count)
+    ]
+    account = {
+        'account_number': '123456',
+        'region': 'iad',
+        'lookup_type': 'host_server',
+        'cache_expiration': datetime.now(tz.tzutc()) + relativedelta(days=1),
+        'servers': servers
+    }
+    db.accounts.insert(account)
+    host_servers = OrderedDict()
+    for server in servers:
+        host_servers.setdefault(server.get('host_id'), []).append(
+            {'id': server.get('id'), 'name': server.get('name')}
+        )
+
+    return account, host_servers, hosts
+
+
+def timed(db, hosts):
+    latencies = []
+    for number in range(REQUESTS):
+        host_id = hosts[number % len(hosts)]
+        start = time.time()
+        storage.servers_on_host(db, '123456', 'iad', host_id)
+        latencies.append(time.time() - start)
+
+    latencies.sort()
+    return latencies[len(latencies) / 2], latencies[-1]
+
+
+def main():
+    count = int(sys.argv[1]) if len(sys.argv) > 1 else 10000
+    host = sys.argv[2] if len(sys.argv) > 2 else 'localhost'
+    client = pymongo.MongoClient(host, tz_aware=True)
+    client.drop_database('anchor_benchmark')
+    db = client.anchor_benchmark
+    try:
+        indexes.ensure_indexes(db)
+        account, host_servers, hosts = setup_account(db, count)
+        aggregation = timed(db, hosts)
+        storage.save_host_index(db, account, host_servers)
+        point_read = timed(db, hosts)
+        print '%d servers on %d hosts, %d requests each' % (
+            count,
+            len(hosts),
+            REQUESTS
+        )
+        print '%-12s %10s %10s' % ('path', 'p50', 'max')
+        for label, (median, worst) in [
+            ('aggregation', aggregation),
+            ('host index', point_read)
+        ]:
+            print '%-12s %8.2fms %8.2fms' % (
+                label,
+                median * 1000,
+                worst * 1000
+            )
+    finally:
+        client.drop_database('anchor_benchmark')
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,147 @@
+# Copyright 2014 Dave Kludt
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+"""
+    Latency of the catalogued server check in ServerAPI.put as the number
+    of cached accounts grows. Each step adds accounts with embedded servers
+    to a scratch database and times the account scoped check for servers
+    that are and are not cached, along with the documents it examined.
+    Uses the MongoDB at localhost, or the host given as the last argument.
+
+    python benchmarks/bench_server_exists.py [servers per account] [host]
+"""
+
+from dateutil.relativedelta import relativedelta
+from datetime import datetime
+from dateutil import tz
+from uuid import uuid4
+
+
+import pymongo
+import time
+import sys
+import os
+
+
+sys.path.insert(
+    0,
+    os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'anchor')
+)
+import indexes  # noqa
+import storage  # noqa
+
+
+ACCOUNT_STEPS = [100, 1000, 5000]
+REQUESTS = 500
+
+
+def add_accounts(db, start, stop, servers):
+    expiration = datetime.now(tz.tzutc()) + relativedelta(days=1)
+    accounts = []
+    for number in range(start, stop):
+        accounts.append(
+            {
+                'account_number': str(100000 + number),
+                'region': 'iad',
+                'lookup_type': 'host_server',
+                'cache_expiration': expiration,
+                'servers': [
+                    {
+                        'id': str(uuid4()),
+                        'name': 'server-%d' % count,
+                        'host_id': uuid4().hex,
+                        'state': 'active'
+                    } for count in range(servers)
+                ]
+            }
+        )
+
+    if accounts:
+        db.accounts.insert(accounts)
+
+
+def docs_examined(explain):
+    stats = explain.get('executionStats')
+    if stats:
+        return stats.get('totalDocsExamined')
+
+    return explain.get('nscannedObjects')
+
+
+def timed(db, accounts):
+    latencies = []
+    for number in range(REQUESTS):
+        account = accounts[number % len(accounts)]
+        server_id = str(uuid4())
+        if number % 2:
+            server_id = account.get('servers')[0].get('id')
+
+        start = time.time()
+        storage.server_exists(
+            db,
+            account.get('account_number'),
+            'iad',
+            server_id
+        )
+        latencies.append(time.time() - start)
+
+    account = accounts[0]
+    explain = db.accounts.find(
+        dict(
+            storage.live_filter(),
+            account_number=account.get('account_number'),
+            region='iad',
+            **{'servers.id': account.get('servers')[0].get('id')}
+        ),
+        {'_id': 1}
+    ).limit(1).explain()
+    examined = docs_examined(explain)
+    latencies.sort()
+    return latencies[len(latencies) / 2], latencies[-1], examined
+
+
+def main():
+    servers = int(sys.argv[1]) if len(sys.argv) > 1 else 50
+    host = sys.argv[2] if len(sys.argv) > 2 else 'localhost'
+    client = pymongo.MongoClient(host, tz_aware=True)
+    client.drop_database('anchor_benchmark')
+    db = client.anchor_benchmark
+    try:
+        indexes.ensure_indexes(db)
+        print '%d servers per account, %d checks per step' % (
+            servers,
+            REQUESTS
+        )
+        print '%-9s %10s %10s %9s' % ('accounts', 'p50', 'max', 'examined')
+        cached = 0
+        for step in ACCOUNT_STEPS:
+            add_accounts(db, cached, step, servers)
+            cached = step
+            accounts = list(
+                db.accounts.find({}, {'account_number': 1, 'servers.id': 1})
+                .limit(200)
+            )
+            median, worst, examined = timed(db, accounts)
+            print '%-9d %8.3fms %8.3fms %9s' % (
+                step,
+                median * 1000,
+                worst * 1000,
+                examined
+            )
+    finally:
+        client.drop_database('anchor_benchmark')
+
+
+if __name__ == '__main__':
+    main()
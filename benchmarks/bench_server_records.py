@@ -0,0 +1,130 @@
+# Copyright 2014 Dave Kludt
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+"""
+    Memory held by the processed servers of a lookup, comparing a dict per
+    server with ServerRecord and its interned host, zone and flavor IDs.
+    Raw pages are parsed from JSON like a real response, so every page
+    carries its own copy of each ID. Each layout runs in a forked child
+    so the peak RSS is its own.
+
+    dict     a dict per server, as the servers were kept before
+    record   a ServerRecord per server with the IDs interned per lookup
+
+    python benchmarks/bench_server_records.py [servers]
+"""
+
+from uuid import uuid4
+
+
+import resource
+import json
+import time
+import sys
+import os
+
+
+sys.path.insert(
+    0,
+    os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'anchor')
+)
+import tasks  # noqa
+
+
+LIMIT = 100
+HOSTS = [uuid4().hex + uuid4().hex[:24] for _ in range(500)]
+FLAVORS = ['performance1-1', 'performance1-2', 'performance2-15']
+
+
+def raw_page(offset, count):
+    servers = []
+    for number in range(offset, min(offset + LIMIT, count)):
+        servers.append(
+            {
+                'id': str(uuid4()),
+                'name': 'server-%d' % number,
+                'hostId': HOSTS[number % len(HOSTS)],
+                'created': '2014-10-29T16:02:48Z',
+                'OS-EXT-STS:vm_state': 'active',
+                'RAX-PUBLIC-IP-ZONE-ID:publicIPZoneId': HOSTS[number % 7],
+                'flavor': {'id': FLAVORS[number % len(FLAVORS)]},
+                'metadata': {'rax:reboot_window': '2014-11-01T00:00:00Z'},
+                'addresses': {
+                    'public': [
+                        {'addr': '10.0.0.1', 'version': 4},
+                        {'addr': '2001:4800:7811:513::1', 'version': 6}
+                    ],
+                    'private': [{'addr': '192.168.0.1', 'version': 4}]
+                }
+            }
+        )
+
+    return json.loads(json.dumps({'servers': servers})).get('servers')
+
+
+def run(layout, count):
+    before = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    start = time.time()
+    servers, interned = [], {}
+    for offset in range(0, count, LIMIT):
+        for server in raw_page(offset, count):
+            if layout == 'dict':
+                servers.append(
+                    tasks.process_server_details(server).to_document()
+                )
+            else:
+                servers.append(tasks.process_server_details(server, interned))
+
+    elapsed = time.time() - start
+    after = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    return (after - before) / 1024.0, elapsed, sys.getsizeof(servers[0])
+
+
+def run_in_child(layout, count):
+    read, write = os.pipe()
+    pid = os.fork()
+    if pid == 0:
+        os.close(read)
+        os.write(write, json.dumps(run(layout, count)))
+        os._exit(0)
+
+    os.close(write)
+    result = json.loads(os.read(read, 1024))
+    os.close(read)
+    os.waitpid(pid, 0)
+    return result
+
+
+def main():
+    count = int(sys.argv[1]) if len(sys.argv) > 1 else 100000
+    print '%-8s %8s %14s %10s %10s' % (
+        'layout',
+        'servers',
+        'rss growth',
+        'per item',
+        'time'
+    )
+    for layout in ['dict', 'record']:
+        growth, elapsed, size = run_in_child(layout, count)
+        print '%-8s %8d %11.1f MB %8d B %9.2fs' % (
+            layout,
+            count,
+            growth,
+            size,
+            elapsed
+        )
+
+
+if __name__ == '__main__':
+    main()
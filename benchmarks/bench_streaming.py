@@ -0,0 +1,208 @@
+# Copyright 2014 Dave Kludt
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+"""
+    Peak worker memory for a host_server lookup of a mocked account, with
+    the API pages served from memory and the database writes discarded.
+    Each mode runs in a forked child so the peak RSS is its own.
+
+    accumulate  every raw page is held before processing (the old path)
+    embedded    pages are streamed, processed servers kept for the header
+    normalized  pages are streamed and written out in bulk batches
+
+    python benchmarks/bench_streaming.py [servers]
+"""
+
+from uuid import uuid4
+
+
+import resource
+import json
+import time
+import sys
+import os
+
+
+sys.path.insert(
+    0,
+    os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'anchor')
+)
+import tasks  # noqa
+
+
+LIMIT = 100
+HOSTS = [uuid4().hex for _ in range(500)]
+
+
+class NullBulk:
+    def find(self, query):
+        return self
+
+    def upsert(self):
+        return self
+
+    def replace_one(self, document):
+        pass
+
+    def execute(self):
+        pass
+
+
+class NullCollection:
+    def initialize_unordered_bulk_op(self):
+        return NullBulk()
+
+    def find_and_modify(self, *args, **kwargs):
+        return {'_id': None}
+
+    def remove(self, *args, **kwargs):
+        pass
+
+
+class NullDatabase:
+    def __getitem__(self, name):
+        return NullCollection()
+
+    def __getattr__(self, name):
+        return NullCollection()
+
+
+def raw_server(number):
+    server_id = str(uuid4())
+    return {
+        'id': server_id,
+        'name': 'server-%d' % number,
+        'hostId': HOSTS[number % len(HOSTS)],
+        'accessIPv4': '10.0.%d.%d' % (number / 250 % 250, number % 250),
+        'accessIPv6': '2001:4800:7811:513:be76:4eff:fe05:%04x' % number,
+        'created': '2014-10-29T16:02:48Z',
+        'updated': '2014-10-29T16:05:10Z',
+        'status': 'ACTIVE',
+        'OS-EXT-STS:vm_state': 'active',
+        'OS-EXT-STS:task_state': None,
+        'OS-EXT-STS:power_state': 1,
+        'OS-DCF:diskConfig': 'AUTO',
+        'RAX-PUBLIC-IP-ZONE-ID:publicIPZoneId': HOSTS[number % 7],
+        'flavor': {
+            'id': 'performance1-2',
+            'links': [
+                {
+                    'href': 'https://iad.servers.api.rackspacecloud.com/'
+                    '123456/flavors/performance1-2',
+                    'rel': 'bookmark'
+                }
+            ]
+        },
+        'image': {
+            'id': str(uuid4()),
+            'links': [
+                {
+                    'href': 'https://iad.servers.api.rackspacecloud.com/'
+                    '123456/images/%s' % uuid4(),
+                    'rel': 'bookmark'
+                }
+            ]
+        },
+        'metadata': {'rax:reboot_window': '2014-11-01T00:00:00Z'},
+        'addresses': {
+            'public': [
+                {'addr': '10.0.0.1', 'version': 4},
+                {'addr': '2001:4800:7811:513::1', 'version': 6}
+            ],
+            'private': [{'addr': '192.168.0.1', 'version': 4}]
+        },
+        'links': [
+            {
+                'href': 'https://iad.servers.api.rackspacecloud.com/v2/'
+                '123456/servers/%s' % server_id,
+                'rel': 'self'
+            }
+        ]
+    }
+
+
+def mock_api(count):
+    def process_api_request(url, verb, data, headers, status=None):
+        if '/v1.0/' in url:
+            return {'servers': []}
+
+        offset = int(url.split('offset=')[1]) if 'offset=' in url else 0
+        page = {
+            'servers': [
+                raw_server(number)
+                for number in range(offset, min(offset + LIMIT, count))
+            ]
+        }
+        # Like nova, a full page always links to the next one
+        if len(page.get('servers')) == LIMIT:
+            page['servers_links'] = [
+                {'href': 'https://iad/servers/detail?offset=%d' % (
+                    offset + LIMIT
+                )}
+            ]
+
+        # Round trip through JSON so each page is freshly parsed like a
+        # real response
+        return json.loads(json.dumps(page))
+
+    return process_api_request
+
+
+def run(mode, count):
+    tasks.db = NullDatabase()
+    tasks.process_api_request = mock_api(count)
+    tasks.config.ACCOUNT_STORAGE = 'embedded'
+    if mode == 'normalized':
+        tasks.config.ACCOUNT_STORAGE = 'normalized'
+    elif mode == 'accumulate':
+        streamed = tasks.generate_server_list
+
+        def generate_server_list(*args):
+            return list(streamed(*args))
+
+        tasks.generate_server_list = generate_server_list
+
+    before = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    start = time.time()
+    tasks.generate_account_object_list('123456', None, 'iad', 'host_server')
+    elapsed = time.time() - start
+    after = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    return (after - before) / 1024.0, elapsed
+
+
+def run_in_child(mode, count):
+    read, write = os.pipe()
+    pid = os.fork()
+    if pid == 0:
+        os.close(read)
+        os.write(write, json.dumps(run(mode, count)))
+        os._exit(0)
+
+    os.close(write)
+    result = json.loads(os.read(read, 1024))
+    os.close(read)
+    os.waitpid(pid, 0)
+    return result
+
+
+def main():
+    count = int(sys.argv[1]) if len(sys.argv) > 1 else 50000
+    print '%-12s %8s %14s %10s' % ('mode', 'servers', 'peak rss', 'time')
+    for mode in ['accumulate', 'embedded', 'normalized']:
+        peak, elapsed = run_in_child(mode, count)
+        print '%-12s %8d %11.1f MB %9.2fs' % (mode, count, peak, elapsed)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,215 @@
+# Copyright 2014 Dave Kludt
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+"""
+    Load test of UI polling against a fixed pool of sync web workers while
+    a lookup runs and reports progress every PROGRESS_INTERVAL seconds.
+    Every poller asks for the task result once per POLL_INTERVAL, the
+    fixed rate the lookup page polled at, and a separate client requests
+    another page every PAGE_INTERVAL. The full column counts the polls
+    answered with the progress rather than an empty 204.
+
+    blocking     each poll waits on the task like AsyncResult.get()
+    long-poll    each poll re-reads task_results every 0.5s until the task
+                 finishes or LONG_POLL_TIMEOUT passes
+    indexed      each poll is a single find_one on task_results by task id
+    conditional  an indexed poll sending the last version seen, answered
+                 with a 204 when it is unchanged, as the progress endpoint
+                 does. The interval starts at 1.5s and grows by half after
+                 every 204 up to 10s.
+
+    Needs a MongoDB on localhost, or the host given as the last argument.
+
+    python benchmarks/bench_task_polling.py [workers] [pollers] [host]
+"""
+
+from multiprocessing.pool import ThreadPool
+from uuid import uuid4
+
+
+import threading
+import pymongo
+import time
+import sys
+
+
+LOOKUP_SECONDS = 10.0
+PROGRESS_INTERVAL = 4.0
+POLL_INTERVAL = 1.0
+PAGE_INTERVAL = 0.25
+LONG_POLL_TIMEOUT = 15
+CONDITIONAL_INTERVAL = 1.5
+CONDITIONAL_MAX_INTERVAL = 10.0
+
+
+def percentile(values, percent):
+    values = sorted(values)
+    if not values:
+        return 0
+
+    return values[min(len(values) - 1, int(len(values) * percent / 100))]
+
+
+def run(mode, collection, workers, pollers):
+    pool = ThreadPool(workers)
+    task_id, done = uuid4().hex, threading.Event()
+    polls, pages, lock = [], [], threading.Lock()
+    full = []
+    collection.insert({'_id': task_id, 'state': 'PENDING', 'version': 0})
+
+    def report_progress():
+        while not done.wait(PROGRESS_INTERVAL):
+            collection.update({'_id': task_id}, {'$inc': {'version': 1}})
+
+    def finish_lookup():
+        collection.update(
+            {'_id': task_id},
+            {'$set': {'state': 'SUCCESS', 'result': uuid4().hex}}
+        )
+        done.set()
+
+    def blocking_poll():
+        done.wait()
+        return 'SUCCESS'
+
+    def indexed_poll():
+        result = collection.find_one({'_id': task_id}, {'state': 1})
+        return result.get('state') if result else 'PENDING'
+
+    def conditional_poll(version):
+        result = collection.find_one(
+            {'_id': task_id},
+            {'state': 1, 'version': 1}
+        )
+        if result.get('state') == 'PENDING' and (
+            result.get('version') == version
+        ):
+            return None
+
+        return result
+
+    def long_poll():
+        deadline = time.time() + LONG_POLL_TIMEOUT
+        while True:
+            state = indexed_poll()
+            if state != 'PENDING' or time.time() >= deadline:
+                return state
+
+            time.sleep(0.5)
+
+    def other_page():
+        return 'OK'
+
+    handler = blocking_poll
+    if mode == 'long-poll':
+        handler = long_poll
+    elif mode == 'indexed':
+        handler = indexed_poll
+
+    def conditional_client():
+        version, interval = None, CONDITIONAL_INTERVAL
+        while True:
+            start = time.time()
+            result = pool.apply(conditional_poll, (version,))
+            with lock:
+                polls.append(time.time() - start)
+                if result is not None:
+                    full.append(1)
+
+            if result is None:
+                interval = min(interval * 1.5, CONDITIONAL_MAX_INTERVAL)
+            elif result.get('state') == 'SUCCESS':
+                return
+            else:
+                version, interval = result.get('version'), (
+                    CONDITIONAL_INTERVAL
+                )
+
+            time.sleep(interval)
+
+    def client(function, latencies):
+        while True:
+            start = time.time()
+            state = pool.apply(function)
+            with lock:
+                latencies.append(time.time() - start)
+                if function is not other_page:
+                    full.append(1)
+
+            if function is other_page and done.is_set():
+                return
+
+            if function is not other_page and state == 'SUCCESS':
+                return
+
+            time.sleep(
+                PAGE_INTERVAL if function is other_page else POLL_INTERVAL
+            )
+
+    threading.Timer(LOOKUP_SECONDS, finish_lookup).start()
+    threading.Thread(target=report_progress).start()
+    threads = [
+        threading.Thread(target=client, args=(handler, polls))
+        if mode != 'conditional' else
+        threading.Thread(target=conditional_client)
+        for _ in range(pollers)
+    ]
+    threads.append(threading.Thread(target=client, args=(other_page, pages)))
+    for thread in threads:
+        thread.start()
+
+    for thread in threads:
+        thread.join()
+
+    pool.close()
+    pool.join()
+    collection.remove({'_id': task_id})
+    return polls, len(full), pages
+
+
+def main():
+    workers = int(sys.argv[1]) if len(sys.argv) > 1 else 4
+    pollers = int(sys.argv[2]) if len(sys.argv) > 2 else 16
+    host = sys.argv[3] if len(sys.argv) > 3 else 'localhost'
+    collection = pymongo.MongoClient(host).anchor_benchmark.task_results
+    print '%d workers, %d pollers, %.1fs lookup, poll every %.2fs' % (
+        workers,
+        pollers,
+        LOOKUP_SECONDS,
+        POLL_INTERVAL
+    )
+    print '%-12s %6s %6s %10s %10s %8s %14s' % (
+        'mode',
+        'polls',
+        'full',
+        'poll p50',
+        'poll max',
+        'pages',
+        'page max wait'
+    )
+    for mode in ['blocking', 'long-poll', 'indexed', 'conditional']:
+        polls, full, pages = run(mode, collection, workers, pollers)
+        print '%-12s %6d %6d %9.3fs %9.3fs %8d %13.3fs' % (
+            mode,
+            len(polls),
+            full,
+            percentile(polls, 50),
+            max(polls),
+            len(pages),
+            max(pages)
+        )
+
+
+if __name__ == '__main__':
+    main()
@@ -49,6 +49,14 @@ class AnchorTests(unittest.TestCase):
         self.db.sessions.remove()
         self.db.settings.remove()
         self.db.accounts.remove()
+        self.db.servers.remove()
+        self.db.volumes.remove()
+        self.db.lookups.remove()
+        self.db.host_index.remove()
+        self.db.auth_cache.remove()
+        self.db.metrics.remove()
+        self.db.account_access.remove()
+        self.db.task_results.remove()
         self.db.forms.remove()
 
     def setup_user_login(self, sess):
@@ -196,6 +204,61 @@ class AnchorTests(unittest.TestCase):
         check = json.loads(response.data)
         assert check.get('task_status') == 'PENDING', 'Incorrect state found'
 
+    def test_api_status_recorded_result(self):
+        task_id = uuid4().hex
+        self.db.task_results.insert(
+            {
+                '_id': task_id,
+                'state': 'SUCCESS',
+                'account_number': '123456',
+                'result': {'server_id': 'server', 'duplicate': True}
+            }
+        )
+        headers = {
+            "X-Auth-Token": uuid.uuid4().hex
+        }
+        with self.app.test_client() as c:
+            with mock.patch('anchor.tasks.check_auth_token') as ctoken:
+                ctoken.return_value = True
+                with mock.patch('anchor.tasks.check_task_state') as data:
+                    response = c.get('/task/%s' % task_id, headers=headers)
+
+        check = json.loads(response.data)
+        assert check.get('task_status') == 'SUCCESS', 'Incorrect state found'
+        assert check.get('result').get('duplicate'), 'Result not returned'
+        assert not data.called, 'Result backend was checked for the state'
+        self.assertEquals(
+            ctoken.call_args[0][0],
+            '123456',
+            'Token was not checked against the task account'
+        )
+
+    def test_api_status_recorded_result_no_token(self):
+        task_id = uuid4().hex
+        self.db.task_results.insert(
+            {
+                '_id': task_id,
+                'state': 'SUCCESS',
+                'account_number': '123456',
+                'result': {'server_id': 'server', 'duplicate': True}
+            }
+        )
+        with self.app.test_client() as c:
+            response = c.get('/task/%s' % task_id)
+            with mock.patch('anchor.tasks.check_auth_token') as ctoken:
+                ctoken.return_value = False
+                refused = c.get(
+                    '/task/%s' % task_id,
+                    headers={"X-Auth-Token": uuid.uuid4().hex}
+                )
+
+        check = json.loads(response.data)
+        assert check.get('task_status') == 'SUCCESS', 'Incorrect state found'
+        assert 'result' not in check, 'Result returned without a token'
+        assert refused._status_code == 401, (
+            'Result returned for an invalid token'
+        )
+
     """ Accounts """
 
     def test_api_get_account(self):
@@ -321,6 +384,240 @@ class AnchorTests(unittest.TestCase):
             'No task ID returned on post'
         )
 
+    def test_api_post_account_passes_token(self):
+        token = uuid.uuid4().hex
+        with self.app.test_client() as c:
+            with mock.patch('anchor.tasks.check_auth_token') as ctoken:
+                ctoken.return_value = True
+                with mock.patch(
+                    'anchor.tasks.generate_account_object_list'
+                ) as lookup:
+                    lookup.delay.return_value = 'task-id'
+                    c.post(
+                        '/account/123456/iad',
+                        headers={'X-Auth-Token': token}
+                    )
+
+        self.assertEquals(
+            lookup.delay.call_args[0][1],
+            token,
+            'Auth token was not passed to the lookup'
+        )
+
+    def test_api_post_account_delta(self):
+        with self.app.test_client() as c:
+            with mock.patch('anchor.tasks.check_auth_token') as ctoken:
+                ctoken.return_value = True
+                with mock.patch(
+                    'anchor.tasks.generate_account_object_list'
+                ) as lookup:
+                    lookup.delay.return_value = 'task-id'
+                    response = c.post(
+                        '/account/123456/iad',
+                        data=json.dumps({'mode': 'delta'}),
+                        content_type='application/json',
+                        headers={'X-Auth-Token': uuid.uuid4().hex}
+                    )
+
+        assert response._status_code == 200, 'Incorrect status code received'
+        self.assertEquals(
+            lookup.delay.call_args[0][5],
+            'delta',
+            'Delta mode was not passed to the lookup'
+        )
+
+    def test_api_post_account_bad_mode(self):
+        with self.app.test_client() as c:
+            with mock.patch('anchor.tasks.check_auth_token') as ctoken:
+                ctoken.return_value = True
+                response = c.post(
+                    '/account/123456/iad',
+                    data=json.dumps({'mode': 'partial'}),
+                    content_type='application/json',
+                    headers={'X-Auth-Token': uuid.uuid4().hex}
+                )
+
+        assert response._status_code == 400, 'Incorrect status code received'
+
+    def test_api_token_validation_cached(self):
+        self.setup_useable_account()
+        token = uuid.uuid4().hex
+        with self.app.test_client() as c:
+            with mock.patch('anchor.tasks.check_auth_token') as ctoken:
+                ctoken.return_value = True
+                for _ in range(3):
+                    response = c.get(
+                        '/account/123456/iad',
+                        headers={'X-Auth-Token': token}
+                    )
+                    assert response._status_code == 200, (
+                        'Incorrect status code received'
+                    )
+
+        self.assertEquals(
+            ctoken.call_count,
+            1,
+            'Identity was called for a token that was already validated'
+        )
+        cached = self.db.auth_cache.find_one()
+        assert cached, 'Validated token was not cached'
+        assert token not in str(cached), 'Token was stored unhashed'
+        self.assertEquals(
+            anchor.token_cache.get_stats(self.db),
+            {'hits': 2, 'misses': 1},
+            'Incorrect cache hit and miss counts'
+        )
+
+    def test_api_token_validation_failure_not_cached(self):
+        token = uuid.uuid4().hex
+        with self.app.test_client() as c:
+            with mock.patch('anchor.tasks.check_auth_token') as ctoken:
+                ctoken.return_value = False
+                for _ in range(2):
+                    response = c.get(
+                        '/account/123456/iad',
+                        headers={'X-Auth-Token': token}
+                    )
+
+        assert response._status_code == 401, 'Incorrect status code received'
+        self.assertEquals(ctoken.call_count, 2, 'Failed token was cached')
+        assert self.db.auth_cache.count() == 0, 'Failed token was cached'
+
+    def test_api_token_cache_bounded(self):
+        for _ in range(5):
+            anchor.token_cache.store(
+                self.db,
+                '123456',
+                uuid.uuid4().hex,
+                max_entries=3
+            )
+
+        self.assertEquals(
+            self.db.auth_cache.count(),
+            3,
+            'Token cache grew past its maximum size'
+        )
+
+    def test_api_post_region_lookups(self):
+        headers = {
+            "X-Auth-Token": uuid.uuid4().hex
+        }
+        with self.app.test_client() as c:
+            with mock.patch('anchor.tasks.check_auth_token') as ctoken:
+                ctoken.return_value = True
+                with mock.patch('anchor.tasks.start_region_lookups') as fan:
+                    fan.return_value.id = 'combined-task-id'
+                    response = c.post(
+                        '/account/123456',
+                        data=json.dumps({'lookup_types': ['host_server']}),
+                        content_type='application/json',
+                        headers=headers
+                    )
+
+        check_data = json.loads(response.data)
+        assert check_data.get('task_id') == 'combined-task-id', (
+            'Combined task ID was not returned on post'
+        )
+        args = fan.call_args[0]
+        self.assertEquals(
+            sorted(args[2]),
+            ['dfw', 'hkg', 'iad', 'lon', 'ord', 'syd'],
+            'Lookup was not fanned out across all active regions'
+        )
+        assert args[3] == ['host_server'], 'Incorrect lookup types given'
+
+    def test_api_post_region_lookups_bad_type(self):
+        headers = {
+            "X-Auth-Token": uuid.uuid4().hex
+        }
+        with self.app.test_client() as c:
+            with mock.patch('anchor.tasks.check_auth_token') as ctoken:
+                ctoken.return_value = True
+                response = c.post(
+                    '/account/123456',
+                    data=json.dumps({'lookup_types': ['bad_type']}),
+                    content_type='application/json',
+                    headers=headers
+                )
+
+        assert response._status_code == 400, (
+            'Incorrect status code recieved on bad lookup type'
+        )
+
+    def test_api_get_region_lookups(self):
+        lookups = [
+            {
+                'region': 'iad',
+                'lookup_type': 'host_server',
+                'account_id': '5667a8d1b6a7b2a6ea6e1d24'
+            }
+        ]
+        self.db.lookups.insert(
+            {
+                '_id': 'combined-task-id',
+                'account_number': '123456',
+                'lookups': lookups
+            }
+        )
+        headers = {
+            "X-Auth-Token": uuid.uuid4().hex
+        }
+        with self.app.test_client() as c:
+            with mock.patch('anchor.tasks.check_auth_token') as ctoken:
+                ctoken.return_value = True
+                response = c.get(
+                    '/account/123456/lookups/combined-task-id',
+                    headers=headers
+                )
+
+        check_data = json.loads(response.data)
+        assert check_data.get('task_status') == 'SUCCESS', (
+            'Incorrect state found'
+        )
+        assert check_data.get('lookups') == lookups, (
+            'Incorrect lookups returned for combined task'
+        )
+
+    def test_api_get_region_lookups_pending(self):
+        headers = {
+            "X-Auth-Token": uuid.uuid4().hex
+        }
+        with self.app.test_client() as c:
+            with mock.patch('anchor.tasks.check_auth_token') as ctoken:
+                ctoken.return_value = True
+                with mock.patch('anchor.tasks.check_task_state') as data:
+                    data.return_value = 'PENDING'
+                    response = c.get(
+                        '/account/123456/lookups/%s' % uuid4().hex,
+                        headers=headers
+                    )
+
+        check_data = json.loads(response.data)
+        assert check_data.get('task_status') == 'PENDING', (
+            'Incorrect state found'
+        )
+
+    def test_api_get_region_lookups_no_token(self):
+        self.db.lookups.insert(
+            {
+                '_id': 'combined-task-id',
+                'account_number': '123456',
+                'lookups': []
+            }
+        )
+        with self.app.test_client() as c:
+            response = c.get('/account/123456/lookups/combined-task-id')
+
+        assert response._status_code == 401, (
+            'Incorrect status code recieved without a token'
+        )
+        self.assertEquals(
+            json.loads(response.data).get('message'),
+            'No authentication token provided, '
+            'or authentication was unsuccessful',
+            'Incorrect message received'
+        )
+
     """ Servers """
 
     def test_api_get_server(self):
@@ -367,6 +664,119 @@ class AnchorTests(unittest.TestCase):
 
         assert response._status_code == 404, 'Invalid status code received'
 
+    def test_api_get_server_expired(self):
+        self.setup_useable_account(True)
+        headers = {
+            "X-Auth-Token": uuid.uuid4().hex
+        }
+        with self.app.test_client() as c:
+            with mock.patch('anchor.tasks.check_auth_token') as ctoken:
+                ctoken.return_value = True
+                response = c.get(
+                    '/account/123456/iad/server/'
+                    '00000000-1111-2222-3333-444444444444',
+                    headers=headers
+                )
+
+        assert response._status_code == 404, (
+            'Expired cache entry was returned before the TTL removed it'
+        )
+
+    def test_api_get_server_normalized(self):
+        self.db.accounts.insert(
+            {
+                'account_number': '123456',
+                'region': 'iad',
+                'lookup_type': 'host_server',
+                'storage': 'normalized',
+                'servers': None,
+                'cache_expiration': datetime.now() + relativedelta(days=1)
+            }
+        )
+        for number in range(2):
+            self.db.servers.insert(
+                {
+                    'account_number': '123456',
+                    'region': 'iad',
+                    'lookup_type': 'host_server',
+                    'cache_expiration': (
+                        datetime.now() + relativedelta(days=1)
+                    ),
+                    'name': 'test-server-%d' % number,
+                    'id': '00000000-1111-2222-3333-44444444444%d' % number,
+                    'host_id': 'f0ab54576022b02c128b9516ef23a99'
+                }
+            )
+
+        headers = {
+            "X-Auth-Token": uuid.uuid4().hex
+        }
+        with self.app.test_client() as c:
+            with mock.patch('anchor.tasks.check_auth_token') as ctoken:
+                ctoken.return_value = True
+                response = c.get(
+                    '/account/123456/iad/server/'
+                    '00000000-1111-2222-3333-444444444440',
+                    headers=headers
+                )
+                account = c.get('/account/123456/iad', headers=headers)
+
+        check_data = json.loads(response.data)
+        assert check_data.get('duplicate') is True, (
+            'Incorrect duplicate value'
+        )
+        assert len(check_data.get('host_servers')) == 2, (
+            'Incorrect number of servers returned for host'
+        )
+        account_data = json.loads(account.data).get('data')
+        assert len(account_data.get('servers')) == 2, (
+            'Servers were not loaded for the normalized account'
+        )
+
+    def test_api_get_server_host_index(self):
+        self.setup_useable_account()
+        host_id = 'f0ab54576022b02c128b9516ef23a9947c73a8564ca79c7d1debb015'
+        self.db.host_index.insert(
+            {
+                'account_number': '123456',
+                'region': 'iad',
+                'host_id': host_id,
+                'cache_expiration': datetime.now() + relativedelta(days=1),
+                'servers': [
+                    {
+                        'id': '00000000-1111-2222-3333-444444444444',
+                        'name': 'test-server'
+                    }, {
+                        'id': '11111111-2222-3333-4444-55566667777',
+                        'name': 'test-server2'
+                    }
+                ]
+            }
+        )
+        with self.app.test_client() as c:
+            with mock.patch('anchor.tasks.check_auth_token') as ctoken:
+                ctoken.return_value = True
+                response = c.get(
+                    '/account/123456/iad/server/'
+                    '00000000-1111-2222-3333-444444444444',
+                    headers={'X-Auth-Token': uuid.uuid4().hex}
+                )
+
+        check_data = json.loads(response.data)
+        assert check_data.get('duplicate') is True, (
+            'Host index was not used for the servers on the host'
+        )
+        self.assertEquals(
+            [server.get('server').get('id') for server in check_data.get(
+                'host_servers'
+            )],
+            [
+                '00000000-1111-2222-3333-444444444444',
+                '11111111-2222-3333-4444-55566667777'
+            ],
+            'Incorrect servers returned from the host index'
+        )
+
     def test_api_get_server_duplicate(self):
         headers = {
             "X-Auth-Token": uuid.uuid4().hex
@@ -410,6 +820,54 @@ class AnchorTests(unittest.TestCase):
             'Incorrect message received'
         )
 
+    def test_api_get_analytics(self):
+        self.setup_useable_duplicate_servers_for_account()
+        self.db.accounts.update({}, {'$set': {'lookup_type': 'host_server'}})
+        headers = {
+            "X-Auth-Token": uuid.uuid4().hex
+        }
+        with self.app.test_client() as c:
+            with mock.patch('anchor.tasks.check_auth_token') as ctoken:
+                ctoken.return_value = True
+                response = c.get(
+                    '/account/123456/iad/analytics',
+                    headers=headers
+                )
+
+        assert response._status_code == 200, 'Incorrect status code'
+        analysis = json.loads(response.data).get('analytics')
+        self.assertEquals(analysis.get('items'), 2, 'Incorrect server count')
+        self.assertEquals(analysis.get('hosts'), 1, 'Incorrect host count')
+        self.assertEquals(
+            analysis.get('blast_radius').get('items'),
+            2,
+            'Incorrect blast radius'
+        )
+        self.assertEquals(
+            analysis.get('density').get('shared_hosts'),
+            1,
+            'Incorrect shared host count'
+        )
+
+    def test_api_get_analytics_not_initialized(self):
+        headers = {
+            "X-Auth-Token": uuid.uuid4().hex
+        }
+        with self.app.test_client() as c:
+            with mock.patch('anchor.tasks.check_auth_token') as ctoken:
+                ctoken.return_value = True
+                response = c.get(
+                    '/account/123456/iad/analytics',
+                    headers=headers
+                )
+
+        assert response._status_code == 404, 'Incorrect status code'
+        self.assertEquals(
+            json.loads(response.data).get('message'),
+            'You must initialize before requesting analytics',
+            'Incorrect message received'
+        )
+
     def test_api_put_server(self):
         self.setup_useable_account()
         use_uuid = uuid.uuid4().hex
@@ -430,6 +888,107 @@ class AnchorTests(unittest.TestCase):
 
         check_data = json.loads(response.data)
         assert check_data.get('duplicate') is False, 'Incorrect return value'
+        account_data = cache.call_args[0][4]
+        assert account_data.get('_id'), 'Account ID was not loaded'
+        assert 'servers' not in account_data, 'Cached servers were loaded'
+
+    def test_api_put_server_async(self):
+        self.setup_useable_account()
+        use_uuid = uuid.uuid4().hex
+        task_id = uuid.uuid4().hex
+        headers = {
+            "X-Auth-Token": uuid.uuid4().hex,
+            "Content-Type": "application/json"
+        }
+        with self.app.test_client() as c:
+            with mock.patch('anchor.tasks.check_auth_token') as ctoken:
+                ctoken.return_value = True
+                with mock.patch.dict(
+                    self.app.config,
+                    {'CALLBACK_ALLOWED_HOSTS': ['example.com']}
+                ):
+                    with mock.patch(
+                        'anchor.tasks.check_server_placement.delay'
+                    ) as delay:
+                        delay.return_value.task_id = task_id
+                        response = c.put(
+                            '/account/123456/iad/server/%s' % use_uuid,
+                            data=json.dumps(
+                                {'callback_url': 'https://example.com/hook'}
+                            ),
+                            headers=headers
+                        )
+
+        assert response._status_code == 202, 'Incorrect status code'
+        check_data = json.loads(response.data)
+        assert check_data.get('task_id') == task_id, 'Incorrect task ID'
+        self.assertEquals(
+            delay.call_args[0][3:],
+            (use_uuid, 'https://example.com/hook'),
+            'Check was not queued with the callback URL'
+        )
+        queued = self.db.task_results.find_one({'_id': task_id})
+        assert queued.get('state') == 'PENDING', 'Check was not recorded'
+
+    def test_api_put_server_bad_callback(self):
+        self.setup_useable_account()
+        headers = {
+            "X-Auth-Token": uuid.uuid4().hex,
+            "Content-Type": "application/json"
+        }
+        with self.app.test_client() as c:
+            with mock.patch('anchor.tasks.check_auth_token') as ctoken:
+                ctoken.return_value = True
+                response = c.put(
+                    '/account/123456/iad/server/%s' % uuid.uuid4().hex,
+                    data=json.dumps({'callback_url': 'ftp://example.com'}),
+                    headers=headers
+                )
+
+        assert response._status_code == 400, 'Incorrect status code'
+        self.assertEquals(
+            json.loads(response.data).get('message'),
+            'Invalid callback URL given, it must be an http or https URL',
+            'Incorrect message received'
+        )
+
+    def test_api_put_server_private_callback(self):
+        self.setup_useable_account()
+        headers = {
+            "X-Auth-Token": uuid.uuid4().hex,
+            "Content-Type": "application/json"
+        }
+        with self.app.test_client() as c:
+            with mock.patch('anchor.tasks.check_auth_token') as ctoken:
+                ctoken.return_value = True
+                with mock.patch(
+                    'anchor.tasks.check_server_placement.delay'
+                ) as delay:
+                    responses = [
+                        c.put(
+                            '/account/123456/iad/server/%s' % (
+                                uuid.uuid4().hex
+                            ),
+                            data=json.dumps({'callback_url': url}),
+                            headers=headers
+                        ) for url in [
+                            'http://127.0.0.1:8080/hook',
+                            'http://169.254.169.254/latest/meta-data',
+                            'http://[::1]/hook',
+                            'http://10.0.0.5/hook'
+                        ]
+                    ]
+
+        for response in responses:
+            assert response._status_code == 400, 'Incorrect status code'
+            self.assertEquals(
+                json.loads(response.data).get('message'),
+                'Callback URL is not allowed, it must be an allowed host '
+                'or resolve to a public address',
+                'Incorrect message received'
+            )
+
+        assert not delay.called, 'Check was queued for a private callback'
 
     def test_api_put_server_duplicate(self):
         self.setup_useable_account()
@@ -457,6 +1016,38 @@ class AnchorTests(unittest.TestCase):
         accounts = self.db.accounts.find_one()
         assert len(accounts.get('servers')) == 1, 'Incorrect server count'
 
+    def test_api_put_server_catalogued_other_account(self):
+        self.setup_useable_account()
+        self.db.accounts.update(
+            {},
+            {'$set': {'account_number': '654321'}}
+        )
+        self.setup_useable_account()
+        use_uuid = '00000000-1111-2222-3333-444444444444'
+        self.db.accounts.update(
+            {'account_number': '123456'},
+            {'$set': {'servers.0.id': uuid.uuid4().hex}}
+        )
+        headers = {
+            "X-Auth-Token": uuid.uuid4().hex
+        }
+        with self.app.test_client() as c:
+            with mock.patch('anchor.tasks.check_auth_token') as ctoken:
+                ctoken.return_value = True
+                with mock.patch(
+                    'anchor.tasks.check_add_server_to_cache'
+                ) as cache:
+                    cache.return_value = True
+                    response = c.put(
+                        '/account/123456/iad/server/%s' % use_uuid,
+                        headers=headers
+                    )
+
+        assert response._status_code == 200, (
+            'Server cached on another account was treated as catalogued'
+        )
+        assert cache.called, 'Server was not checked'
+
     def test_api_put_server_not_initialized(self):
         use_uuid = uuid.uuid4().hex
         headers = {
@@ -482,6 +1073,33 @@ class AnchorTests(unittest.TestCase):
         accounts = self.db.accounts.count()
         assert accounts == 0, 'Incorrect account count'
 
+    def test_api_put_server_records_access(self):
+        headers = {
+            "X-Auth-Token": uuid.uuid4().hex
+        }
+        with self.app.test_client() as c:
+            with mock.patch('anchor.tasks.check_auth_token') as ctoken:
+                ctoken.return_value = True
+                for _ in range(2):
+                    c.put(
+                        '/account/123456/IAD/server/%s' % uuid.uuid4().hex,
+                        headers=headers
+                    )
+
+        entry = self.db.account_access.find_one()
+        assert entry, 'Access was not recorded'
+        self.assertEquals(
+            (
+                entry.get('account_number'),
+                entry.get('region'),
+                entry.get('lookup_type')
+            ),
+            ('123456', 'iad', 'host_server'),
+            'Access recorded under the wrong key'
+        )
+        assert entry.get('hits') == 2, 'Incorrect number of hits recorded'
+        assert entry.get('score') == 2, 'Incorrect score recorded'
+
     def test_api_put_server_no_token(self):
         use_uuid = uuid.uuid4().hex
         self.setup_useable_account()
@@ -504,3 +1122,108 @@ class AnchorTests(unittest.TestCase):
         )
         accounts = self.db.accounts.find_one()
         assert len(accounts.get('servers')) == 1, 'Incorrect server count'
+
+    def test_api_put_servers(self):
+        self.setup_useable_account()
+        headers = {
+            "X-Auth-Token": uuid.uuid4().hex,
+            "Content-Type": "application/json"
+        }
+        catalogued = '00000000-1111-2222-3333-444444444444'
+        new_server = uuid.uuid4().hex
+        with self.app.test_client() as c:
+            with mock.patch('anchor.tasks.check_auth_token') as ctoken:
+                ctoken.return_value = True
+                with mock.patch(
+                    'anchor.tasks.check_add_servers_to_cache'
+                ) as cache:
+                    cache.return_value = [
+                        {
+                            'id': new_server,
+                            'host_id': 'host',
+                            'duplicate': False
+                        }
+                    ]
+                    response = c.put(
+                        '/account/123456/iad/servers',
+                        data=json.dumps(
+                            {'servers': [catalogued, new_server]}
+                        ),
+                        headers=headers
+                    )
+
+        assert response._status_code == 200, 'Incorrect status code'
+        self.assertEquals(
+            cache.call_args[0][3],
+            [new_server],
+            'Catalogued server was checked again'
+        )
+        assert 'servers' not in cache.call_args[0][4], (
+            'Cached servers were loaded for the batch'
+        )
+        check_data = json.loads(response.data)
+        self.assertEquals(
+            check_data.get('servers'),
+            [
+                {
+                    'id': catalogued,
+                    'error': 'Server has been catalogued already'
+                }, {
+                    'id': new_server,
+                    'host_id': 'host',
+                    'duplicate': False
+                }
+            ],
+            'Incorrect batch results returned'
+        )
+
+    def test_api_put_servers_bad_list(self):
+        self.setup_useable_account()
+        headers = {
+            "X-Auth-Token": uuid.uuid4().hex,
+            "Content-Type": "application/json"
+        }
+        with self.app.test_client() as c:
+            with mock.patch('anchor.tasks.check_auth_token') as ctoken:
+                ctoken.return_value = True
+                response = c.put(
+                    '/account/123456/iad/servers',
+                    data=json.dumps({'servers': 'not-a-list'}),
+                    headers=headers
+                )
+                too_many = c.put(
+                    '/account/123456/iad/servers',
+                    data=json.dumps(
+                        {'servers': [uuid.uuid4().hex for _ in range(101)]}
+                    ),
+                    headers=headers
+                )
+
+        assert response._status_code == 400, 'Incorrect status code'
+        self.assertEquals(
+            json.loads(response.data).get('message'),
+            'A list of server IDs must be provided',
+            'Incorrect message received'
+        )
+        assert too_many._status_code == 400, 'Oversized batch was accepted'
+
+    def test_api_put_servers_not_initialized(self):
+        headers = {
+            "X-Auth-Token": uuid.uuid4().hex,
+            "Content-Type": "application/json"
+        }
+        with self.app.test_client() as c:
+            with mock.patch('anchor.tasks.check_auth_token') as ctoken:
+                ctoken.return_value = True
+                response = c.put(
+                    '/account/123456/iad/servers',
+                    data=json.dumps({'servers': [uuid.uuid4().hex]}),
+                    headers=headers
+                )
+
+        assert response._status_code == 400, 'Incorrect status code'
+        self.assertEquals(
+            json.loads(response.data).get('message'),
+            'You must initialize before checking a server',
+            'Incorrect message received'
+        )
@@ -0,0 +1,220 @@
+# Copyright 2014 Dave Kludt
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+from dateutil.relativedelta import relativedelta
+from anchor import setup_application
+from datetime import datetime
+
+
+import unittest
+import pymongo
+
+
+class AnchorIndexTests(unittest.TestCase):
+    def setUp(self):
+        self.app, self.db = setup_application.create_app('True')
+        self.app_context = self.app.app_context()
+        self.app_context.push()
+        self.client = self.app.test_client()
+        self.client.get('/')
+        self.setup_useable_account()
+
+    def tearDown(self):
+        self.db.sessions.remove()
+        self.db.settings.remove()
+        self.db.accounts.remove()
+        self.db.forms.remove()
+
+    def setup_useable_account(self):
+        data = {
+            'host_servers': [
+                'f0ab54576022b02c128b9516ef23a9947c73a8564ca79c7d1debb015',
+            ],
+            'region': 'iad',
+            'cache_expiration': datetime.now() + relativedelta(days=1),
+            'servers': [
+                {
+                    'state': 'active',
+                    'name': 'test-server',
+                    'host_id': (
+                        'f0ab54576022b02c128b9516ef23a99'
+                        '47c73a8564ca79c7d1debb015'
+                    ),
+                    'flavor': 'general1-1',
+                    'id': '00000000-1111-2222-3333-444444444444'
+                }
+            ],
+            'lookup_type': 'host_server',
+            'account_number': '123456'
+        }
+        self.db.accounts.insert(data)
+
+    def find_plan_stages(self, plan):
+        """
+            Walk an explain document and return every stage and legacy
+            cursor name, covering both the pre and post 3.0 formats
+        """
+        stages = []
+        if isinstance(plan, dict):
+            for key, value in plan.iteritems():
+                is_name = isinstance(value, basestring)
+                if key in ['stage', 'cursor'] and is_name:
+                    stages.append(value)
+                else:
+                    stages += self.find_plan_stages(value)
+        elif isinstance(plan, list):
+            for item in plan:
+                stages += self.find_plan_stages(item)
+
+        return stages
+
+    def assert_no_collection_scan(self, explain, query_name):
+        stages = self.find_plan_stages(explain)
+        assert stages, 'No plan found for %s' % query_name
+        for stage in stages:
+            assert stage != 'COLLSCAN' and stage != 'BasicCursor', (
+                'Collection scan used for %s: %s' % (query_name, stages)
+            )
+
+    """ Tests """
+
+    def test_indexes_created_idempotently(self):
+        before = self.db.accounts.index_information()
+        setup_application.indexes.ensure_indexes(self.db)
+        after = self.db.accounts.index_information()
+        self.assertEquals(
+            sorted(before.keys()),
+            sorted(after.keys()),
+            'Index bootstrap created additional indexes on a second run'
+        )
+        self.assertEquals(
+            len(after),
+            len(setup_application.indexes.INDEXES.get('accounts')) + 1,
+            'Not all account indexes were created'
+        )
+
+    def test_indexes_cache_expiration_ttl(self):
+        index = self.db.accounts.index_information().get(
+            'cache_expiration_1'
+        )
+        assert index, 'Cache expiration index was not created'
+        self.assertEquals(
+            index.get('expireAfterSeconds'),
+            0,
+            'Cache expiration index does not expire documents'
+        )
+
+    def test_indexes_lookups_ttl(self):
+        index = self.db.lookups.index_information().get('completed_1')
+        assert index, 'Combined lookup expiry index was not created'
+        self.assertEquals(
+            index.get('expireAfterSeconds'),
+            86400,
+            'Combined lookups do not expire'
+        )
+
+    def test_indexes_account_queries(self):
+        now = datetime.now()
+        queries = {
+            'account cache lookup': {
+                'account_number': '123456',
+                'region': 'iad',
+                'cache_expiration': {'$gte': now}
+            },
+            'lookup upsert': {
+                'account_number': '123456',
+                'region': 'iad',
+                'lookup_type': 'host_server'
+            },
+            'server lookup': {
+                'account_number': '123456',
+                'region': 'iad',
+                'servers.id': '00000000-1111-2222-3333-444444444444'
+            },
+            'catalogued server check': {
+                'account_number': '123456',
+                'region': 'iad',
+                'cache_expiration': {'$gte': now},
+                'servers.id': '00000000-1111-2222-3333-444444444444'
+            },
+            'duplicate host check': {
+                'account_number': '123456',
+                'region': 'iad',
+                'servers.host_id': (
+                    'f0ab54576022b02c128b9516ef23a99'
+                    '47c73a8564ca79c7d1debb015'
+                )
+            },
+            'report lookup type': {
+                'lookup_type': 'cbs_host'
+            }
+        }
+        for name, query in queries.iteritems():
+            self.assert_no_collection_scan(
+                self.db.accounts.find(query).explain(),
+                name
+            )
+
+    def test_indexes_report_sort(self):
+        explain = self.db.accounts.find().sort(
+            [('cache_expiration', pymongo.DESCENDING)]
+        ).explain()
+        self.assert_no_collection_scan(explain, 'report sort')
+
+    def test_indexes_servers_on_same_host(self):
+        explain = self.db.command(
+            'aggregate',
+            'accounts',
+            pipeline=[
+                {
+                    '$match': {
+                        'account_number': '123456',
+                        'region': 'iad'
+                    }
+                }, {
+                    '$unwind': '$servers'
+                }
+            ],
+            explain=True
+        )
+        self.assert_no_collection_scan(explain, 'servers on same host')
+
+    def test_indexes_host_index_point_read(self):
+        explain = self.db.host_index.find(
+            {
+                'account_number': '123456',
+                'region': 'iad',
+                'host_id': (
+                    'f0ab54576022b02c128b9516ef23a99'
+                    '47c73a8564ca79c7d1debb015'
+                )
+            }
+        ).explain()
+        self.assert_no_collection_scan(explain, 'host index point read')
+        index = self.db.host_index.index_information().get(
+            'account_number_1_region_1_host_id_1'
+        )
+        assert index and index.get('unique'), 'Host index is not unique'
+
+    def test_indexes_fleet_host_read(self):
+        explain = self.db.host_index.find(
+            {
+                'region': 'iad',
+                'host_id': (
+                    'f0ab54576022b02c128b9516ef23a99'
+                    '47c73a8564ca79c7d1debb015'
+                )
+            }
+        ).explain()
+        self.assert_no_collection_scan(explain, 'fleet host read')
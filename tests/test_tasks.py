@@ -18,14 +18,47 @@ from dateutil.relativedelta import relativedelta
 from uuid import uuid4
 
 
+import BaseHTTPServer
+import threading
 import unittest
 import anchor
 import uuid
 import json
+import time
 import re
 import mock
 
 
+class CallbackReceiver(object):
+    """
+        Local stand-in for a caller's callback URL, recording each POST
+        body and answering with status_code
+    """
+    def __init__(self, status_code=200):
+        self.received = []
+        receiver = self
+
+        class Handler(BaseHTTPServer.BaseHTTPRequestHandler):
+            def do_POST(self):
+                length = int(self.headers.getheader('content-length'))
+                receiver.received.append(json.loads(self.rfile.read(length)))
+                self.send_response(status_code)
+                self.end_headers()
+
+            def log_message(self, *args):
+                pass
+
+        self.server = BaseHTTPServer.HTTPServer(('127.0.0.1', 0), Handler)
+        self.url = 'http://127.0.0.1:%d/callback' % self.server.server_port
+        self.thread = threading.Thread(target=self.server.serve_forever)
+        self.thread.daemon = True
+        self.thread.start()
+
+    def stop(self):
+        self.server.shutdown()
+        self.server.server_close()
+
+
 class AnchorCeleryTests(unittest.TestCase):
     def setUp(self):
         self.app, self.db = setup_application.create_app('True')
@@ -49,6 +82,12 @@ class AnchorCeleryTests(unittest.TestCase):
         self.db.sessions.remove()
         self.db.settings.remove()
         self.db.accounts.remove()
+        self.db.servers.remove()
+        self.db.volumes.remove()
+        self.db.lookups.remove()
+        self.db.host_index.remove()
+        self.db.account_access.remove()
+        self.db.task_results.remove()
         self.db.forms.remove()
 
     def setup_user_login(self, sess):
@@ -509,7 +548,7 @@ class AnchorCeleryTests(unittest.TestCase):
                 True,
                 create=True
             ):
-                with mock.patch('requests.get') as patched_get:
+                with mock.patch('requests.Session.get') as patched_get:
                     patched_get.return_value.content = json.dumps(cloud_return)
                     task = self.tasks.check_add_server_to_cache(
                         uuid.uuid4().hex,
@@ -529,6 +568,65 @@ class AnchorCeleryTests(unittest.TestCase):
             'Expected an additional server added to the cache'
         )
 
+    def test_celery_add_server_to_cache_shared_host(self):
+        self.setup_useable_account()
+        host_id = '16cde3191df1e6c9fa4dad65eacd4dc7c90d60bca3589ac48f55aae8'
+        self.db.accounts.update(
+            {},
+            {'$set': {'servers.0.host_id': host_id}}
+        )
+        account_data = self.db.accounts.find_one()
+        cloud_return = self.setup_cloud_server_details_single_return()
+        with mock.patch('requests.Session.get') as patched_get:
+            patched_get.return_value.content = json.dumps(cloud_return)
+            task = self.tasks.check_add_server_to_cache(
+                uuid.uuid4().hex,
+                'iad',
+                '123456',
+                '11111111-2222-3333-4444-55555555555',
+                account_data
+            )
+
+        assert task is True, 'Server sharing a host was not reported'
+
+    def test_celery_add_server_updates_host_index(self):
+        cloud_return = self.setup_servers_details_return()
+        with mock.patch('anchor.tasks.generate_server_list') as ng:
+            ng.return_value = cloud_return.get('servers')[1:]
+            with mock.patch(
+                'anchor.tasks.generate_first_gen_server_list'
+            ) as fg:
+                fg.return_value = []
+                self.tasks.generate_account_object_list(
+                    '123456',
+                    uuid.uuid4().hex,
+                    'iad',
+                    'host_server'
+                )
+
+        host_id = '16cde3191df1e6c9fa4dad65eacd4dc7c90d60bca3589ac48f55aae8'
+        assert self.db.host_index.find_one({'host_id': host_id}) is None, (
+            'Host was indexed before any server on it was added'
+        )
+        single = self.setup_cloud_server_details_single_return()
+        with mock.patch('requests.Session.get') as patched_get:
+            patched_get.return_value.content = json.dumps(single)
+            self.tasks.check_add_server_to_cache(
+                uuid.uuid4().hex,
+                'iad',
+                '123456',
+                '11111111-2222-3333-4444-55555555555',
+                self.db.accounts.find_one()
+            )
+
+        indexed = self.db.host_index.find_one({'host_id': host_id})
+        assert indexed, 'Added server was not indexed under its host'
+        self.assertEquals(
+            [server.get('id') for server in indexed.get('servers')],
+            [single.get('server').get('id')],
+            'Incorrect servers indexed for the host'
+        )
+
     def test_celery_add_server_to_cache_bad_uuid(self):
         self.setup_useable_account()
         account_data = self.db.accounts.find_one()
@@ -541,7 +639,7 @@ class AnchorCeleryTests(unittest.TestCase):
                 True,
                 create=True
             ):
-                with mock.patch('requests.get') as patched_get:
+                with mock.patch('requests.Session.get') as patched_get:
                     patched_get.return_value.content = None
                     task = self.tasks.check_add_server_to_cache(
                         uuid.uuid4().hex,
@@ -561,6 +659,195 @@ class AnchorCeleryTests(unittest.TestCase):
             'Data was changed and should not have been from the original data'
         )
 
+    def test_celery_add_servers_to_cache(self):
+        self.setup_useable_account()
+        account_data = self.db.accounts.find_one()
+        cached_host = account_data.get('servers')[0].get('host_id')
+        new_host = '16cde3191df1e6c9fa4dad65eacd4dc7c90d60bca3589ac48f55aae8'
+        details = {}
+        for server_id, host_id in [
+            ('aaaa', new_host),
+            ('bbbb', new_host),
+            ('dddd', cached_host),
+            ('eeee', uuid.uuid4().hex)
+        ]:
+            server = self.setup_cloud_server_details_single_return().get(
+                'server'
+            )
+            server.update({'id': server_id, 'hostId': host_id})
+            details[server_id] = server
+
+        def server_details(token, region, account_number, server_id):
+            return details.get(server_id)
+
+        with mock.patch('anchor.tasks.get_server_details') as patched:
+            patched.side_effect = server_details
+            results = self.tasks.check_add_servers_to_cache(
+                uuid.uuid4().hex,
+                'iad',
+                '123456',
+                ['aaaa', 'bbbb', 'cccc', 'dddd', 'eeee'],
+                account_data
+            )
+
+        self.assertEquals(
+            [result.get('id') for result in results],
+            ['aaaa', 'bbbb', 'cccc', 'dddd', 'eeee'],
+            'Results were not returned in the requested order'
+        )
+        self.assertEquals(
+            [result.get('duplicate') for result in results],
+            [True, True, None, True, False],
+            'Incorrect duplicate results for the batch'
+        )
+        self.assertEquals(
+            results[2].get('error'),
+            'Server was not found',
+            'Missing server was not reported'
+        )
+        self.assertEquals(
+            len(self.db.accounts.find_one().get('servers')),
+            len(account_data.get('servers')) + 4,
+            'Expected the found servers added to the cache'
+        )
+
+    def test_celery_check_server_placement_callback(self):
+        self.setup_useable_account()
+        cloud_return = self.setup_cloud_server_details_single_return()
+        receiver = CallbackReceiver()
+        try:
+            with mock.patch('requests.Session.get') as patched_get:
+                patched_get.return_value.content = json.dumps(cloud_return)
+                with mock.patch(
+                    'anchor.tasks.deliver_callback.delay'
+                ) as delay:
+                    delay.side_effect = self.tasks.deliver_callback
+                    with mock.patch(
+                        'anchor.tasks.config.CALLBACK_ALLOWED_HOSTS',
+                        ['127.0.0.1'],
+                        create=True
+                    ):
+                        result = self.tasks.check_server_placement(
+                            uuid.uuid4().hex,
+                            'iad',
+                            '123456',
+                            '11111111-2222-3333-4444-55555555555',
+                            receiver.url
+                        )
+        finally:
+            receiver.stop()
+
+        self.assertEquals(
+            result,
+            {
+                'server_id': '11111111-2222-3333-4444-55555555555',
+                'duplicate': False
+            },
+            'Incorrect result for the server check'
+        )
+        assert len(receiver.received) == 1, 'Callback was not delivered'
+        delivered = receiver.received[0]
+        self.assertEquals(
+            delivered.get('server_id'),
+            '11111111-2222-3333-4444-55555555555',
+            'Incorrect server in the callback'
+        )
+        assert delivered.get('duplicate') is False, 'Incorrect duplicate'
+        assert delivered.get('account_id') == '123456', 'Incorrect account'
+        self.assertEquals(
+            len(self.db.accounts.find_one().get('servers')),
+            2,
+            'Expected the server added to the cache'
+        )
+
+    def test_celery_check_server_placement_account_header(self):
+        self.setup_useable_account()
+        with mock.patch('anchor.tasks.check_add_server_to_cache') as cache:
+            cache.return_value = False
+            result = self.tasks.check_server_placement(
+                uuid.uuid4().hex,
+                'iad',
+                '123456',
+                '11111111-2222-3333-4444-55555555555'
+            )
+
+        assert result.get('duplicate') is False, 'Incorrect duplicate'
+        account_data = cache.call_args[0][4]
+        assert account_data.get('_id'), 'Account ID was not loaded'
+        assert 'servers' not in account_data, 'Cached servers were loaded'
+        assert 'host_servers' not in account_data, 'Host list was loaded'
+
+    def test_celery_deliver_callback_retries(self):
+        receiver = CallbackReceiver(500)
+        try:
+            with mock.patch.object(
+                self.tasks.deliver_callback,
+                'retry'
+            ) as retry:
+                retry.return_value = Exception('retry')
+                with mock.patch(
+                    'anchor.tasks.config.CALLBACK_ALLOWED_HOSTS',
+                    ['127.0.0.1'],
+                    create=True
+                ):
+                    with self.assertRaises(Exception):
+                        self.tasks.deliver_callback(
+                            receiver.url,
+                            {'server_id': uuid.uuid4().hex}
+                        )
+        finally:
+            receiver.stop()
+
+        assert len(receiver.received) == 1, 'Callback was not attempted'
+        assert retry.called, 'Failed callback was not retried'
+
+    def test_celery_deliver_callback_private_address(self):
+        receiver = CallbackReceiver()
+        try:
+            with mock.patch.object(
+                self.tasks.deliver_callback,
+                'retry'
+            ) as retry:
+                with mock.patch(
+                    'anchor.tasks.config.CALLBACK_ALLOWED_HOSTS',
+                    None,
+                    create=True
+                ):
+                    result = self.tasks.deliver_callback(
+                        receiver.url,
+                        {'server_id': uuid.uuid4().hex}
+                    )
+        finally:
+            receiver.stop()
+
+        assert result is False, 'Private callback was not refused'
+        assert len(receiver.received) == 0, 'Private callback was sent'
+        assert not retry.called, 'Refused callback was retried'
+
+    def test_celery_deliver_callback_verifies_certificates(self):
+        with mock.patch('requests.Session.post') as post:
+            post.return_value.status_code = 204
+            with mock.patch(
+                'anchor.tasks.config.CALLBACK_ALLOWED_HOSTS',
+                ['example.com'],
+                create=True
+            ):
+                result = self.tasks.deliver_callback(
+                    'https://example.com/hook',
+                    {'server_id': uuid.uuid4().hex}
+                )
+
+        assert result is True, 'Callback was not delivered'
+        session = self.tasks.client.get_session(
+            'https://example.com/hook',
+            self.tasks.config,
+            verify=True
+        )
+        assert session.verify is True, 'Callback session skips verification'
+        assert post.call_args[1].get('allow_redirects') is False, (
+            'Callback redirects were followed'
+        )
+
     def test_celery_generate_data_host(self):
         cloud_return = self.setup_servers_details_return()
         fg_return = self.setup_fg_servers_details_return()
@@ -599,6 +886,49 @@ class AnchorCeleryTests(unittest.TestCase):
             'Servers should have three stored in the data'
         )
         assert account.get('region') == 'iad', 'Incorrect region stored'
+        assert account.get('item_count') == 3, 'Incorrect item count stored'
+        assert account.get('group_count') == 3, 'Incorrect host count stored'
+
+    def test_celery_generate_data_host_index(self):
+        cloud_return = self.setup_servers_details_return()
+        fg_return = self.setup_fg_servers_details_return()
+        servers = cloud_return.get('servers')
+        servers.append(dict(servers[0], id='33333333-4444', name='third'))
+        for refresh in range(2):
+            with mock.patch('anchor.tasks.generate_server_list') as ng:
+                ng.return_value = servers
+                with mock.patch(
+                    'anchor.tasks.generate_first_gen_server_list'
+                ) as fg:
+                    fg.return_value = fg_return.get('servers')
+                    self.tasks.generate_account_object_list(
+                        '123456',
+                        uuid.uuid4().hex,
+                        'iad',
+                        'host_server'
+                    )
+
+        self.assertEquals(
+            self.db.host_index.count(),
+            3,
+            'Host index should have one document per host'
+        )
+        indexed = self.db.host_index.find_one(
+            {
+                'account_number': '123456',
+                'region': 'iad',
+                'host_id': servers[0].get('hostId')
+            }
+        )
+        self.assertEquals(
+            indexed.get('servers'),
+            [
+                {'id': servers[0].get('id'), 'name': servers[0].get('name')},
+                {'id': '33333333-4444', 'name': 'third'}
+            ],
+            'Incorrect servers indexed for the host'
+        )
+        assert indexed.get('cache_expiration'), 'Host index does not expire'
 
     def test_celery_generate_data_zone(self):
         cloud_return = self.setup_servers_details_return()
@@ -733,7 +1063,7 @@ class AnchorCeleryTests(unittest.TestCase):
                 True,
                 create=True
             ):
-                with mock.patch('requests.get') as patched_get:
+                with mock.patch('requests.Session.get') as patched_get:
                     error = patched_get.side_effect = ValueError
                     patched_get.return_value = error
                     self.tasks.generate_account_object_list(
@@ -777,7 +1107,7 @@ class AnchorCeleryTests(unittest.TestCase):
                 True,
                 create=True
             ):
-                with mock.patch('requests.get') as patched_get:
+                with mock.patch('requests.Session.get') as patched_get:
                     patched_get.return_value.content = json.dumps(cloud_return)
                     patched_get.return_value._status_code = 200
                     task = self.tasks.check_auth_token(
@@ -797,7 +1127,7 @@ class AnchorCeleryTests(unittest.TestCase):
                 True,
                 create=True
             ):
-                with mock.patch('requests.get') as patched_get:
+                with mock.patch('requests.Session.get') as patched_get:
                     error = patched_get.side_effect = ValueError
                     patched_get.return_value = error
                     task = self.tasks.check_auth_token(
@@ -807,6 +1137,92 @@ class AnchorCeleryTests(unittest.TestCase):
 
         assert task is False, 'Incorrect status returned with check'
 
+    def test_celery_api_session_reused_per_host(self):
+        self.tasks.client.close_sessions()
+        with mock.patch('requests.Session.get') as patched_get:
+            patched_get.return_value.content = json.dumps({'servers': []})
+            self.tasks.process_api_request(
+                'https://iad.servers.api.rackspacecloud.com/v2/123456/'
+                'servers/detail?limit=100',
+                'get',
+                None,
+                {}
+            )
+            self.tasks.process_api_request(
+                'https://iad.servers.api.rackspacecloud.com/v2/123456/'
+                'servers/detail?limit=100&marker=abc',
+                'get',
+                None,
+                {}
+            )
+            self.tasks.process_api_request(
+                'https://ord.servers.api.rackspacecloud.com/v2/123456/'
+                'servers/detail?limit=100',
+                'get',
+                None,
+                {}
+            )
+
+        sessions = self.tasks.client._sessions
+        self.assertEquals(
+            len(sessions),
+            2,
+            'Expected one pooled session per API host'
+        )
+        assert 'iad.servers.api.rackspacecloud.com' in sessions, (
+            'Session for IAD was not created'
+        )
+        timeout = patched_get.call_args[1].get('timeout')
+        assert timeout == self.tasks.client.get_timeout(
+            self.tasks.config
+        ), 'Timeout was not passed to the pooled session'
+
+    def test_celery_api_decoder_fallback(self):
+        decoders = self.tasks.decoders
+        with mock.patch(
+            'anchor.tasks.config.JSON_DECODER',
+            'not_installed',
+            create=True
+        ):
+            name, loads = decoders.get_decoder(self.tasks.config)
+
+        assert name in decoders.DECODERS, 'Uninstalled decoder was used'
+        with mock.patch(
+            'anchor.tasks.config.JSON_DECODER',
+            'json',
+            create=True
+        ):
+            self.assertEquals(
+                decoders.get_decoder(self.tasks.config),
+                ('json', json.loads),
+                'Configured decoder was not used'
+            )
+
+        rejecting = mock.Mock(side_effect=ValueError('rejected'))
+        with mock.patch.object(
+            decoders,
+            'get_decoder',
+            return_value=('fast', rejecting)
+        ):
+            with mock.patch('requests.Session.get') as patched_get:
+                patched_get.return_value.content = json.dumps(
+                    {'servers': [{'id': 'abc'}]}
+                )
+                content = self.tasks.process_api_request(
+                    'https://iad.servers.api.rackspacecloud.com/v2/123456/'
+                    'servers/detail?limit=100',
+                    'get',
+                    None,
+                    {}
+                )
+
+        assert rejecting.called, 'Configured decoder was not tried first'
+        self.assertEquals(
+            content,
+            {'servers': [{'id': 'abc'}]},
+            'Body was not decoded again with json'
+        )
+
     def test_celery_generate_data_no_servers(self):
         with self.app.test_client() as c:
             with c.session_transaction() as sess:
@@ -817,7 +1233,7 @@ class AnchorCeleryTests(unittest.TestCase):
                 True,
                 create=True
             ):
-                with mock.patch('requests.get') as patched_get:
+                with mock.patch('requests.Session.get') as patched_get:
                     patched_get.return_value.content = json.dumps(
                         {'servers': []}
                     )
@@ -925,7 +1341,7 @@ class AnchorCeleryTests(unittest.TestCase):
                 True,
                 create=True
             ):
-                with mock.patch('requests.get') as patched_get:
+                with mock.patch('requests.Session.get') as patched_get:
                     patched_get.return_value.content = json.dumps(cloud_return)
                     task = self.tasks.generate_volume_list(
                         '123456',
@@ -949,7 +1365,7 @@ class AnchorCeleryTests(unittest.TestCase):
                 True,
                 create=True
             ):
-                with mock.patch('requests.get') as patched_get:
+                with mock.patch('requests.Session.get') as patched_get:
                     patched_get.return_value.content = None
                     task = self.tasks.generate_volume_list(
                         '123456',
@@ -958,3 +1374,949 @@ class AnchorCeleryTests(unittest.TestCase):
                     )
 
         assert task == [], 'Got unexpected values on bad data return'
+
+    def test_celery_generate_volume_list_parallel_pages(self):
+        def volume_pages(url, verb, data, headers):
+            offset = int(re.search('offset=(\\d+)', url).group(1))
+            volumes = [
+                {'id': str(number)} for number in range(offset, 250)
+            ]
+            return {'volumes': volumes[:100]}
+
+        for workers in [0, 1, 4]:
+            with mock.patch('anchor.tasks.process_api_request') as api:
+                api.side_effect = volume_pages
+                task = self.tasks.generate_volume_list(
+                    '123456',
+                    uuid.uuid4().hex,
+                    'iad',
+                    workers
+                )
+
+            self.assertEquals(
+                [volume.get('id') for volume in task],
+                [str(number) for number in range(250)],
+                'Volumes were not reassembled in order with %d workers' % (
+                    workers
+                )
+            )
+
+    def test_celery_store_region_lookup_results(self):
+        lookups = [['iad', 'host_server'], ['ord', 'cbs_host']]
+        results = self.tasks.store_region_lookup_results(
+            ['5667a8d1b6a7b2a6ea6e1d24', '5667a8d1b6a7b2a6ea6e1d25'],
+            '123456',
+            lookups
+        )
+        stored = self.db.lookups.find_one({'account_number': '123456'})
+        assert stored, 'Combined lookup results were not stored'
+        self.assertEquals(
+            stored.get('lookups'),
+            results,
+            'Stored lookups do not match the returned results'
+        )
+        self.assertEquals(
+            [
+                [lookup.get('region'), lookup.get('lookup_type')]
+                for lookup in results
+            ],
+            lookups,
+            'Lookups were not stored in fan out order'
+        )
+
+    def test_celery_generate_data_lists_servers_concurrently(self):
+        cloud_return = self.setup_servers_details_return()
+        fg_return = self.setup_fg_servers_details_return()
+
+        def slow_ng(*args):
+            time.sleep(0.3)
+            return cloud_return
+
+        def slow_fg(*args):
+            time.sleep(0.3)
+            return fg_return.get('servers')
+
+        with mock.patch('anchor.tasks.process_api_request') as ng:
+            ng.side_effect = slow_ng
+            with mock.patch(
+                'anchor.tasks.generate_first_gen_server_list'
+            ) as fg:
+                fg.side_effect = slow_fg
+                start = time.time()
+                self.tasks.generate_account_object_list(
+                    '123456',
+                    uuid.uuid4().hex,
+                    'iad',
+                    'host_server'
+                )
+                elapsed = time.time() - start
+
+        assert elapsed < 0.55, (
+            'Server lists were not retrieved concurrently'
+        )
+        timings = self.db.accounts.find_one().get('timings')
+        assert timings.get('next_gen') >= 0.3, 'Incorrect next gen timing'
+        assert timings.get('first_gen') >= 0.3, 'Incorrect first gen timing'
+
+    def test_celery_generate_data_next_gen_timing(self):
+        cloud_return = self.setup_servers_details_return()
+        generate_data = self.tasks.generate_host_and_server_data
+
+        def slow_api(*args):
+            time.sleep(0.1)
+            return cloud_return
+
+        def slow_consumer(ng_servers, fg_servers, servers=None):
+            def slowly():
+                for server in ng_servers:
+                    time.sleep(0.2)
+                    yield server
+
+            return generate_data(slowly(), fg_servers, servers)
+
+        with mock.patch('anchor.tasks.process_api_request') as api:
+            api.side_effect = slow_api
+            with mock.patch(
+                'anchor.tasks.generate_first_gen_server_list'
+            ) as fg:
+                fg.return_value = []
+                with mock.patch(
+                    'anchor.tasks.generate_host_and_server_data'
+                ) as consumer:
+                    consumer.side_effect = slow_consumer
+                    self.tasks.generate_account_object_list(
+                        '123456',
+                        uuid.uuid4().hex,
+                        'iad',
+                        'host_server'
+                    )
+
+        timings = self.db.accounts.find_one().get('timings')
+        assert timings.get('next_gen') >= 0.1, 'Page request was not timed'
+        assert timings.get('next_gen') < 0.3, (
+            'Processing the servers was timed as the next gen API'
+        )
+
+    def test_celery_generate_server_list_streams_pages(self):
+        server = self.setup_servers_details_return().get('servers')[0]
+        pages = [
+            {
+                'servers': [server] * 100,
+                'servers_links': [{'href': 'https://marker'}]
+            },
+            {
+                'servers': [server] * 5
+            }
+        ]
+        with mock.patch('anchor.tasks.process_api_request') as api:
+            api.side_effect = pages
+            servers = self.tasks.generate_server_list(
+                '123456',
+                uuid.uuid4().hex,
+                'iad'
+            )
+            next(servers)
+            self.assertEquals(
+                api.call_count,
+                1,
+                'Servers were not yielded before the next page was requested'
+            )
+            self.assertEquals(
+                len(list(servers)),
+                104,
+                'Incorrect number of servers yielded'
+            )
+            self.assertEquals(
+                api.call_args[0][0],
+                'https://marker',
+                'Next page was not requested from the marker link'
+            )
+
+    def test_celery_generate_data_reports_progress(self):
+        server = self.setup_servers_details_return().get('servers')[0]
+        pages = [
+            {
+                'servers': [server] * 100,
+                'servers_links': [{'href': 'https://marker'}]
+            },
+            {
+                'servers': [server] * 5
+            }
+        ]
+        with mock.patch('anchor.tasks.process_api_request') as api:
+            api.side_effect = pages
+            with mock.patch(
+                'anchor.tasks.generate_first_gen_server_list'
+            ) as fg:
+                fg.return_value = []
+                with mock.patch('anchor.tasks.report_progress') as progress:
+                    self.tasks.generate_account_object_list(
+                        '123456',
+                        uuid.uuid4().hex,
+                        'iad',
+                        'host_server'
+                    )
+
+        self.assertEquals(
+            [call[0][1:] for call in progress.call_args_list],
+            [('listing', 1, 0), ('listing', 2, 100), ('saving', 2, 105)],
+            'Incorrect progress reported'
+        )
+
+    def run_delta_lookup(self, changes, fg_servers):
+        with mock.patch('anchor.tasks.generate_server_list') as ng:
+            ng.return_value = changes
+            with mock.patch(
+                'anchor.tasks.generate_first_gen_server_list'
+            ) as fg:
+                fg.return_value = fg_servers
+                self.tasks.generate_account_object_list(
+                    '123456',
+                    uuid.uuid4().hex,
+                    'iad',
+                    'host_server',
+                    None,
+                    'delta'
+                )
+
+        return ng
+
+    def test_celery_generate_data_delta(self):
+        cloud_return = self.setup_servers_details_return()
+        fg_return = self.setup_fg_servers_details_return()
+        with mock.patch('anchor.tasks.generate_server_list') as ng:
+            ng.return_value = cloud_return.get('servers')
+            with mock.patch(
+                'anchor.tasks.generate_first_gen_server_list'
+            ) as fg:
+                fg.return_value = fg_return.get('servers')
+                self.tasks.generate_account_object_list(
+                    '123456',
+                    uuid.uuid4().hex,
+                    'iad',
+                    'host_server'
+                )
+
+        servers = cloud_return.get('servers')
+        moved = dict(servers[0], hostId='new-host')
+        deleted = dict(servers[1], status='DELETED')
+        added = dict(servers[0], id='33333333-4444', hostId='new-host')
+        full = self.db.accounts.find_one()
+        self.assertEquals(
+            full.get('last_full'),
+            full.get('cache_created'),
+            'Full listing time was not recorded'
+        )
+        ng = self.run_delta_lookup(
+            [moved, deleted, added],
+            fg_return.get('servers')
+        )
+        assert ng.call_args[0][-1], 'Changes since time was not given'
+        account = self.db.accounts.find_one()
+        self.assertEquals(account.get('refresh_mode'), 'delta', 'Not delta')
+        self.assertEquals(
+            account.get('last_full'),
+            full.get('last_full'),
+            'Delta changed the full listing time'
+        )
+        server_ids = sorted(
+            server.get('id') for server in account.get('servers')
+        )
+        self.assertEquals(
+            server_ids,
+            sorted(
+                [moved.get('id'), added.get('id')] + [
+                    server.get('id') for server in fg_return.get('servers')
+                ]
+            ),
+            'Changes were not merged into the cached servers'
+        )
+        counts = dict(
+            (host.get('host'), host.get('count'))
+            for host in account.get('host_counts')
+        )
+        self.assertEquals(
+            counts.get('new-host'),
+            2,
+            'Host membership was not updated for changed servers'
+        )
+        assert servers[1].get('hostId') not in counts, (
+            'Host of the deleted server was kept'
+        )
+
+    def test_celery_generate_data_delta_page_failure(self):
+        servers = self.setup_servers_details_return().get('servers')
+        self.run_delta_lookup(servers, [])
+        created = datetime(2015, 1, 1, 12, 0, 0, tzinfo=self.tasks.UTC)
+        self.db.accounts.update({}, {'$set': {'cache_created': created}})
+        changed = [
+            dict(servers[0], id='changed-%d' % number, hostId='new-host')
+            for number in range(100)
+        ]
+        pages = [
+            {
+                'servers': changed,
+                'servers_links': [{'href': 'https://marker'}]
+            },
+            None
+        ]
+        with mock.patch('anchor.tasks.process_api_request') as api:
+            api.side_effect = pages
+            with mock.patch(
+                'anchor.tasks.generate_first_gen_server_list'
+            ) as fg:
+                fg.return_value = []
+                self.tasks.generate_account_object_list(
+                    '123456',
+                    uuid.uuid4().hex,
+                    'iad',
+                    'host_server',
+                    None,
+                    'delta'
+                )
+
+        assert api.call_count == 2, 'Second page was not requested'
+        account = self.db.accounts.find_one()
+        self.assertEquals(
+            len(account.get('servers')),
+            102,
+            'Changes on the first page were not merged'
+        )
+        self.assertEquals(
+            account.get('cache_created'),
+            created,
+            'Incomplete delta moved the creation time forward'
+        )
+        ng = self.run_delta_lookup([], [])
+        self.assertEquals(
+            ng.call_args[0][-1],
+            '2015-01-01T12:00:00Z',
+            'Next delta did not ask for the missed changes again'
+        )
+
+    def test_celery_generate_data_delta_layout_switch(self):
+        cloud_return = self.setup_servers_details_return()
+        fg_return = self.setup_fg_servers_details_return()
+        self.run_delta_lookup(
+            cloud_return.get('servers'),
+            fg_return.get('servers')
+        )
+        with mock.patch(
+            'anchor.tasks.config.ACCOUNT_STORAGE',
+            'normalized',
+            create=True
+        ):
+            ng = self.run_delta_lookup(
+                cloud_return.get('servers'),
+                fg_return.get('servers')
+            )
+
+        assert ng.call_args[0][-1] is None, (
+            'Changes since used across a layout switch'
+        )
+        account = self.db.accounts.find_one()
+        self.assertEquals(
+            account.get('refresh_mode'),
+            'full',
+            'Layout switch was not a full refresh'
+        )
+        assert account.get('storage') == 'normalized', 'Layout not switched'
+        servers = self.tasks.storage.load_items(self.db, account).get(
+            'servers'
+        )
+        self.assertEquals(
+            len(servers),
+            account.get('item_count'),
+            'Stored servers do not match the item count'
+        )
+        assert len(servers) == 3, 'Servers were lost switching layout'
+
+    def test_celery_generate_data_embedded_after_normalized(self):
+        servers = self.setup_servers_details_return().get('servers')
+        with mock.patch(
+            'anchor.tasks.config.ACCOUNT_STORAGE',
+            'normalized',
+            create=True
+        ):
+            self.run_delta_lookup(servers, [])
+
+        assert self.db.servers.count() == 2, 'Servers were not normalized'
+        moved = dict(servers[1], hostId='new-host')
+        with mock.patch(
+            'anchor.tasks.config.ACCOUNT_STORAGE',
+            'embedded',
+            create=True
+        ):
+            self.run_delta_lookup([moved], [])
+
+        assert self.db.servers.count() == 0, 'Stale server documents kept'
+        storage = self.tasks.storage
+        assert storage.find_server(
+            self.db,
+            '123456',
+            'iad',
+            servers[0].get('id')
+        ) is None, 'Deleted server was still found'
+        assert not storage.server_exists(
+            self.db,
+            '123456',
+            'iad',
+            servers[0].get('id')
+        ), 'Deleted server was still catalogued'
+        found = storage.find_server(
+            self.db,
+            '123456',
+            'iad',
+            moved.get('id')
+        )
+        self.assertEquals(
+            found.get('host_id'),
+            'new-host',
+            'Server reported its old host'
+        )
+
+    def test_celery_generate_data_delta_without_cache(self):
+        cloud_return = self.setup_servers_details_return()
+        ng = self.run_delta_lookup(cloud_return.get('servers'), [])
+        assert ng.call_args[0][-1] is None, 'Changes since used without cache'
+        account = self.db.accounts.find_one()
+        self.assertEquals(
+            account.get('refresh_mode'),
+            'full',
+            'Lookup without a cache was not a full refresh'
+        )
+
+    def test_celery_set_task_progress(self):
+        task_id = uuid.uuid4().hex
+        self.tasks.storage.set_task_progress(
+            self.db,
+            task_id,
+            'listing',
+            1,
+            0
+        )
+        self.tasks.storage.set_task_progress(
+            self.db,
+            task_id,
+            'listing',
+            2,
+            100
+        )
+        progress = self.db.task_results.find_one({'_id': task_id})
+        self.assertEquals(progress.get('version'), 2, 'Incorrect version')
+        self.assertEquals(progress.get('pages'), 2, 'Incorrect page count')
+        self.assertEquals(progress.get('items'), 100, 'Incorrect item count')
+        self.assertEquals(
+            progress.get('state'),
+            'PENDING',
+            'Running task was not pending'
+        )
+
+    def test_celery_host_aggregator_remove(self):
+        hosts = self.tasks.HostAggregator()
+        hosts.add('host-1', 'server-1')
+        hosts.add('host-1', 'server-2')
+        hosts.add('host-2', 'server-3')
+        hosts.remove('host-1', 'server-1')
+        hosts.remove('host-2', 'server-3')
+        hosts.remove('host-3', 'server-4')
+        self.assertEquals(hosts.hosts, ['host-1'], 'Empty host was kept')
+        self.assertEquals(
+            hosts.counts(),
+            [{'host': 'host-1', 'count': 1}],
+            'Incorrect counts after removal'
+        )
+        hosts.add('host-2', 'server-3')
+        hosts.add('host-1', 'server-1')
+        self.assertEquals(
+            hosts.hosts,
+            ['host-1', 'host-2'],
+            'Host added again was not kept in first seen order'
+        )
+        self.assertEquals(
+            hosts.host_map.items(),
+            [
+                (
+                    'host-1',
+                    [
+                        {'id': 'server-2', 'name': None},
+                        {'id': 'server-1', 'name': None}
+                    ]
+                ),
+                ('host-2', [{'id': 'server-3', 'name': None}])
+            ],
+            'Incorrect items mapped after removal'
+        )
+
+    def test_celery_generate_host_and_server_data_counts(self):
+        ng_servers = self.setup_servers_details_return().get('servers')
+        ng_servers.append(dict(ng_servers[0], id='33333333-4444'))
+        fg_servers = self.setup_fg_servers_details_return().get('servers')
+        servers, hosts = self.tasks.generate_host_and_server_data(
+            ng_servers,
+            fg_servers
+        )
+        self.assertEquals(len(servers), 4, 'Incorrect number of servers')
+        self.assertEquals(
+            hosts.hosts,
+            [
+                '16cde3191df1e6c9fa4dad65eacd4dc7c90d60bca3589ac48f55aae8',
+                'b4631f368e35d06bef81053b66e540c95836fc0eb796176dc624a2cd',
+                'caf8f03bb31dbd2d6367615709e853cf'
+            ],
+            'Hosts were not kept unique in first seen order'
+        )
+        self.assertEquals(
+            [host.get('count') for host in hosts.counts()],
+            [2, 1, 1],
+            'Incorrect per host counts'
+        )
+        self.assertEquals(
+            hosts.host_map.get(hosts.hosts[0]),
+            [
+                {
+                    'id': '11111111-2222-3333-4444-55555555555',
+                    'name': ng_servers[0].get('name')
+                },
+                {'id': '33333333-4444', 'name': ng_servers[0].get('name')}
+            ],
+            'Incorrect servers mapped to the host'
+        )
+
+    def test_celery_generate_host_and_server_data_records(self):
+        ng_servers = json.loads(
+            json.dumps(self.setup_servers_details_return().get('servers'))
+        )
+        ng_servers.append(
+            json.loads(json.dumps(dict(ng_servers[0], id='33333333-4444')))
+        )
+        fg_servers = self.setup_fg_servers_details_return().get('servers')
+        servers, hosts = self.tasks.generate_host_and_server_data(
+            ng_servers,
+            fg_servers
+        )
+        assert servers[0].get('host_id') is servers[2].get('host_id'), (
+            'Host ID was not interned across servers'
+        )
+        assert servers[0].get('flavor') is servers[2].get('flavor'), (
+            'Flavor was not interned across servers'
+        )
+        assert hosts.hosts[0] is servers[0].get('host_id'), (
+            'Aggregated host does not share the interned ID'
+        )
+        self.assertEquals(
+            servers[0].to_document(),
+            {
+                'state': 'active',
+                'id': ng_servers[0].get('id'),
+                'host_id': ng_servers[0].get('hostId'),
+                'public_zone': ng_servers[0].get(
+                    'RAX-PUBLIC-IP-ZONE-ID:publicIPZoneId'
+                ),
+                'name': ng_servers[0].get('name'),
+                'created': ng_servers[0].get('created'),
+                'flavor': ng_servers[0].get('flavor').get('id'),
+                'addresses': servers[0].get('addresses'),
+                'reboot_window': None
+            },
+            'Incorrect document for a next gen server'
+        )
+        fg_document = servers[-1].to_document()
+        assert fg_document.get('type') == 'fg', 'First gen type not set'
+        assert 'public_zone' not in fg_document, 'Unset field was stored'
+        self.assertRaises(KeyError, lambda: servers[-1]['created'])
+
+    def test_celery_build_fleet_index(self):
+        self.setup_useable_account()
+        self.db.accounts.update({}, {'$set': {'lookup_type': 'host_server'}})
+        built = self.tasks.build_fleet_index()
+        assert built == 1, 'Account without a host index was not indexed'
+        indexed = self.db.host_index.find_one()
+        self.assertEquals(
+            indexed.get('servers'),
+            [
+                {
+                    'id': '00000000-1111-2222-3333-444444444444',
+                    'name': 'test-server'
+                }
+            ],
+            'Incorrect servers indexed for the host'
+        )
+        assert indexed.get('account_number') == '123456', (
+            'Host indexed under the wrong account'
+        )
+        assert self.tasks.build_fleet_index() == 0, (
+            'Indexed account was built again'
+        )
+
+    def test_celery_refresh_hot_accounts(self):
+        expiration = datetime.now() + relativedelta(days=2)
+        self.db.accounts.insert(
+            {
+                'account_number': '123456',
+                'region': 'dfw',
+                'lookup_type': 'host_server',
+                'cache_expiration': expiration
+            }
+        )
+        for account_number, region, score in [
+            ('123456', 'iad', 10),
+            ('123456', 'ord', 1),
+            ('123456', 'dfw', 10),
+            ('654321', 'iad', 10)
+        ]:
+            self.db.account_access.insert(
+                {
+                    'account_number': account_number,
+                    'region': region,
+                    'lookup_type': 'host_server',
+                    'score': score
+                }
+            )
+
+        credentials = {'123456': {'username': 'test', 'api_key': 'key'}}
+        with mock.patch(
+            'anchor.tasks.config.REFRESH_CREDENTIALS',
+            credentials,
+            create=True
+        ):
+            with mock.patch(
+                'anchor.tasks.get_refresh_token',
+                return_value='token'
+            ):
+                with mock.patch(
+                    'anchor.tasks.generate_account_object_list.apply_async'
+                ) as lookup:
+                    refreshed = self.tasks.refresh_hot_accounts()
+                    again = self.tasks.refresh_hot_accounts()
+
+        self.assertEquals(
+            refreshed,
+            [
+                {
+                    'account_number': '123456',
+                    'region': 'iad',
+                    'lookup_type': 'host_server'
+                }
+            ],
+            'Only the hot expiring lookup should be refreshed'
+        )
+        assert again == [], 'Running refresh was started again'
+        assert lookup.call_count == 1, 'Incorrect number of refreshes queued'
+        self.assertEquals(
+            lookup.call_args[0][0],
+            ('123456', 'token', 'iad', 'host_server', None, 'full'),
+            'Incorrect lookup queued'
+        )
+        countdown = lookup.call_args[1].get('countdown')
+        assert 0 <= countdown <= 60, 'Refresh was not jittered'
+        entry = self.db.account_access.find_one({'region': 'iad'})
+        assert entry.get('score') == 2.5, 'Score was not decayed each run'
+        assert entry.get('refreshing_until'), 'Refresh was not claimed'
+
+        self.tasks.record_lookup_result(
+            task_id=uuid.uuid4().hex,
+            task=self.tasks.generate_account_object_list,
+            retval=None,
+            state='SUCCESS',
+            args=('123456', 'token', 'iad', 'host_server', None, 'delta')
+        )
+        entry = self.db.account_access.find_one({'region': 'iad'})
+        assert 'refreshing_until' not in entry, 'Refresh claim was kept'
+
+    def test_celery_refresh_hot_accounts_full_listing(self):
+        now = datetime.now(self.tasks.UTC)
+        for region, last_full in [
+            ('iad', now - relativedelta(hours=1)),
+            ('ord', now - relativedelta(days=2)),
+            ('dfw', None)
+        ]:
+            self.db.accounts.insert(
+                {
+                    'account_number': '123456',
+                    'region': region,
+                    'lookup_type': 'host_server',
+                    'cache_expiration': now + relativedelta(minutes=30),
+                    'last_full': last_full
+                }
+            )
+            self.db.account_access.insert(
+                {
+                    'account_number': '123456',
+                    'region': region,
+                    'lookup_type': 'host_server',
+                    'score': 10
+                }
+            )
+
+        credentials = {'123456': {'username': 'test', 'api_key': 'key'}}
+        with mock.patch(
+            'anchor.tasks.config.REFRESH_CREDENTIALS',
+            credentials,
+            create=True
+        ):
+            with mock.patch(
+                'anchor.tasks.get_refresh_token',
+                return_value='token'
+            ):
+                with mock.patch(
+                    'anchor.tasks.generate_account_object_list.apply_async'
+                ) as lookup:
+                    self.tasks.refresh_hot_accounts()
+
+        modes = dict(
+            (call[0][0][2], call[0][0][5]) for call in lookup.call_args_list
+        )
+        self.assertEquals(
+            modes,
+            {'iad': 'delta', 'ord': 'full', 'dfw': 'full'},
+            'Lookups without a recent full listing were not listed in full'
+        )
+
+    def test_celery_get_refresh_token(self):
+        credentials = {'123456': {'username': 'test', 'api_key': 'key'}}
+        with mock.patch(
+            'anchor.tasks.config.REFRESH_CREDENTIALS',
+            credentials,
+            create=True
+        ):
+            with mock.patch('anchor.tasks.client.get_session') as get_session:
+                post = get_session.return_value.post
+                post.return_value.content = json.dumps(
+                    {
+                        'access': {
+                            'token': {
+                                'id': 'service-token',
+                                'tenant': {'id': '123456'}
+                            }
+                        }
+                    }
+                )
+                token = self.tasks.get_refresh_token('123456')
+                missing = self.tasks.get_refresh_token('654321')
+                post.return_value.content = json.dumps(
+                    {
+                        'access': {
+                            'token': {
+                                'id': 'other-token',
+                                'tenant': {'id': '999999'}
+                            }
+                        }
+                    }
+                )
+                other = self.tasks.get_refresh_token('123456')
+
+        assert token == 'service-token', 'Incorrect refresh token returned'
+        assert missing is None, 'Token returned without credentials'
+        assert other is None, 'Token for another account was used'
+        body = json.loads(post.call_args[1].get('data'))
+        self.assertEquals(
+            body.get('auth').get('RAX-KSKEY:apiKeyCredentials'),
+            {'username': 'test', 'apiKey': 'key'},
+            'Incorrect credentials sent to identity'
+        )
+        assert get_session.call_args[1].get('verify') is True, (
+            'Identity session skips certificate verification'
+        )
+
+    def test_celery_generate_data_cache_lifetime(self):
+        cloud_return = self.setup_cbs_details_return()
+        with mock.patch(
+            'anchor.tasks.config.CACHE_LIFETIMES',
+            {'cbs_host': 3600},
+            create=True
+        ):
+            with mock.patch('anchor.tasks.generate_volume_list') as cbs:
+                cbs.return_value = cloud_return.get('volumes')
+                self.tasks.generate_account_object_list(
+                    '123456',
+                    uuid.uuid4().hex,
+                    'iad',
+                    'cbs_host'
+                )
+
+        account = self.db.accounts.find_one()
+        lifetime = (
+            account.get('cache_expiration') - account.get('cache_created')
+        )
+        self.assertEquals(
+            lifetime.total_seconds(),
+            3600,
+            'Cache lifetime for the lookup type was not used'
+        )
+
+    def test_celery_generate_data_normalized(self):
+        cloud_return = self.setup_servers_details_return()
+        fg_return = self.setup_fg_servers_details_return()
+        with mock.patch(
+            'anchor.tasks.config.ACCOUNT_STORAGE',
+            'normalized',
+            create=True
+        ):
+            with mock.patch('anchor.tasks.generate_server_list') as ng:
+                ng.return_value = cloud_return.get('servers')
+                with mock.patch(
+                    'anchor.tasks.generate_first_gen_server_list'
+                ) as fg:
+                    fg.return_value = fg_return.get('servers')
+                    task = self.tasks.generate_account_object_list(
+                        '123456',
+                        uuid.uuid4().hex,
+                        'iad',
+                        'host_server',
+                        True
+                    )
+
+        account = self.db.accounts.find_one()
+        assert str(account.get('_id')) == task, (
+            'ID returned was not correct for the entry found'
+        )
+        assert account.get('storage') == 'normalized', 'Incorrect layout'
+        assert account.get('servers') is None, (
+            'Servers were embedded in the account header'
+        )
+        self.assertEquals(
+            len(account.get('host_servers')),
+            3,
+            'Host servers should have three IDs'
+        )
+        servers = list(
+            self.db.servers.find(
+                {
+                    'account_number': '123456',
+                    'region': 'iad',
+                    'lookup_type': 'host_server'
+                }
+            )
+        )
+        self.assertEquals(
+            len(servers),
+            3,
+            'Servers should have three documents stored'
+        )
+        assert all(server.get('cache_expiration') for server in servers), (
+            'Server documents do not expire with the account'
+        )
+
+    def test_celery_generate_data_normalized_refresh(self):
+        cloud_return = self.setup_servers_details_return()
+        servers = cloud_return.get('servers')
+        with mock.patch(
+            'anchor.tasks.config.ACCOUNT_STORAGE',
+            'normalized',
+            create=True
+        ):
+            with mock.patch(
+                'anchor.tasks.config.STORAGE_BATCH_SIZE',
+                2,
+                create=True
+            ):
+                for server_list in [servers, servers[1:]]:
+                    with mock.patch(
+                        'anchor.tasks.generate_server_list'
+                    ) as ng:
+                        ng.return_value = server_list
+                        with mock.patch(
+                            'anchor.tasks.generate_first_gen_server_list'
+                        ) as fg:
+                            fg.return_value = []
+                            task = self.tasks.generate_account_object_list(
+                                '123456',
+                                uuid.uuid4().hex,
+                                'iad',
+                                'host_server',
+                                True
+                            )
+
+        self.assertEquals(
+            self.db.accounts.count(),
+            1,
+            'Refresh did not replace the account header'
+        )
+        assert str(self.db.accounts.find_one().get('_id')) == task, (
+            'ID returned was not correct for the entry found'
+        )
+        stored = [server.get('id') for server in self.db.servers.find()]
+        self.assertEquals(
+            sorted(stored),
+            sorted(server.get('id') for server in servers[1:]),
+            'Servers from the previous lookup were not replaced'
+        )
+
+    def test_celery_record_lookup_result(self):
+        task_id = uuid.uuid4().hex
+        check_id = uuid.uuid4().hex
+        self.tasks.record_lookup_result(
+            task_id=task_id,
+            task=self.tasks.generate_account_object_list,
+            retval='5440f1d8ee2a1b0b9b9f53f8',
+            state='SUCCESS',
+            args=('123456', 'token', 'iad', 'host_server', True)
+        )
+        self.tasks.record_lookup_result(
+            task_id=check_id,
+            task=self.tasks.check_server_placement,
+            retval={'server_id': 'server', 'duplicate': False},
+            state='SUCCESS',
+            args=('token', 'iad', '654321', 'server', None)
+        )
+        self.tasks.record_lookup_result(
+            task_id=uuid.uuid4().hex,
+            task=self.tasks.check_auth_token,
+            retval=True,
+            state='SUCCESS'
+        )
+        self.assertEquals(
+            self.db.task_results.count(),
+            2,
+            'Results were recorded for other tasks'
+        )
+        recorded = self.db.task_results.find_one({'_id': task_id})
+        self.assertEquals(
+            recorded.get('state'),
+            'SUCCESS',
+            'Incorrect state recorded'
+        )
+        self.assertEquals(
+            recorded.get('result'),
+            '5440f1d8ee2a1b0b9b9f53f8',
+            'Account ID was not recorded'
+        )
+        assert recorded.get('created'), 'No creation time for expiry'
+        self.assertEquals(
+            [
+                recorded.get('account_number'),
+                self.db.task_results.find_one(
+                    {'_id': check_id}
+                ).get('account_number')
+            ],
+            ['123456', '654321'],
+            'Task accounts were not recorded'
+        )
+
+    def test_celery_add_server_to_cache_normalized(self):
+        self.setup_useable_account()
+        self.db.accounts.update(
+            {},
+            {'$set': {'storage': 'normalized', 'lookup_type': 'host_server'}}
+        )
+        account_data = self.db.accounts.find_one()
+        cloud_return = self.setup_cloud_server_details_single_return()
+        with mock.patch('requests.Session.get') as patched_get:
+            patched_get.return_value.content = json.dumps(cloud_return)
+            self.tasks.check_add_server_to_cache(
+                uuid.uuid4().hex,
+                'iad',
+                '123456',
+                '11111111-2222-3333-4444-55555555555',
+                account_data
+            )
+
+        server = self.db.servers.find_one()
+        assert server, 'Server was not stored as its own document'
+        assert server.get('account_number') == '123456', 'Incorrect account'
+        self.assertEquals(
+            len(self.db.accounts.find_one().get('servers')),
+            1,
+            'Server was pushed onto the normalized account header'
+        )
@@ -22,6 +22,7 @@ import unittest
 import anchor
 import urlparse
 import json
+import time
 import re
 import mock
 
@@ -49,6 +50,10 @@ class AnchorTests(unittest.TestCase):
         self.db.sessions.remove()
         self.db.settings.remove()
         self.db.accounts.remove()
+        self.db.servers.remove()
+        self.db.host_index.remove()
+        self.db.account_access.remove()
+        self.db.task_results.remove()
         self.db.forms.remove()
 
     def setup_user_login(self, sess):
@@ -79,6 +84,17 @@ class AnchorTests(unittest.TestCase):
             }
         )
 
+    def setup_task_result(self, account):
+        task_id = uuid4().hex
+        self.db.task_results.insert(
+            {
+                '_id': task_id,
+                'state': 'SUCCESS',
+                'result': str(account.get('_id'))
+            }
+        )
+        return task_id
+
     def setup_useable_account(self):
         data = {
             'host_servers': [
@@ -249,6 +265,69 @@ class AnchorTests(unittest.TestCase):
 
         result = json.loads(response.data)
         assert result.get('task_id'), 'Task ID was not found'
+        queued = self.db.task_results.find_one({'_id': result.get('task_id')})
+        assert queued, 'Task was not recorded when queued'
+        self.assertEquals(
+            queued.get('state'),
+            'PENDING',
+            'Queued task was not recorded as pending'
+        )
+
+    def test_ui_lookup_post_without_region(self):
+        with self.app.test_client() as c:
+            with c.session_transaction() as sess:
+                self.setup_user_login(sess)
+
+            with mock.patch(
+                'anchor.tasks.generate_account_object_list.delay'
+            ) as delay:
+                delay.return_value.task_id = uuid4().hex
+                response = c.post(
+                    '/lookup/servers',
+                    data=json.dumps({'lookup_type': 'host_server'}),
+                    content_type='application/json'
+                )
+
+        assert response._status_code == 200, 'Incorrect status code'
+        assert json.loads(response.data).get('task_id'), 'Task ID not found'
+        self.assertEquals(
+            self.db.account_access.count(),
+            0,
+            'Access was recorded without a region'
+        )
+
+    def test_ui_lookup_pending_status_recorded(self):
+        task_id = uuid4().hex
+        self.db.task_results.insert({'_id': task_id, 'state': 'PENDING'})
+        with self.app.test_client() as c:
+            with c.session_transaction() as sess:
+                self.setup_user_login(sess)
+
+            with mock.patch('anchor.tasks.check_task_state') as state:
+                with mock.patch('anchor.tasks.get_task_results') as data:
+                    response = c.get('/lookup/servers/%s' % task_id)
+
+        check = json.loads(response.data)
+        assert check.get('state') == 'PENDING', 'Incorrect state found'
+        assert check.get('code') == 204, 'Incorrect code found on return'
+        assert not state.called, 'Result backend was checked for the state'
+        assert not data.called, 'Result backend was waited on for the result'
+
+    def test_ui_lookup_success_not_recorded(self):
+        with self.app.test_client() as c:
+            with c.session_transaction() as sess:
+                self.setup_user_login(sess)
+
+            with mock.patch('anchor.tasks.check_task_state') as state:
+                state.return_value = 'SUCCESS'
+                with mock.patch('anchor.tasks.get_task_results') as data:
+                    response = c.get('/lookup/servers/%s' % uuid4().hex)
+
+        check = json.loads(response.data)
+        assert check.get('state') == 'PENDING', (
+            'Success reported before the result was recorded'
+        )
+        assert not data.called, 'Result backend was waited on for the result'
 
     def test_ui_lookup_pending_status(self):
         with self.app.test_client() as c:
@@ -265,6 +344,78 @@ class AnchorTests(unittest.TestCase):
         assert check.get('state') == 'PENDING', 'Incorrect state found'
         assert check.get('code') == 204, 'Incorrect code found on return'
 
+    def test_ui_lookup_progress_changed(self):
+        task_id = uuid4().hex
+        self.db.task_results.insert(
+            {
+                '_id': task_id,
+                'state': 'PENDING',
+                'phase': 'listing',
+                'pages': 3,
+                'items': 200,
+                'version': 3
+            }
+        )
+        with self.app.test_client() as c:
+            with c.session_transaction() as sess:
+                self.setup_user_login(sess)
+
+            response = c.get(
+                '/lookup/servers/%s/progress?version=2' % task_id
+            )
+
+        check = json.loads(response.data)
+        self.assertEquals(
+            check,
+            {
+                'state': 'PENDING',
+                'phase': 'listing',
+                'pages': 3,
+                'items': 200,
+                'version': 3
+            },
+            'Incorrect progress returned'
+        )
+
+    def test_ui_lookup_progress_finished(self):
+        task_id = uuid4().hex
+        self.db.task_results.insert(
+            {'_id': task_id, 'state': 'SUCCESS', 'version': 3}
+        )
+        with self.app.test_client() as c:
+            with c.session_transaction() as sess:
+                self.setup_user_login(sess)
+
+            response = c.get(
+                '/lookup/servers/%s/progress?version=3' % task_id
+            )
+
+        assert response._status_code == 200, 'Finished task was unchanged'
+        check = json.loads(response.data)
+        assert check.get('state') == 'SUCCESS', 'Incorrect state found'
+
+    def test_ui_lookup_progress_returns_immediately(self):
+        task_id = uuid4().hex
+        self.db.task_results.insert(
+            {'_id': task_id, 'state': 'PENDING', 'version': 1}
+        )
+        with self.app.test_client() as c:
+            with c.session_transaction() as sess:
+                self.setup_user_login(sess)
+
+            response = c.get('/lookup/servers/%s/progress' % task_id)
+            start = time.time()
+            unchanged = c.get(
+                '/lookup/servers/%s/progress?version=1' % task_id
+            )
+            elapsed = time.time() - start
+
+        check = json.loads(response.data)
+        assert check.get('version') == 1, 'Incorrect version returned'
+        assert unchanged._status_code == 204, 'Unchanged progress was sent'
+        assert not unchanged.data, 'Unchanged progress had a body'
+        assert elapsed < 0.5, 'Progress request waited for a change'
+
     def test_ui_lookup_bad_status(self):
         with self.app.test_client() as c:
             with c.session_transaction() as sess:
@@ -287,13 +438,8 @@ class AnchorTests(unittest.TestCase):
             with c.session_transaction() as sess:
                 self.setup_user_login(sess)
 
-            with mock.patch('anchor.tasks.check_task_state') as data:
-                data.return_value = 'SUCCESS'
-                with mock.patch('anchor.tasks.get_task_results') as data:
-                    data.return_value = str(account.get('_id'))
-                    response = c.get(
-                        '/lookup/servers/%s' % uuid4().hex
-                    )
+            task_id = self.setup_task_result(account)
+            response = c.get('/lookup/servers/%s' % task_id)
 
         self.assertIn(
             account.get('servers')[0].get('id'),
@@ -310,6 +456,15 @@ class AnchorTests(unittest.TestCase):
             response.data,
             'Could not find the region in the response'
         )
+        self.assertIn(
+            (
+                '<span class="total-label">Largest Blast Radius: </span>2 on '
+                'f0ab54576022b02c128b9516ef23a9947c73a8564ca79c7d1debb015 '
+                '(100.0%)'
+            ),
+            response.data,
+            'Could not find the host analytics in the response'
+        )
 
     def test_ui_lookup_success_with_cbs_data(self):
         self.setup_useable_cbs_account()
@@ -318,13 +473,8 @@ class AnchorTests(unittest.TestCase):
             with c.session_transaction() as sess:
                 self.setup_user_login(sess)
 
-            with mock.patch('anchor.tasks.check_task_state') as data:
-                data.return_value = 'SUCCESS'
-                with mock.patch('anchor.tasks.get_task_results') as data:
-                    data.return_value = str(account.get('_id'))
-                    response = c.get(
-                        '/lookup/servers/%s' % uuid4().hex
-                    )
+            task_id = self.setup_task_result(account)
+            response = c.get('/lookup/servers/%s' % task_id)
 
         self.assertIn(
             account.get('volumes')[0].get('id'),
@@ -370,13 +520,8 @@ class AnchorTests(unittest.TestCase):
             with c.session_transaction() as sess:
                 self.setup_user_login(sess)
 
-            with mock.patch('anchor.tasks.check_task_state') as state:
-                state.return_value = 'SUCCESS'
-                with mock.patch('anchor.tasks.get_task_results') as data:
-                    data.return_value = str(account.get('_id'))
-                    response = c.get(
-                        '/lookup/servers/%s/host_server/csv' % uuid4().hex
-                    )
+            task_id = self.setup_task_result(account)
+            response = c.get('/lookup/servers/%s/host_server/csv' % task_id)
 
         self.assertIn(
             (
@@ -399,6 +544,54 @@ class AnchorTests(unittest.TestCase):
             'Incorrect data returned for CSV'
         )
 
+    def test_ui_csv_generate_normalized(self):
+        self.setup_useable_account()
+        account = self.db.accounts.find_one()
+        for server in account.get('servers'):
+            server.update(
+                {
+                    'account_number': account.get('account_number'),
+                    'region': account.get('region'),
+                    'lookup_type': account.get('lookup_type'),
+                    'cache_expiration': account.get('cache_expiration')
+                }
+            )
+            self.db.servers.insert(server)
+
+        self.db.accounts.update(
+            {'_id': account.get('_id')},
+            {'$set': {'servers': None, 'storage': 'normalized'}}
+        )
+        with self.app.test_client() as c:
+            with c.session_transaction() as sess:
+                self.setup_user_login(sess)
+
+            task_id = self.setup_task_result(account)
+            with mock.patch('anchor.exports.CHUNK_ROWS', 1):
+                response = c.get(
+                    '/lookup/servers/%s/host_server/csv' % task_id
+                )
+
+        self.assertEquals(
+            response.headers.get('Content-Disposition'),
+            'attachment; filename="servers.csv"',
+            'Incorrect file name for CSV'
+        )
+        self.assertEquals(
+            len(response.data.strip().split('\n')),
+            3,
+            'Expected a header and one line per server'
+        )
+        self.assertIn(
+            (
+                '"bf8a1d259e0fdec48a44140b7f5ffc3acdcd8e0a76ea57b0c84edbd3",'
+                '"f0ab54576022b02c128b9516ef23a9947c73a8564ca79c7d1debb015",'
+                '"00000000-1111-2222-3333-444444444444","test-server","active"'
+            ),
+            response.data,
+            'Incorrect data returned for CSV'
+        )
+
     def test_ui_csv_generate_cbs(self):
         self.setup_useable_cbs_account()
         account = self.db.accounts.find_one()
@@ -406,13 +599,8 @@ class AnchorTests(unittest.TestCase):
             with c.session_transaction() as sess:
                 self.setup_user_login(sess)
 
-            with mock.patch('anchor.tasks.check_task_state') as state:
-                state.return_value = 'SUCCESS'
-                with mock.patch('anchor.tasks.get_task_results') as data:
-                    data.return_value = str(account.get('_id'))
-                    response = c.get(
-                        '/lookup/servers/%s/cbs_host/csv' % uuid4().hex
-                    )
+            task_id = self.setup_task_result(account)
+            response = c.get('/lookup/servers/%s/cbs_host/csv' % task_id)
 
         self.assertIn(
             (
@@ -431,3 +619,106 @@ class AnchorTests(unittest.TestCase):
             response.data,
             'Incorrect data returned for CSV'
         )
+
+    def test_ui_reports(self):
+        self.setup_useable_account()
+        self.setup_useable_cbs_account()
+        with self.app.test_client() as c:
+            with c.session_transaction() as sess:
+                self.setup_user_login(sess)
+
+            response = c.get('/reports/')
+
+        assert response._status_code == 200, 'Incorrect status code'
+        self.assertIn(
+            '<span class="count-label">Host Servers:</span>'
+            '<span class="count-value">1</span>',
+            response.data,
+            'Incorrect run count for host servers'
+        )
+        self.assertIn(
+            'class="host_server"',
+            response.data,
+            'Host server run was not listed'
+        )
+        assert 'Next page' not in response.data, 'Unexpected next page'
+
+    def test_ui_reports_paging(self):
+        now = datetime.now()
+        for number in range(3):
+            self.db.accounts.insert(
+                {
+                    'account_number': '10000%d' % number,
+                    'region': 'iad',
+                    'lookup_type': 'host_server',
+                    'cache_expiration': now + relativedelta(hours=number + 1),
+                    'servers': [{'id': uuid4().hex}],
+                    'host_servers': [uuid4().hex]
+                }
+            )
+
+        self.app.config['REPORT_PAGE_SIZE'] = 2
+        with self.app.test_client() as c:
+            with c.session_transaction() as sess:
+                self.setup_user_login(sess)
+
+            first = c.get('/reports/')
+            cursor = re.search('cursor=([0-9a-f_]+)', first.data)
+            assert cursor, 'Next page link was not found'
+            second = c.get('/reports/?cursor=%s' % cursor.group(1))
+
+        self.app.config.pop('REPORT_PAGE_SIZE')
+        for account_number in ['100002', '100001']:
+            self.assertIn(account_number, first.data, 'Run missing on page')
+
+        assert '100000' not in first.data, 'Oldest run on the first page'
+        assert '100000' in second.data, 'Oldest run missing on next page'
+        assert '100002' not in second.data, 'First page repeated'
+        assert 'Next page' not in second.data, 'Unexpected next page'
+
+    def test_ui_reports_fleet(self):
+        expiration = datetime.now() + relativedelta(days=1)
+        shared, single = uuid4().hex, uuid4().hex
+        for account_number, host_id, count in [
+            ('100000', shared, 2),
+            ('100001', shared, 1),
+            ('100001', single, 3)
+        ]:
+            self.db.host_index.insert(
+                {
+                    'account_number': account_number,
+                    'region': 'iad',
+                    'host_id': host_id,
+                    'servers': [
+                        {
+                            'id': uuid4().hex,
+                            'name': 'server-%s-%d' % (account_number, number)
+                        } for number in range(count)
+                    ],
+                    'cache_expiration': expiration
+                }
+            )
+
+        with self.app.test_client() as c:
+            with c.session_transaction() as sess:
+                self.setup_admin_login(sess)
+
+            response = c.get('/reports/fleet')
+            detail = c.get('/reports/fleet?region=iad&host_id=%s' % shared)
+
+        assert response._status_code == 200, 'Incorrect status code'
+        self.assertIn(shared, response.data, 'Shared host was not listed')
+        assert single not in response.data, 'Unshared host was listed'
+        self.assertEquals(
+            response.data.count('class="fleet-account"'),
+            2,
+            'Both accounts on the shared host should be listed'
+        )
+        self.assertIn(
+            'server-100001-0',
+            detail.data,
+            'Servers on the host were not listed'
+        )
+        assert 'server-100001-2' not in detail.data, (
+            'Servers on another host were listed'
+        )